@@ -1,16 +1,84 @@
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
-from inventario import InventarioManager, Producto
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from pydantic import BaseModel, field_validator
+from contextlib import asynccontextmanager, suppress
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+
+try:
+    import orjson
+    ORJSON_DISPONIBLE = True
+except ImportError:
+    ORJSON_DISPONIBLE = False
+
+try:
+    import msgpack
+    MSGPACK_DISPONIBLE = True
+except ImportError:
+    MSGPACK_DISPONIBLE = False
+from bitacora import configurar_desde_entorno
+from eventos import CAPACIDAD_MAXIMA, CAPACIDAD_POR_DEFECTO, Suscripcion, bus, seguir_cambios
+from consultas import LIMITE_MAXIMO, LIMITE_POR_DEFECTO
+from inventario import COLUMNAS, InventarioManager, Producto, filas_en_pesos, seleccionar_columnas
+from metricas import MiddlewareMetricas, TIPO_CONTENIDO, registro
+from moneda import a_centavos, a_unidades
+from trabajos import ESTADOS_FINALES, GestorTrabajos
+from trazas import MiddlewareTrazas, RutaTrazada
+
+# Logging estructurado en JSON, sin bloquear las solicitudes
+configurar_desde_entorno(nivel="WARNING", formato="json")
+
+# Inicializar manejador de inventario (INVENTARIO_DB permite apuntar a otra base)
+inventario = InventarioManager(os.environ.get("INVENTARIO_DB", "inventario.db"))
+
+# Reportes pesados en segundo plano (el estado se comparte entre workers por la base)
+trabajos = GestorTrabajos(inventario)
+
+# Segundos entre lecturas del feed de cambios para los eventos de stock
+INTERVALO_EVENTOS = float(os.environ.get("INVENTARIO_EVENTOS_INTERVALO", "1.0"))
+# Con esta inactividad se envía un latido para mantener viva la conexión
+LATIDO_EVENTOS = 15.0
+# Segundos entre consultas del estado de un trabajo al esperarlo
+INTERVALO_TRABAJOS = 0.25
+
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    """Precarga el inventario al iniciar cada worker y cierra sus conexiones al detenerse"""
+    inventario.calentar()
+    # El índice de la búsqueda por similitud se construye en un hilo para no
+    # demorar el arranque; las búsquedas que lleguen antes esperan a que termine
+    app.state.precarga_busqueda = asyncio.create_task(asyncio.to_thread(inventario.preparar_busqueda))
+    # Los eventos de las escrituras de otros workers y procesos llegan por el feed de cambios
+    seguimiento = asyncio.create_task(seguir_cambios(inventario, INTERVALO_EVENTOS))
+    yield
+    seguimiento.cancel()
+    # Nada debe seguir usando el inventario al cerrarlo: se espera a las
+    # tareas de fondo y a los trabajos que están corriendo
+    for tarea in (seguimiento, app.state.precarga_busqueda):
+        with suppress(asyncio.CancelledError, Exception):
+            await tarea
+    await asyncio.to_thread(trabajos.cerrar)
+    inventario.cerrar()
 
 # Crear instancia de FastAPI
 app = FastAPI(
     title="API Sistema de Inventario",
     description="API REST para gestionar productos en el inventario",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=ciclo_de_vida
 )
 
+# Las rutas marcan el inicio y fin de cada endpoint en la traza de la solicitud
+app.router.route_class = RutaTrazada
+
 # Configurar CORS
 app.add_middleware(
     CORSMiddleware,
@@ -18,18 +86,37 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Siguiente-Cursor", "Link"],
 )
 
-# Inicializar manejador de inventario
-inventario = InventarioManager()
+# Métricas operativas por solicitud (expuestas en /metrics)
+app.add_middleware(MiddlewareMetricas)
+
+# Trazas por solicitud con cabecera Server-Timing (y log JSONL opcional)
+app.add_middleware(MiddlewareTrazas)
 
 # Modelos Pydantic
+def validar_precio(precio: Optional[float]) -> Optional[float]:
+    """
+    Valida un precio en pesos: se guarda en centavos, así que admite a lo
+    sumo dos decimales (se tolera el ruido de un float, como 0.1 + 0.2).
+    """
+    if precio is None:
+        return None
+    centavos = a_centavos(precio)
+    if abs(precio * 100 - centavos) > 1e-6:
+        raise ValueError("El precio admite a lo sumo dos decimales")
+    return a_unidades(centavos)
+
 class ProductoBase(BaseModel):
     nombre: str
     descripcion: Optional[str] = ""
     cantidad: int
     precio: float
     categoria: Optional[str] = ""
+    stock_minimo: int = 0
+    
+    _validar_precio = field_validator("precio")(validar_precio)
 
 class ProductoCreate(ProductoBase):
     pass
@@ -40,6 +127,9 @@ class ProductoUpdate(BaseModel):
     cantidad: Optional[int] = None
     precio: Optional[float] = None
     categoria: Optional[str] = None
+    stock_minimo: Optional[int] = None
+    
+    _validar_precio = field_validator("precio")(validar_precio)
 
 class ProductoResponse(ProductoBase):
     id: int
@@ -47,6 +137,306 @@ class ProductoResponse(ProductoBase):
     class Config:
         from_attributes = True
 
+class Sugerencia(BaseModel):
+    tipo: str
+    texto: str
+    productos: int
+
+class FacetaCategoria(BaseModel):
+    id: Optional[int]
+    nombre: str
+    productos: int
+
+class FacetasResponse(BaseModel):
+    categorias: List[FacetaCategoria]
+
+class ProductoSimilar(ProductoResponse):
+    similitud: float
+
+class ProductoEliminado(BaseModel):
+    id: int
+    version: int
+
+class CambiosResponse(BaseModel):
+    productos: List[ProductoResponse]
+    eliminados: List[ProductoEliminado]
+    hasta: int
+    hay_mas: bool
+
+class ConsultaLote(BaseModel):
+    ids: List[int]
+
+class LoteResponse(BaseModel):
+    productos: List[ProductoResponse]
+    faltantes: List[int]
+
+class TrabajoCreate(BaseModel):
+    tipo: str
+    parametros: Dict[str, Any] = {}
+
+class TrabajoResponse(BaseModel):
+    id: str
+    tipo: str
+    parametros: Dict[str, Any]
+    estado: str
+    creado_en: float
+    iniciado_en: Optional[float] = None
+    terminado_en: Optional[float] = None
+    expira_en: float
+    filas: Optional[int] = None
+    error: Optional[str] = None
+    resultado: Optional[str] = None
+
+# Respuestas rápidas: las filas de la base ya son datos confiables, así que
+# se codifican directo a JSON sin pasar por Producto, to_dict() y la
+# validación de response_model (que se mantiene en los decoradores para el
+# esquema OpenAPI)
+def codificar_json(contenido: Any) -> bytes:
+    """Codifica a JSON compacto, con orjson si está disponible"""
+    if ORJSON_DISPONIBLE:
+        return orjson.dumps(contenido)
+    return json.dumps(contenido, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class RespuestaJSONRapida(Response):
+    media_type = "application/json"
+    
+    def render(self, content: Any) -> bytes:
+        return codificar_json(content)
+
+# Formatos de los listados, elegidos con la cabecera Accept. Los formatos
+# columnares envían los nombres de columna una sola vez:
+# {"columns": [...], "data": [[...], ...]}
+TIPO_JSON = "application/json"
+TIPO_COLUMNAS = "application/vnd.inventario.columnas+json"
+TIPO_MSGPACK = "application/msgpack"
+_ALIAS_TIPOS = {"application/x-msgpack": TIPO_MSGPACK}
+
+RESPUESTAS_ALTERNATIVAS = {200: {"content": {
+    TIPO_COLUMNAS: {"schema": {"type": "object", "properties": {
+        "columns": {"type": "array", "items": {"type": "string"}},
+        "data": {"type": "array", "items": {"type": "array", "items": {}}}
+    }}},
+    TIPO_MSGPACK: {"schema": {"type": "string", "format": "binary"}}
+}}}
+
+def negociar_formato(accept: Optional[str]) -> str:
+    """
+    Elige el formato de un listado según la cabecera Accept.
+    
+    Respeta los valores q y el orden de la cabecera; si no se pide ningún
+    formato disponible (o MessagePack no está instalado) responde JSON.
+    """
+    disponibles = {TIPO_JSON, TIPO_COLUMNAS}
+    if MSGPACK_DISPONIBLE:
+        disponibles.add(TIPO_MSGPACK)
+    
+    candidatos = []
+    for orden, parte in enumerate((accept or "").split(",")):
+        tipo, *parametros = [valor.strip() for valor in parte.split(";")]
+        tipo = tipo.lower()
+        tipo = _ALIAS_TIPOS.get(tipo, tipo)
+        calidad = 1.0
+        for parametro in parametros:
+            if parametro.startswith("q="):
+                try:
+                    calidad = float(parametro[2:])
+                except ValueError:
+                    calidad = 0.0
+        if calidad > 0 and tipo in disponibles:
+            candidatos.append((-calidad, orden, tipo))
+    return min(candidatos)[2] if candidatos else TIPO_JSON
+
+# Proyección de columnas (?fields=id,cantidad): se valida contra COLUMNAS y
+# se aplica en el SELECT, así las columnas no pedidas ni se leen de la base
+CAMPOS = Query(None, description="Columnas a devolver, separadas por comas (p. ej. id,cantidad)")
+
+def campos_pedidos(fields: Optional[str]) -> Tuple[str, ...]:
+    """Convierte el parámetro fields en columnas validadas (todas si no se indica)"""
+    if fields is None:
+        return COLUMNAS
+    try:
+        return seleccionar_columnas(campo.strip() for campo in fields.split(",") if campo.strip())
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+def codificar_filas(filas: Sequence[tuple], formato: str = TIPO_JSON,
+                    columnas: Sequence[str] = COLUMNAS) -> bytes:
+    """Codifica filas en el orden de 'columnas' en el formato indicado (el precio llega en centavos y sale en pesos)"""
+    filas = filas_en_pesos(filas, columnas)
+    if formato == TIPO_MSGPACK:
+        return msgpack.packb({"columns": columnas, "data": filas})
+    if formato == TIPO_COLUMNAS:
+        return codificar_json({"columns": columnas, "data": filas})
+    return codificar_json([dict(zip(columnas, fila)) for fila in filas])
+
+def responder_filas(filas: Sequence[tuple], request: Optional[Request] = None,
+                    columnas: Sequence[str] = COLUMNAS) -> Response:
+    """Responde un listado en el formato negociado con el cliente (JSON por defecto)"""
+    formato = negociar_formato(request.headers.get("accept") if request is not None else None)
+    return Response(codificar_filas(filas, formato, columnas), media_type=formato, headers={"Vary": "Accept"})
+
+def responder_fila(fila: tuple, columnas: Sequence[str] = COLUMNAS,
+                   cabeceras: Optional[Dict[str, str]] = None) -> RespuestaJSONRapida:
+    """Codifica una fila en el orden de 'columnas' como un objeto JSON"""
+    return RespuestaJSONRapida(dict(zip(columnas, filas_en_pesos([fila], columnas)[0])), headers=cabeceras)
+
+# Máximo de ids por consulta de lote (un carrito grande entra de sobra)
+MAXIMO_IDS_LOTE = 1000
+
+def responder_lote(filas: Sequence[tuple], faltantes: List[int], request: Request,
+                   columnas: Sequence[str] = COLUMNAS) -> Response:
+    """
+    Responde una búsqueda por lote en el formato negociado: en JSON como
+    {"productos": [...], "faltantes": [...]}; en los formatos columnares
+    agrega "faltantes" junto a "columns" y "data".
+    """
+    formato = negociar_formato(request.headers.get("accept"))
+    filas = filas_en_pesos(filas, columnas)
+    if formato == TIPO_JSON:
+        contenido = codificar_json({"productos": [dict(zip(columnas, fila)) for fila in filas], "faltantes": faltantes})
+    else:
+        datos = {"columns": columnas, "data": filas, "faltantes": faltantes}
+        contenido = msgpack.packb(datos) if formato == TIPO_MSGPACK else codificar_json(datos)
+    return Response(contenido, media_type=formato, headers={"Vary": "Accept"})
+
+def consultar_lote(ids: List[int], request: Request, fields: Optional[str]) -> Response:
+    """Valida y resuelve una búsqueda por lote para los dos endpoints de lote"""
+    campos = campos_pedidos(fields)
+    if not ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Debe indicar al menos un id")
+    if len(ids) > MAXIMO_IDS_LOTE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Se admiten hasta {MAXIMO_IDS_LOTE} ids por consulta"
+        )
+    try:
+        filas, faltantes = inventario.buscar_productos_por_ids(ids, columnas=campos)
+        return responder_lote(filas, faltantes, request, campos)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al buscar productos: {str(e)}"
+        )
+
+# Solicitudes condicionales: los ETag salen de la versión de la fila (un
+# producto) o del contador de cambios de la tabla (listados, estadísticas),
+# así un 304 se decide sin leer ni serializar los datos. Las versiones se
+# leen antes que los datos: si hay una escritura en el medio, el ETag queda
+# más viejo que el cuerpo y el cliente solo vuelve a pedirlo de más.
+_ETAG_PRODUCTO = re.compile(r'^"(\d+)-(\d+)(?:-[0-9a-f]+)?"$')
+
+def etiqueta(base: str, formato: str = TIPO_JSON, campos: Sequence[str] = COLUMNAS) -> str:
+    """
+    Construye un ETag fuerte. Cada representación (formato y columnas)
+    tiene su propio ETag, que agrega un resumen de ambas a la versión.
+    """
+    if formato == TIPO_JSON and tuple(campos) == COLUMNAS:
+        return f'"{base}"'
+    variante = hashlib.blake2s(f"{formato};{','.join(campos)}".encode(), digest_size=4).hexdigest()
+    return f'"{base}-{variante}"'
+
+def cabeceras_cache(etag: str, actualizado_en: int, vary: bool = False) -> Dict[str, str]:
+    """Cabeceras de validación: ETag, Last-Modified y revalidación obligatoria"""
+    cabeceras = {"ETag": etag, "Last-Modified": formatdate(actualizado_en, usegmt=True), "Cache-Control": "no-cache"}
+    if vary:
+        cabeceras["Vary"] = "Accept"
+    return cabeceras
+
+def no_modificado(request: Request, cabeceras: Dict[str, str]) -> bool:
+    """
+    Evalúa If-None-Match (comparación débil) o, si no viene, If-Modified-Since.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        actual = cabeceras["ETag"]
+        return any(valor.strip() in ("*", actual, f"W/{actual}") for valor in if_none_match.split(","))
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            desde = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return parsedate_to_datetime(cabeceras["Last-Modified"]).timestamp() <= desde
+    return False
+
+def respuesta_condicional(request: Request, cabeceras: Dict[str, str]) -> Optional[Response]:
+    """Devuelve un 304 si la copia del cliente sigue vigente, o None para responder completo"""
+    if no_modificado(request, cabeceras):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cabeceras)
+    return None
+
+def version_precondicion(request: Request, producto_id: int) -> Optional[int]:
+    """
+    Evalúa If-Match (comparación fuerte) contra la versión actual del producto.
+    
+    Acepta el ETag de cualquier representación del producto en su versión
+    actual (con o sin ?fields=).
+    
+    Returns:
+        La versión a usar para comparar y actualizar, o None si no hay If-Match
+        
+    Raises:
+        HTTPException: 404 si el producto no existe, 412 si la versión no coincide
+    """
+    actual = inventario.obtener_version_producto(producto_id)
+    if actual is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Producto con ID {producto_id} no encontrado"
+        )
+    if_match = request.headers.get("if-match")
+    if if_match is None:
+        return None
+    
+    version = actual[0]
+    for valor in if_match.split(","):
+        valor = valor.strip()
+        coincidencia = _ETAG_PRODUCTO.match(valor)
+        if valor == "*" or (coincidencia and int(coincidencia.group(1)) == producto_id
+                            and int(coincidencia.group(2)) == version):
+            return version
+    raise HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail=f"El producto {producto_id} fue modificado (versión actual {version})"
+    )
+
+def cabeceras_producto(producto_id: int, campos: Sequence[str] = COLUMNAS) -> Dict[str, str]:
+    """Cabeceras de validación de un producto según su versión actual (vacías si no existe)"""
+    actual = inventario.obtener_version_producto(producto_id)
+    if actual is None:
+        return {}
+    version, actualizado_en = actual
+    return cabeceras_cache(etiqueta(f"{producto_id}-{version}", campos=campos), actualizado_en)
+
+def iterar_exportacion(formato: str, columnas: Sequence[str] = COLUMNAS) -> Iterator[bytes]:
+    """
+    Codifica el inventario completo lote por lote para enviarlo en streaming.
+    
+    JSON y el formato columnar producen un único documento. MessagePack
+    produce una secuencia de objetos: la lista de columnas y luego una fila
+    por objeto, para que el cliente pueda decodificar a medida que recibe.
+    """
+    lotes = (filas_en_pesos(lote, columnas) for lote in inventario.exportar_productos(columnas=columnas))
+    if formato == TIPO_MSGPACK:
+        empaquetador = msgpack.Packer()
+        yield empaquetador.pack(columnas)
+        for lote in lotes:
+            yield b"".join(empaquetador.pack(fila) for fila in lote)
+        return
+    
+    if formato == TIPO_COLUMNAS:
+        yield b'{"columns":' + codificar_json(columnas) + b',"data":['
+    else:
+        yield b"["
+    separador = b""
+    for lote in lotes:
+        filas = lote if formato == TIPO_COLUMNAS else [dict(zip(columnas, fila)) for fila in lote]
+        # Cada lote se codifica como arreglo y se le quitan los corchetes
+        yield separador + codificar_json(filas)[1:-1]
+        separador = b","
+    yield b"]}" if formato == TIPO_COLUMNAS else b"]"
+
 # Endpoints
 @app.get("/", summary="Página de inicio")
 async def root():
@@ -56,23 +446,30 @@ async def root():
         "documentacion": "/docs"
     }
 
+@app.get("/metrics", summary="Métricas en formato Prometheus", include_in_schema=False)
+async def metricas():
+    """Expone las métricas operativas en el formato de texto de Prometheus"""
+    return Response(content=registro.exponer(), media_type=TIPO_CONTENIDO)
+
 @app.post("/productos/", response_model=ProductoResponse, summary="Registrar nuevo producto")
-async def crear_producto(producto: ProductoCreate):
+def crear_producto(producto: ProductoCreate, fields: Optional[str] = CAMPOS):
     """Registra un nuevo producto en el inventario"""
+    campos = campos_pedidos(fields)
     try:
         nuevo_producto = Producto(
             nombre=producto.nombre,
             descripcion=producto.descripcion,
             cantidad=producto.cantidad,
             precio=producto.precio,
-            categoria=producto.categoria
+            categoria=producto.categoria,
+            stock_minimo=producto.stock_minimo
         )
         
         if inventario.registrar_producto(nuevo_producto):
-            # Obtener el producto recién creado para devolver con ID
-            productos = inventario.obtener_todos_los_productos()
-            producto_creado = max(productos, key=lambda x: x.id)
-            return producto_creado.to_dict()
+            # registrar_producto asigna el ID generado al producto
+            producto_creado = nuevo_producto.to_dict()
+            return RespuestaJSONRapida({campo: producto_creado[campo] for campo in campos},
+                                       headers=cabeceras_producto(nuevo_producto.id, campos))
         else:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -84,25 +481,178 @@ async def crear_producto(producto: ProductoCreate):
             detail=f"Error interno: {str(e)}"
         )
 
-@app.get("/productos/", response_model=List[ProductoResponse], summary="Obtener todos los productos")
-async def obtener_productos():
+@app.get("/productos/", response_model=List[ProductoResponse], responses=RESPUESTAS_ALTERNATIVAS,
+         summary="Obtener todos los productos")
+def obtener_productos(request: Request, fields: Optional[str] = CAMPOS):
     """Obtiene la lista completa de productos"""
+    campos = campos_pedidos(fields)
     try:
-        productos = inventario.obtener_todos_los_productos()
-        return [producto.to_dict() for producto in productos]
+        contador, actualizado_en = inventario.obtener_version_inventario()
+        formato = negociar_formato(request.headers.get("accept"))
+        cabeceras = cabeceras_cache(etiqueta(str(contador), formato, campos), actualizado_en, vary=True)
+        no_modificada = respuesta_condicional(request, cabeceras)
+        if no_modificada:
+            return no_modificada
+        
+        respuesta = responder_filas(inventario.obtener_todos_los_productos(columnas=campos), request, campos)
+        respuesta.headers.update(cabeceras)
+        return respuesta
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error al obtener productos: {str(e)}"
         )
 
+@app.get("/productos/exportar", response_model=List[ProductoResponse], responses=RESPUESTAS_ALTERNATIVAS,
+         summary="Exportar todo el inventario")
+async def exportar_productos(request: Request, fields: Optional[str] = CAMPOS):
+    """Exporta todos los productos en streaming, en el formato pedido con Accept"""
+    campos = campos_pedidos(fields)
+    formato = negociar_formato(request.headers.get("accept"))
+    return StreamingResponse(iterar_exportacion(formato, campos), media_type=formato, headers={"Vary": "Accept"})
+
+@app.get("/productos/cambios", response_model=CambiosResponse, summary="Cambios desde una versión")
+def obtener_cambios(desde: int = Query(0, ge=0, description="Última versión sincronizada (0 para todo)"),
+                    limite: int = Query(1000, ge=1, le=10000, description="Máximo de cambios por página"),
+                    fields: Optional[str] = CAMPOS):
+    """
+    Devuelve los productos creados o modificados y los eliminados después de
+    'desde', en orden de versión. Mientras hay_mas sea true, se pide la
+    siguiente página con desde=hasta.
+    """
+    campos = campos_pedidos(fields)
+    try:
+        cambios = inventario.obtener_cambios(desde, limite, columnas=campos)
+        columnas = (*campos, "version")
+        return RespuestaJSONRapida({
+            "productos": [dict(zip(columnas, fila)) for fila in filas_en_pesos(cambios['productos'], columnas)],
+            "eliminados": [{"id": id_producto, "version": version} for id_producto, version in cambios['eliminados']],
+            "hasta": cambios['hasta'],
+            "hay_mas": cambios['hay_mas']
+        })
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener cambios: {str(e)}"
+        )
+
+@app.get("/productos/lote", response_model=LoteResponse, responses=RESPUESTAS_ALTERNATIVAS,
+         summary="Buscar varios productos por ID")
+def obtener_lote(request: Request,
+                 ids: str = Query(..., description="IDs separados por comas (p. ej. 3,1,7)"),
+                 fields: Optional[str] = CAMPOS):
+    """Busca varios productos en una sola consulta, en el orden pedido, e informa los ids inexistentes"""
+    try:
+        lista_ids = [int(valor) for valor in ids.split(",") if valor.strip()]
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Los ids deben ser enteros separados por comas")
+    return consultar_lote(lista_ids, request, fields)
+
+@app.post("/productos/lote/consulta", response_model=LoteResponse, responses=RESPUESTAS_ALTERNATIVAS,
+          summary="Buscar varios productos por ID (cuerpo JSON)")
+def consultar_lote_por_cuerpo(consulta: ConsultaLote, request: Request, fields: Optional[str] = CAMPOS):
+    """Igual que GET /productos/lote, con los ids en el cuerpo para listas largas"""
+    return consultar_lote(consulta.ids, request, fields)
+
+@app.get("/productos/sugerencias", response_model=List[Sugerencia], summary="Autocompletar nombres y categorías")
+def sugerir(q: str = Query(..., min_length=1, description="Texto escrito hasta ahora"),
+            limite: int = Query(10, ge=1, le=50, description="Cantidad máxima de sugerencias")):
+    """
+    Completa el texto escrito con categorías y nombres de productos que
+    empiezan igual, sin distinguir mayúsculas ni acentos. Se responde desde
+    un índice en memoria, pensado para consultar en cada tecla.
+    """
+    return RespuestaJSONRapida(inventario.sugerir_productos(q, limite))
+
+@app.get("/productos/facetas", response_model=FacetasResponse, summary="Productos por categoría")
+def obtener_facetas(request: Request):
+    """
+    Cantidad de productos de cada categoría, de mayor a menor, para armar
+    filtros. Se cuenta sobre el índice de categorías sin leer los productos;
+    los productos sin categoría aparecen con id null.
+    """
+    try:
+        contador, actualizado_en = inventario.obtener_version_inventario()
+        cabeceras = cabeceras_cache(etiqueta(f"facetas-{contador}"), actualizado_en)
+        no_modificada = respuesta_condicional(request, cabeceras)
+        if no_modificada:
+            return no_modificada
+        
+        facetas = inventario.obtener_facetas_categorias()
+        return RespuestaJSONRapida({
+            "categorias": [{"id": categoria_id, "nombre": nombre, "productos": total}
+                           for categoria_id, nombre, total in facetas]
+        }, headers=cabeceras)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener facetas: {str(e)}"
+        )
+
+@app.get("/productos/consulta", response_model=List[ProductoResponse], responses=RESPUESTAS_ALTERNATIVAS,
+         summary="Buscar combinando filtros y orden")
+def consultar_productos(
+    request: Request,
+    fields: Optional[str] = CAMPOS,
+    categoria: Optional[str] = Query(None, description="Categoría exacta (sin distinguir mayúsculas ni acentos)"),
+    precio_min: Optional[float] = Query(None, ge=0),
+    precio_max: Optional[float] = Query(None, ge=0),
+    cantidad_min: Optional[int] = Query(None, ge=0),
+    cantidad_max: Optional[int] = Query(None, ge=0, description="Stock igual o menor a este valor"),
+    valor_min: Optional[float] = Query(None, ge=0, description="Valor en stock (cantidad * precio) mínimo"),
+    valor_max: Optional[float] = Query(None, ge=0),
+    texto: Optional[str] = Query(None, min_length=1, description="Texto contenido en el nombre"),
+    a_reponer: bool = Query(False, description="Solo productos en su stock mínimo o por debajo"),
+    orden: str = Query("id", description="Claves de orden separadas por comas, '-' para descendente (ej. -valor)"),
+    limite: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO, description="Productos por página"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página anterior (cabecera X-Siguiente-Cursor)"),
+):
+    """
+    Combina filtros por categoría, rangos de precio, cantidad y valor,
+    texto del nombre y productos a reponer, ordenados por una o varias
+    claves (id, nombre, precio, cantidad, stock_minimo, valor), en una
+    sola consulta.
+    
+    La respuesta se pagina por clave: si hay más productos, la cabecera
+    X-Siguiente-Cursor trae el cursor de la página siguiente (y Link su
+    URL). En un inventario grande, una combinación sin índice (solo texto,
+    o sin filtros y ordenada por nombre o stock_minimo) responde 400.
+    """
+    campos = campos_pedidos(fields)
+    filtros = {
+        "categoria": categoria, "precio_min": precio_min, "precio_max": precio_max,
+        "cantidad_min": cantidad_min, "cantidad_max": cantidad_max,
+        "valor_min": valor_min, "valor_max": valor_max, "texto": texto, "a_reponer": a_reponer,
+    }
+    try:
+        filas, siguiente = inventario.consultar_productos(filtros, orden, limite, cursor, columnas=campos)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al consultar productos: {str(e)}"
+        )
+    respuesta = responder_filas(filas, request, campos)
+    if siguiente:
+        respuesta.headers["X-Siguiente-Cursor"] = siguiente
+        respuesta.headers["Link"] = f'<{request.url.include_query_params(cursor=siguiente)}>; rel="next"'
+    return respuesta
+
 @app.get("/productos/{producto_id}", response_model=ProductoResponse, summary="Buscar producto por ID")
-async def obtener_producto(producto_id: int):
+def obtener_producto(producto_id: int, request: Request, fields: Optional[str] = CAMPOS):
     """Busca un producto específico por su ID"""
+    campos = campos_pedidos(fields)
     try:
-        producto = inventario.buscar_producto_por_id(producto_id)
-        if producto:
-            return producto.to_dict()
+        cabeceras = cabeceras_producto(producto_id, campos)
+        if cabeceras:
+            no_modificada = respuesta_condicional(request, cabeceras)
+            if no_modificada:
+                return no_modificada
+        
+        fila = inventario.buscar_producto_por_id(producto_id, columnas=campos)
+        if fila:
+            return responder_fila(fila, campos, cabeceras)
         else:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -116,24 +666,56 @@ async def obtener_producto(producto_id: int):
             detail=f"Error al buscar producto: {str(e)}"
         )
 
-@app.get("/productos/buscar/nombre/{nombre}", response_model=List[ProductoResponse], summary="Buscar por nombre")
-async def buscar_por_nombre(nombre: str):
+@app.get("/productos/buscar/nombre/{nombre}", response_model=List[ProductoResponse],
+         responses=RESPUESTAS_ALTERNATIVAS, summary="Buscar por nombre")
+def buscar_por_nombre(nombre: str, request: Request, fields: Optional[str] = CAMPOS):
     """Busca productos por nombre (búsqueda parcial)"""
+    campos = campos_pedidos(fields)
     try:
-        productos = inventario.buscar_productos_por_nombre(nombre)
-        return [producto.to_dict() for producto in productos]
+        return responder_filas(inventario.buscar_productos_por_nombre(nombre, columnas=campos), request, campos)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error al buscar productos: {str(e)}"
         )
 
-@app.get("/productos/categoria/{categoria}", response_model=List[ProductoResponse], summary="Buscar por categoría")
-async def buscar_por_categoria(categoria: str):
+@app.get("/productos/buscar/similares/{texto}", response_model=List[ProductoSimilar],
+         responses=RESPUESTAS_ALTERNATIVAS, summary="Buscar por nombre con tolerancia a errores")
+def buscar_similares(texto: str, request: Request, fields: Optional[str] = CAMPOS,
+                     limite: int = Query(10, ge=1, le=100, description="Cantidad máxima de resultados"),
+                     presupuesto_ms: float = Query(50.0, gt=0, le=1000,
+                                                   description="Tiempo máximo de búsqueda en el índice")):
+    """
+    Busca productos por nombre tolerando errores de tipeo, acentos y
+    mayúsculas ("samsumg" encuentra "Samsung"), de más a menos parecidos.
+    
+    Cada resultado trae una columna "similitud" entre 0 y 1. La cabecera
+    X-Busqueda-Completa es "false" si el presupuesto de tiempo cortó la
+    búsqueda antes de recorrer todo el índice.
+    """
+    campos = campos_pedidos(fields)
+    try:
+        resultados, completa = inventario.buscar_productos_similares(
+            texto, limite=limite, presupuesto_ms=presupuesto_ms, columnas=campos)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al buscar productos: {str(e)}"
+        )
+    respuesta = responder_filas([fila + (similitud,) for fila, similitud in resultados], request,
+                                campos + ("similitud",))
+    respuesta.headers["X-Busqueda-Completa"] = "true" if completa else "false"
+    return respuesta
+
+@app.get("/productos/categoria/{categoria}", response_model=List[ProductoResponse],
+         responses=RESPUESTAS_ALTERNATIVAS, summary="Buscar por categoría")
+def buscar_por_categoria(categoria: str, request: Request, fields: Optional[str] = CAMPOS):
     """Busca productos por categoría"""
+    campos = campos_pedidos(fields)
     try:
-        productos = inventario.buscar_productos_por_categoria(categoria)
-        return [producto.to_dict() for producto in productos]
+        return responder_filas(inventario.buscar_productos_por_categoria(categoria, columnas=campos), request, campos)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -141,16 +723,16 @@ async def buscar_por_categoria(categoria: str):
         )
 
 @app.put("/productos/{producto_id}", response_model=ProductoResponse, summary="Actualizar producto")
-async def actualizar_producto(producto_id: int, producto_update: ProductoUpdate):
-    """Actualiza los datos de un producto existente"""
+def actualizar_producto(producto_id: int, producto_update: ProductoUpdate, request: Request,
+                        fields: Optional[str] = CAMPOS):
+    """Actualiza los datos de un producto existente (con If-Match, solo si no cambió)"""
+    campos = campos_pedidos(fields)
+    if not producto_update.model_dump(exclude_none=True):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="No se especificaron campos para actualizar")
     try:
-        # Verificar si el producto existe
-        producto_existente = inventario.buscar_producto_por_id(producto_id)
-        if not producto_existente:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Producto con ID {producto_id} no encontrado"
-            )
+        # Verificar que el producto exista y, si se envió If-Match, su versión
+        version_esperada = version_precondicion(request, producto_id)
         
         # Actualizar solo los campos proporcionados
         success = inventario.actualizar_producto(
@@ -159,18 +741,27 @@ async def actualizar_producto(producto_id: int, producto_update: ProductoUpdate)
             descripcion=producto_update.descripcion,
             cantidad=producto_update.cantidad,
             precio=producto_update.precio,
-            categoria=producto_update.categoria
+            categoria=producto_update.categoria,
+            stock_minimo=producto_update.stock_minimo,
+            version_esperada=version_esperada
         )
         
         if success:
             # Devolver el producto actualizado
-            producto_actualizado = inventario.buscar_producto_por_id(producto_id)
-            return producto_actualizado.to_dict()
-        else:
+            cabeceras = cabeceras_producto(producto_id, campos)
+            return responder_fila(inventario.buscar_producto_por_id(producto_id, columnas=campos), campos, cabeceras)
+        actual = inventario.obtener_version_producto(producto_id) if version_esperada is not None else None
+        if actual is not None and actual != version_esperada:
+            # El UPDATE condicional no encontró la fila en la versión
+            # esperada: otra escritura ganó entre la verificación y la actualización
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Error al actualizar el producto"
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail=f"El producto {producto_id} fue modificado durante la actualización"
             )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Error al actualizar el producto"
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -180,12 +771,18 @@ async def actualizar_producto(producto_id: int, producto_update: ProductoUpdate)
         )
 
 @app.delete("/productos/{producto_id}", summary="Eliminar producto")
-async def eliminar_producto(producto_id: int):
-    """Elimina un producto del inventario"""
+def eliminar_producto(producto_id: int, request: Request):
+    """Elimina un producto del inventario (con If-Match, solo si no cambió)"""
     try:
-        success = inventario.eliminar_producto(producto_id)
+        version_esperada = version_precondicion(request, producto_id)
+        success = inventario.eliminar_producto(producto_id, version_esperada=version_esperada)
         if success:
             return {"mensaje": f"Producto {producto_id} eliminado exitosamente"}
+        elif version_esperada is not None and inventario.obtener_version_producto(producto_id) is not None:
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail=f"El producto {producto_id} fue modificado antes de eliminarlo"
+            )
         else:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -199,9 +796,11 @@ async def eliminar_producto(producto_id: int):
             detail=f"Error al eliminar producto: {str(e)}"
         )
 
-@app.get("/reportes/stock-bajo/{limite}", response_model=List[ProductoResponse], summary="Reporte stock bajo")
-async def reporte_stock_bajo(limite: int):
+@app.get("/reportes/stock-bajo/{limite}", response_model=List[ProductoResponse],
+         responses=RESPUESTAS_ALTERNATIVAS, summary="Reporte stock bajo")
+def reporte_stock_bajo(limite: int, request: Request, fields: Optional[str] = CAMPOS):
     """Genera reporte de productos con stock igual o inferior al límite"""
+    campos = campos_pedidos(fields)
     try:
         if limite < 0:
             raise HTTPException(
@@ -209,8 +808,7 @@ async def reporte_stock_bajo(limite: int):
                 detail="El límite de stock no puede ser negativo"
             )
         
-        productos = inventario.generar_reporte_stock_bajo(limite)
-        return [producto.to_dict() for producto in productos]
+        return responder_filas(inventario.generar_reporte_stock_bajo(limite, columnas=campos), request, campos)
     except HTTPException:
         raise
     except Exception as e:
@@ -219,45 +817,226 @@ async def reporte_stock_bajo(limite: int):
             detail=f"Error al generar reporte: {str(e)}"
         )
 
+@app.get("/reportes/reposicion", response_model=List[ProductoResponse],
+         responses=RESPUESTAS_ALTERNATIVAS, summary="Reporte de productos a reponer")
+def reporte_reposicion(request: Request, fields: Optional[str] = CAMPOS):
+    """Productos con stock igual o inferior a su propio stock mínimo, de menor a mayor stock"""
+    campos = campos_pedidos(fields)
+    try:
+        return responder_filas(inventario.generar_reporte_stock_bajo(columnas=campos), request, campos)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al generar reporte: {str(e)}"
+        )
+
 @app.get("/estadisticas", summary="Estadísticas del inventario")
-async def obtener_estadisticas():
+def obtener_estadisticas(request: Request):
     """Obtiene estadísticas generales del inventario"""
     try:
-        productos = inventario.obtener_todos_los_productos()
-        
-        if not productos:
-            return {
-                "total_productos": 0,
-                "stock_total": 0,
-                "valor_inventario": 0.0,
-                "productos_sin_stock": 0,
-                "categorias": []
-            }
+        contador, actualizado_en = inventario.obtener_version_inventario()
+        cabeceras = cabeceras_cache(etiqueta(str(contador)), actualizado_en)
+        no_modificada = respuesta_condicional(request, cabeceras)
+        if no_modificada:
+            return no_modificada
         
-        total_productos = len(productos)
-        stock_total = sum(p.cantidad for p in productos)
-        valor_inventario = sum(p.cantidad * p.precio for p in productos)
-        productos_sin_stock = len([p for p in productos if p.cantidad == 0])
+        # Totales agregados en SQL; el valor se suma en centavos (exacto) y
+        # se pasa a pesos solo al responder
+        resumen = inventario.obtener_resumen_inventario()
         
-        # Contar productos por categoría
-        categorias = {}
-        for producto in productos:
-            cat = producto.categoria or "Sin categoría"
-            categorias[cat] = categorias.get(cat, 0) + 1
+        # Productos por categoría, contados sobre el índice
+        categorias = {nombre: total for _, nombre, total in inventario.obtener_facetas_categorias()}
         
-        return {
-            "total_productos": total_productos,
-            "stock_total": stock_total,
-            "valor_inventario": round(valor_inventario, 2),
-            "productos_sin_stock": productos_sin_stock,
+        return RespuestaJSONRapida({
+            "total_productos": resumen['total_productos'],
+            "stock_total": resumen['stock_total'],
+            "valor_inventario": a_unidades(resumen['valor_inventario_centavos']),
+            "productos_sin_stock": resumen['productos_sin_stock'],
+            "productos_a_reponer": inventario.contar_productos_a_reponer(),
             "categorias": categorias
-        }
+        }, headers=cabeceras)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error al obtener estadísticas: {str(e)}"
         )
 
-if __name__ == "__main__":
+# Trabajos: los reportes pesados se envían, se consultan (o se espera su
+# estado) y el resultado se descarga cuando está listo
+def describir_trabajo(trabajo: Dict[str, Any]) -> Dict[str, Any]:
+    """Estado público de un trabajo: sin la ruta del archivo y con la URL del resultado"""
+    datos = {clave: valor for clave, valor in trabajo.items() if clave != "archivo"}
+    datos["resultado"] = f"/trabajos/{trabajo['id']}/resultado" if trabajo["estado"] == "terminado" else None
+    return datos
+
+def trabajo_existente(trabajo_id: str) -> Dict[str, Any]:
+    """Obtiene el trabajo o responde 404"""
+    trabajo = trabajos.obtener(trabajo_id)
+    if trabajo is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Trabajo {trabajo_id} no encontrado o vencido"
+        )
+    return trabajo
+
+@app.post("/trabajos/", response_model=TrabajoResponse, status_code=status.HTTP_202_ACCEPTED,
+          summary="Enviar un reporte en segundo plano")
+def enviar_trabajo(pedido: TrabajoCreate):
+    """
+    Envía un reporte ('valorizacion', 'stock_bajo' o 'exportacion'). Si un
+    pedido igual ya está en curso o terminó hace menos del TTL, y el
+    inventario no cambió, devuelve ese mismo trabajo.
+    """
+    try:
+        trabajo, _ = trabajos.enviar(pedido.tipo, pedido.parametros)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except OverflowError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    
+    codigo = status.HTTP_200_OK if trabajo["estado"] == "terminado" else status.HTTP_202_ACCEPTED
+    return RespuestaJSONRapida(describir_trabajo(trabajo), status_code=codigo,
+                               headers={"Location": f"/trabajos/{trabajo['id']}"})
+
+@app.get("/trabajos/{trabajo_id}", response_model=TrabajoResponse, summary="Estado de un trabajo")
+async def estado_trabajo(trabajo_id: str,
+                         espera: float = Query(0, ge=0, le=60, description="Segundos a esperar a que termine")):
+    """Devuelve el estado del trabajo; con espera, responde apenas termina (long polling)"""
+    # Cada lectura va al pool de hilos para no frenar el event loop mientras se espera
+    trabajo = await run_in_threadpool(trabajo_existente, trabajo_id)
+    limite = asyncio.get_running_loop().time() + espera
+    while trabajo["estado"] not in ESTADOS_FINALES and asyncio.get_running_loop().time() < limite:
+        await asyncio.sleep(INTERVALO_TRABAJOS)
+        trabajo = await run_in_threadpool(trabajo_existente, trabajo_id)
+    return RespuestaJSONRapida(describir_trabajo(trabajo))
+
+@app.get("/trabajos/{trabajo_id}/eventos", summary="Estado de un trabajo (Server-Sent Events)")
+async def eventos_trabajo(trabajo_id: str):
+    """Envía un evento 'estado' con cada cambio de estado del trabajo, hasta que termina"""
+    trabajo = await run_in_threadpool(trabajo_existente, trabajo_id)
+    
+    async def flujo():
+        actual = trabajo
+        anterior = None
+        silencio = 0.0
+        while True:
+            if actual is None:
+                yield b'event: vencido\ndata: {}\n\n'
+                return
+            if actual["estado"] != anterior:
+                anterior = actual["estado"]
+                silencio = 0.0
+                yield b"event: estado\ndata: " + codificar_json(describir_trabajo(actual)) + b"\n\n"
+                if anterior in ESTADOS_FINALES:
+                    return
+            elif silencio >= LATIDO_EVENTOS:
+                silencio = 0.0
+                yield b": latido\n\n"
+            await asyncio.sleep(INTERVALO_TRABAJOS)
+            silencio += INTERVALO_TRABAJOS
+            actual = await run_in_threadpool(trabajos.obtener, trabajo_id)
+    
+    return StreamingResponse(flujo(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/trabajos/{trabajo_id}/resultado", summary="Resultado de un trabajo")
+def resultado_trabajo(trabajo_id: str):
+    """
+    Devuelve el resultado en JSON tal como quedó guardado. Mientras el
+    trabajo no termina responde 202 con su estado; si falló, 409.
+    """
+    trabajo = trabajo_existente(trabajo_id)
+    if trabajo["estado"] == "fallido":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"El trabajo {trabajo_id} falló: {trabajo['error']}"
+        )
+    if trabajo["estado"] != "terminado":
+        return RespuestaJSONRapida(describir_trabajo(trabajo), status_code=status.HTTP_202_ACCEPTED,
+                                   headers={"Retry-After": "1"})
+    return FileResponse(trabajo["archivo"], media_type=TIPO_JSON)
+
+# Eventos de stock: el cliente se suscribe con filtros (categoría, umbral de
+# stock) y recibe cada alta, modificación o baja que los pase
+def abrir_suscripcion(categoria: Optional[str], umbral: Optional[int], capacidad: int,
+                      politica: str) -> Suscripcion:
+    """Crea la suscripción o responde 400 (filtros inválidos) / 503 (sin lugar)"""
+    try:
+        return bus.suscribir(categoria=categoria, umbral_stock=umbral, capacidad=capacidad, politica=politica)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except OverflowError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+
+FILTRO_CATEGORIA = Query(None, description="Solo productos de esta categoría")
+FILTRO_UMBRAL = Query(None, ge=0, description="Solo cambios que dejan el stock en este valor o menos (o lo sacan de ese rango)")
+CAPACIDAD_BUFFER = Query(CAPACIDAD_POR_DEFECTO, ge=1, le=CAPACIDAD_MAXIMA, description="Eventos pendientes como máximo")
+POLITICA_BUFFER = Query("combinar", description="Con el buffer lleno: 'descartar' el más viejo o 'combinar' por producto")
+
+@app.get("/eventos/stock", summary="Eventos de stock (Server-Sent Events)")
+async def eventos_stock(categoria: Optional[str] = FILTRO_CATEGORIA, umbral: Optional[int] = FILTRO_UMBRAL,
+                        capacidad: int = CAPACIDAD_BUFFER, politica: str = POLITICA_BUFFER):
+    """Envía los cambios de stock a medida que ocurren, como Server-Sent Events"""
+    suscripcion = abrir_suscripcion(categoria, umbral, capacidad, politica)
+    
+    async def flujo():
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                eventos = await suscripcion.siguientes(LATIDO_EVENTOS)
+                yield b"".join(evento.sse() for evento in eventos) if eventos else b": latido\n\n"
+        finally:
+            bus.desuscribir(suscripcion)
+    
+    return StreamingResponse(flujo(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/ws/stock")
+async def eventos_stock_websocket(websocket: WebSocket, categoria: Optional[str] = FILTRO_CATEGORIA,
+                                  umbral: Optional[int] = FILTRO_UMBRAL, capacidad: int = CAPACIDAD_BUFFER,
+                                  politica: str = POLITICA_BUFFER):
+    """Igual que /eventos/stock, con un mensaje JSON por evento sobre WebSocket"""
+    try:
+        suscripcion = abrir_suscripcion(categoria, umbral, capacidad, politica)
+    except HTTPException as e:
+        await websocket.close(code=1013 if e.status_code == status.HTTP_503_SERVICE_UNAVAILABLE else 1008,
+                              reason=e.detail)
+        return
+    
+    await websocket.accept()
+    try:
+        while True:
+            eventos = await suscripcion.siguientes(LATIDO_EVENTOS)
+            for evento in eventos or [None]:
+                await websocket.send_text(evento.json() if evento else '{"tipo":"latido"}')
+    except WebSocketDisconnect:
+        pass
+    finally:
+        bus.desuscribir(suscripcion)
+
+def main(argv: List[str] = None):
+    """
+    Inicia el servidor.
+    
+    Por defecto arranca en modo producción con INVENTARIO_WORKERS procesos
+    (cada uno con su propio InventarioManager y sus conexiones); --recargar
+    usa un único proceso que se reinicia al cambiar el código.
+    """
     import uvicorn
-    uvicorn.run("api:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    
+    parser = argparse.ArgumentParser(description="API del Sistema de Inventario")
+    parser.add_argument("--host", default=os.environ.get("INVENTARIO_HOST", "0.0.0.0"), help="Dirección de escucha")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("INVENTARIO_PUERTO", "8000")), help="Puerto")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("INVENTARIO_WORKERS", "1")),
+                        help="Cantidad de procesos worker")
+    parser.add_argument("--recargar", action="store_true", help="Modo desarrollo con recarga automática")
+    args = parser.parse_args(argv)
+    
+    if args.recargar:
+        uvicorn.run("api:app", host=args.host, port=args.port, reload=True)
+    else:
+        uvicorn.run("api:app", host=args.host, port=args.port, workers=args.workers,
+                    timeout_graceful_shutdown=10)
+
+if __name__ == "__main__":
+    main()
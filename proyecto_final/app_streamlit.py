@@ -1,6 +1,10 @@
+import os
 import streamlit as st
 import pandas as pd
+from bitacora import configurar_desde_entorno
 from inventario import InventarioManager, Producto
+from moneda import a_unidades, formatear_monto
+from trabajos import ESTADOS_FINALES, GestorTrabajos
 import plotly.express as px
 import plotly.graph_objects as go
 
@@ -12,13 +16,27 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Inicializar el manejador de inventario
+# Logging de la librería (advertencias y errores por defecto)
+@st.cache_resource
+def configurar_logging():
+    configurar_desde_entorno(nivel="WARNING", formato="texto")
+
+configurar_logging()
+
+# Inicializar el manejador de inventario (INVENTARIO_DB permite compartir la base con la API)
 @st.cache_resource
 def get_inventario_manager():
-    return InventarioManager()
+    return InventarioManager(os.environ.get("INVENTARIO_DB", "inventario.db"))
 
 inventario = get_inventario_manager()
 
+# Reportes pesados en segundo plano; comparten estado y resultados con la API
+@st.cache_resource
+def get_gestor_trabajos():
+    return GestorTrabajos(inventario)
+
+trabajos = get_gestor_trabajos()
+
 # Título principal
 st.title("📦 Sistema de Gestión de Inventario")
 st.markdown("---")
@@ -45,53 +63,63 @@ def get_productos_df():
                 'Cantidad': p.cantidad,
                 'Precio': p.precio,
                 'Categoría': p.categoria,
-                'Valor Total': p.cantidad * p.precio
+                'Stock Mínimo': p.stock_minimo,
+                'Valor Total': a_unidades(p.valor_centavos)
             })
         return pd.DataFrame(data)
     return pd.DataFrame()
 
+# Límites de puntos para que el tiempo de render de Plotly no dependa
+# del tamaño del catálogo
+MAX_CATEGORIAS_GRAFICO = 12
+MAX_BARRAS_GRAFICO = 50
+
+def resumir_categorias(conteos, max_categorias=MAX_CATEGORIAS_GRAFICO):
+    """Agrupa las categorías menos frecuentes en 'Otras' para el gráfico de torta"""
+    if len(conteos) <= max_categorias:
+        return conteos
+    principales = conteos[:max_categorias - 1]
+    otras = sum(total for _, total in conteos[max_categorias - 1:])
+    return principales + [("Otras", otras)]
+
 # Página de Inicio
 if pagina == "🏠 Inicio":
     st.header("Bienvenido al Sistema de Inventario")
     
-    # Métricas generales
-    productos = inventario.obtener_todos_los_productos()
+    # Métricas generales (calculadas en SQL)
+    resumen = inventario.obtener_resumen_inventario()
     
-    if productos:
+    if resumen['total_productos'] > 0:
         col1, col2, col3, col4 = st.columns(4)
         
-        total_productos = len(productos)
-        total_stock = sum(p.cantidad for p in productos)
-        valor_inventario = sum(p.cantidad * p.precio for p in productos)
-        productos_sin_stock = len([p for p in productos if p.cantidad == 0])
-        
         with col1:
-            st.metric("Total Productos", total_productos)
+            st.metric("Total Productos", resumen['total_productos'])
         with col2:
-            st.metric("Stock Total", total_stock)
+            st.metric("Stock Total", resumen['stock_total'])
         with col3:
-            st.metric("Valor Inventario", f"${valor_inventario:,.2f}")
+            st.metric("Valor Inventario", formatear_monto(resumen['valor_inventario_centavos']))
         with col4:
-            st.metric("Sin Stock", productos_sin_stock)
-        
-        # Gráficos de resumen
-        df = get_productos_df()
+            st.metric("Sin Stock", resumen['productos_sin_stock'])
         
+        # Gráficos de resumen: los datos llegan ya agregados desde la base
         col1, col2 = st.columns(2)
         
         with col1:
             st.subheader("📊 Productos por Categoría")
-            if not df.empty:
-                categoria_counts = df['Categoría'].value_counts()
-                fig_pie = px.pie(values=categoria_counts.values, 
-                               names=categoria_counts.index,
+            categoria_counts = resumir_categorias(inventario.contar_productos_por_categoria())
+            if categoria_counts:
+                fig_pie = px.pie(values=[total for _, total in categoria_counts], 
+                               names=[cat for cat, _ in categoria_counts],
                                title="Distribución por Categorías")
                 st.plotly_chart(fig_pie, use_container_width=True)
         
         with col2:
             st.subheader("📈 Top 10 Productos por Valor")
-            if not df.empty:
-                top_productos = df.nlargest(10, 'Valor Total')
+            top_productos = pd.DataFrame([
+                {'Nombre': p.nombre, 'Valor Total': a_unidades(p.valor_centavos)}
+                for p in inventario.obtener_top_productos_por_valor(10)
+            ])
+            if not top_productos.empty:
                 fig_bar = px.bar(top_productos, 
                                x='Nombre', y='Valor Total',
                                title="Productos con Mayor Valor en Stock")
@@ -115,6 +143,8 @@ elif pagina == "➕ Registrar Producto":
         with col2:
             descripcion = st.text_area("Descripción", placeholder="Descripción detallada del producto")
             precio = st.number_input("Precio*", min_value=0.01, step=0.01, format="%.2f")
+            stock_minimo = st.number_input("Stock Mínimo", min_value=0, step=1,
+                                           help="Con este stock o menos el producto aparece en el reporte de reposición")
         
         submitted = st.form_submit_button("🚀 Registrar Producto", type="primary")
         
@@ -124,7 +154,7 @@ elif pagina == "➕ Registrar Producto":
             elif precio <= 0:
                 st.error("El precio debe ser mayor a 0")
             else:
-                producto = Producto(nombre, descripcion, cantidad, precio, categoria)
+                producto = Producto(nombre, descripcion, cantidad, precio, categoria, stock_minimo=stock_minimo)
                 if inventario.registrar_producto(producto):
                     st.success(f"¡Producto '{nombre}' registrado exitosamente!")
                     # Limpiar el cache para refrescar los datos
@@ -148,7 +178,7 @@ elif pagina == "👁️ Ver Productos":
             categoria_filtro = st.selectbox("Filtrar por Categoría", categorias)
         
         with col2:
-            stock_minimo = st.number_input("Stock Mínimo", min_value=0, value=0)
+            cantidad_minima = st.number_input("Cantidad Mínima", min_value=0, value=0)
         
         with col3:
             ordenar_por = st.selectbox("Ordenar por", 
@@ -160,8 +190,8 @@ elif pagina == "👁️ Ver Productos":
         if categoria_filtro != "Todas":
             df_filtrado = df_filtrado[df_filtrado['Categoría'] == categoria_filtro]
         
-        if stock_minimo > 0:
-            df_filtrado = df_filtrado[df_filtrado['Cantidad'] >= stock_minimo]
+        if cantidad_minima > 0:
+            df_filtrado = df_filtrado[df_filtrado['Cantidad'] >= cantidad_minima]
         
         # Ordenar
         df_filtrado = df_filtrado.sort_values(ordenar_por)
@@ -205,15 +235,19 @@ elif pagina == "🔍 Buscar Producto":
                     st.write(f"**Nombre:** {producto.nombre}")
                     st.write(f"**Cantidad:** {producto.cantidad}")
                 with col2:
-                    st.write(f"**Precio:** ${producto.precio:.2f}")
+                    st.write(f"**Precio:** {formatear_monto(producto.precio_centavos)}")
                     st.write(f"**Categoría:** {producto.categoria}")
-                    st.write(f"**Valor Total:** ${producto.cantidad * producto.precio:.2f}")
+                    st.write(f"**Valor Total:** {formatear_monto(producto.valor_centavos)}")
                 st.write(f"**Descripción:** {producto.descripcion}")
             else:
                 st.error(f"No se encontró producto con ID {id_buscar}")
     
     elif tipo_busqueda == "Por Nombre":
         nombre_buscar = st.text_input("Nombre del Producto")
+        if nombre_buscar:
+            sugerencias = [s['texto'] for s in inventario.sugerir_productos(nombre_buscar, 5) if s['tipo'] == 'nombre']
+            if sugerencias:
+                st.caption("Sugerencias: " + " · ".join(sugerencias))
         if st.button("🔍 Buscar", type="primary") and nombre_buscar:
             productos = inventario.buscar_productos_por_nombre(nombre_buscar)
             if productos:
@@ -230,6 +264,10 @@ elif pagina == "🔍 Buscar Producto":
     
     elif tipo_busqueda == "Por Categoría":
         categoria_buscar = st.text_input("Categoría")
+        if categoria_buscar:
+            sugerencias = [s['texto'] for s in inventario.sugerir_productos(categoria_buscar, 5) if s['tipo'] == 'categoria']
+            if sugerencias:
+                st.caption("Categorías: " + " · ".join(sugerencias))
         if st.button("🔍 Buscar", type="primary") and categoria_buscar:
             productos = inventario.buscar_productos_por_categoria(categoria_buscar)
             if productos:
@@ -273,13 +311,15 @@ elif pagina == "✏️ Actualizar Producto":
             with col2:
                 nueva_descripcion = st.text_area("Descripción", value=producto.descripcion)
                 nuevo_precio = st.number_input("Precio", value=producto.precio, min_value=0.01, step=0.01, format="%.2f")
+                nuevo_stock_minimo = st.number_input("Stock Mínimo", value=producto.stock_minimo, min_value=0, step=1)
             
             submitted = st.form_submit_button("✏️ Actualizar Producto", type="primary")
             
             if submitted:
                 if inventario.actualizar_producto(
                     id_actualizar, nuevo_nombre, nueva_descripcion, 
-                    nueva_cantidad, nuevo_precio, nueva_categoria
+                    nueva_cantidad, nuevo_precio, nueva_categoria,
+                    stock_minimo=nuevo_stock_minimo
                 ):
                     st.success("¡Producto actualizado exitosamente!")
                     del st.session_state['producto_actualizar']
@@ -311,7 +351,7 @@ elif pagina == "🗑️ Eliminar Producto":
             st.write(f"**Nombre:** {producto.nombre}")
             st.write(f"**Cantidad:** {producto.cantidad}")
         with col2:
-            st.write(f"**Precio:** ${producto.precio:.2f}")
+            st.write(f"**Precio:** {formatear_monto(producto.precio_centavos)}")
             st.write(f"**Categoría:** {producto.categoria}")
             st.write(f"**Descripción:** {producto.descripcion}")
         
@@ -337,25 +377,29 @@ elif pagina == "📊 Reportes":
     
     # Reporte de Stock Bajo
     st.subheader("📉 Reporte de Stock Bajo")
-    limite_stock = st.number_input("Límite de Stock", min_value=0, value=5, step=1)
+    criterio = st.radio("Criterio", ["Stock mínimo de cada producto", "Límite fijo"], horizontal=True)
+    por_producto = criterio == "Stock mínimo de cada producto"
+    limite_stock = None if por_producto else st.number_input("Límite de Stock", min_value=0, value=5, step=1)
+    texto_limite = "su stock mínimo" if por_producto else str(limite_stock)
     
     if st.button("📊 Generar Reporte", type="primary"):
         productos_stock_bajo = inventario.generar_reporte_stock_bajo(limite_stock)
         
         if productos_stock_bajo:
-            st.error(f"⚠️ {len(productos_stock_bajo)} producto(s) con stock igual o inferior a {limite_stock}")
+            st.error(f"⚠️ {len(productos_stock_bajo)} producto(s) con stock igual o inferior a {texto_limite}")
             
             data = []
-            total_valor = 0
+            # El total se suma en centavos (exacto) y se formatea al final
+            total_centavos = 0
             for p in productos_stock_bajo:
-                valor = p.cantidad * p.precio
-                total_valor += valor
+                total_centavos += p.valor_centavos
                 data.append({
                     'ID': p.id,
                     'Nombre': p.nombre,
                     'Cantidad': p.cantidad,
+                    'Stock Mínimo': p.stock_minimo,
                     'Precio': p.precio,
-                    'Valor': valor,
+                    'Valor': a_unidades(p.valor_centavos),
                     'Categoría': p.categoria
                 })
             
@@ -373,18 +417,87 @@ elif pagina == "📊 Reportes":
             with col1:
                 st.metric("Productos Afectados", len(productos_stock_bajo))
             with col2:
-                st.metric("Valor Total Afectado", f"${total_valor:.2f}")
+                st.metric("Valor Total Afectado", formatear_monto(total_centavos))
             
-            # Gráfico de productos con stock bajo
-            fig = px.bar(df_stock_bajo, x='Nombre', y='Cantidad',
-                        title=f"Productos con Stock ≤ {limite_stock}",
-                        color='Cantidad',
-                        color_continuous_scale='Reds')
-            fig.update_layout(xaxis={'tickangle': 45})
+            # Gráfico de productos con stock bajo: una barra por producto
+            # mientras sea legible, y rangos de cantidad agrupados en SQL
+            # cuando hay demasiados productos afectados (con el mínimo de cada
+            # producto, los de menos stock: el reporte ya viene ordenado)
+            if len(df_stock_bajo) <= MAX_BARRAS_GRAFICO or por_producto:
+                fig = px.bar(df_stock_bajo.head(MAX_BARRAS_GRAFICO), x='Nombre', y='Cantidad',
+                            title=f"Productos con Stock ≤ {texto_limite}",
+                            color='Cantidad',
+                            color_continuous_scale='Reds')
+                fig.update_layout(xaxis={'tickangle': 45})
+            else:
+                grupos = inventario.agrupar_stock_bajo_por_cantidad(limite_stock, MAX_BARRAS_GRAFICO)
+                df_grupos = pd.DataFrame([
+                    {
+                        'Rango de Stock': f"{g['desde']}" if g['desde'] == g['hasta'] else f"{g['desde']}-{g['hasta']}",
+                        'Productos': g['productos']
+                    }
+                    for g in grupos
+                ])
+                fig = px.bar(df_grupos, x='Rango de Stock', y='Productos',
+                            title=f"Productos con Stock ≤ {limite_stock} (agrupados por cantidad)",
+                            color='Productos',
+                            color_continuous_scale='Reds')
             st.plotly_chart(fig, use_container_width=True)
             
         else:
-            st.success(f"✅ ¡Excelente! No hay productos con stock igual o inferior a {limite_stock}")
+            st.success(f"✅ ¡Excelente! No hay productos con stock igual o inferior a {texto_limite}")
+    
+    # Reportes en segundo plano: no bloquean la página mientras se calculan
+    st.markdown("---")
+    st.subheader("⏳ Reportes en Segundo Plano")
+    tipos_reporte = {
+        "Valorización del inventario": "valorizacion",
+        "Stock bajo (mínimo de cada producto)": "stock_bajo",
+        "Exportación completa": "exportacion"
+    }
+    tipo_reporte = st.selectbox("Reporte", list(tipos_reporte))
+    
+    if st.button("🚀 Enviar Reporte"):
+        try:
+            trabajo, compartido = trabajos.enviar(tipos_reporte[tipo_reporte])
+            st.session_state['trabajo_reporte'] = trabajo['id']
+            if compartido:
+                st.info("Se reutiliza un reporte igual calculado recientemente")
+        except OverflowError as e:
+            st.error(str(e))
+    
+    if 'trabajo_reporte' in st.session_state:
+        trabajo = trabajos.obtener(st.session_state['trabajo_reporte'])
+        if trabajo is None:
+            st.warning("El reporte venció; envíelo de nuevo")
+            del st.session_state['trabajo_reporte']
+        elif trabajo['estado'] not in ESTADOS_FINALES:
+            st.info(f"Reporte {trabajo['estado'].replace('_', ' ')}...")
+            if st.button("🔄 Actualizar Estado"):
+                st.rerun()
+        elif trabajo['estado'] == 'fallido':
+            st.error(f"El reporte falló: {trabajo['error']}")
+        elif trabajo['tipo'] == 'valorizacion':
+            resultado = trabajos.leer_resultado(trabajo)
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Productos", f"{resultado['total_productos']:,}")
+            with col2:
+                st.metric("Stock Total", f"{resultado['stock_total']:,}")
+            with col3:
+                st.metric("Valor del Inventario", f"${resultado['valor_inventario']:,.2f}")
+            st.dataframe(
+                pd.DataFrame(resultado['categorias']),
+                use_container_width=True,
+                column_config={"valor": st.column_config.NumberColumn("Valor", format="$%.2f")}
+            )
+        else:
+            st.success(f"Reporte listo: {trabajo['filas']:,} productos")
+            with open(trabajo['archivo'], "rb") as archivo:
+                st.download_button("💾 Descargar JSON", archivo, file_name=f"{trabajo['tipo']}.json",
+                                   mime="application/json")
+            if trabajo['tipo'] == 'stock_bajo':
+                st.dataframe(pd.DataFrame(trabajos.leer_resultado(trabajo)), use_container_width=True)
 
 # Footer
 st.markdown("---")
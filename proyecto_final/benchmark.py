@@ -0,0 +1,505 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Micro-benchmarks de InventarioManager sobre catálogos sintéticos.
+
+Para cada tamaño de catálogo se crea una base de datos temporal, se siembra
+con productos sintéticos reproducibles (semilla fija) y se mide cada
+operación del manejador con rondas de calentamiento y repeticiones. Los
+resultados se guardan en JSON y se comparan contra un baseline guardado,
+marcando como regresión toda operación cuya mediana empeore más que la
+tolerancia.
+
+Uso:
+    python benchmark.py                              # 10k, 100k y 1M filas
+    python benchmark.py --tamanos 10000 --repeticiones 3
+    python benchmark.py --guardar-baseline           # guarda el baseline actual
+    python benchmark.py --lectores-concurrentes 4    # lecturas durante ráfagas de escritura
+    python benchmark.py --tamanos 10000 --serializacion   # respuestas JSON de 10k filas
+    python benchmark.py --tamanos 10000 --formatos        # JSON vs columnar vs MessagePack
+    python benchmark.py --tamanos 10000 --valorizacion    # valor del inventario exacto con 1M filas
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Tuple
+
+from database import DatabaseManager
+from generador import CATEGORIAS_BASE, GeneradorCatalogo
+from inventario import InventarioManager, Producto
+from moneda import a_centavos
+
+ARCHIVO_RESULTADOS = "bench_resultados.json"
+ARCHIVO_BASELINE = "bench_baseline.json"
+TAMANOS_POR_DEFECTO = "10000,100000,1000000"
+
+
+def sembrar_catalogo(inventario: InventarioManager, tamano: int, semilla: int) -> None:
+    """
+    Carga un catálogo sintético reproducible mediante la carga masiva.
+
+    Args:
+        inventario: Manejador sobre la base de datos del benchmark
+        tamano: Cantidad de productos a generar
+        semilla: Semilla del generador de catálogos
+    """
+    GeneradorCatalogo(semilla=semilla).cargar_en_base(inventario, tamano)
+
+
+def medir_operacion(operacion: Callable[[], Any], lote: int, calentamiento: int,
+                    repeticiones: int) -> Dict[str, float]:
+    """
+    Mide una operación ejecutándola 'lote' veces por repetición.
+
+    Args:
+        operacion: Función sin argumentos a medir
+        lote: Ejecuciones por repetición
+        calentamiento: Repeticiones descartadas antes de medir
+        repeticiones: Repeticiones medidas
+
+    Returns:
+        Estadísticas del tiempo por operación en milisegundos
+    """
+    for _ in range(calentamiento):
+        for _ in range(lote):
+            operacion()
+
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for _ in range(lote):
+            operacion()
+        tiempos.append((time.perf_counter() - inicio) / lote * 1000)
+
+    return {
+        'mediana_ms': round(statistics.median(tiempos), 4),
+        'min_ms': round(min(tiempos), 4),
+        'max_ms': round(max(tiempos), 4),
+        'desvio_ms': round(statistics.pstdev(tiempos), 4),
+        'lote': lote,
+        'repeticiones': repeticiones
+    }
+
+
+def definir_operaciones(inventario: InventarioManager, tamano: int,
+                        rng: random.Random) -> Dict[str, Tuple[Callable[[], Any], int]]:
+    """
+    Define las operaciones a medir y el tamaño de lote de cada una.
+
+    Returns:
+        Diccionario nombre -> (operación, lote)
+    """
+    ids = itertools.cycle([rng.randint(1, tamano) for _ in range(1000)])
+    nombres = itertools.cycle([f"{rng.randint(1, tamano):X}" for _ in range(100)])
+    categorias = itertools.cycle(CATEGORIAS_BASE[:8])
+    # Los ids a eliminar se toman del final del catálogo y no se repiten
+    ids_eliminar = iter(range(tamano, 0, -1))
+    contador = itertools.count()
+
+    return {
+        'registrar_producto': (lambda: inventario.registrar_producto(
+            Producto(f"Benchmark {next(contador)}", "Alta individual", 10, 99.9, "Benchmark")), 20),
+        'buscar_producto_por_id': (lambda: inventario.buscar_producto_por_id(next(ids)), 200),
+        'buscar_productos_por_nombre': (lambda: inventario.buscar_productos_por_nombre(next(nombres)), 3),
+        'buscar_productos_por_categoria': (lambda: inventario.buscar_productos_por_categoria(next(categorias)), 2),
+        'actualizar_producto': (lambda: inventario.actualizar_producto(
+            next(ids), cantidad=rng.randint(0, 200)), 50),
+        'eliminar_producto': (lambda: inventario.eliminar_producto(next(ids_eliminar)), 20),
+        'generar_reporte_stock_bajo': (lambda: inventario.generar_reporte_stock_bajo(5), 3),
+        'obtener_resumen_inventario': (lambda: inventario.obtener_resumen_inventario(), 3),
+        'obtener_top_productos_por_valor': (lambda: inventario.obtener_top_productos_por_valor(10), 20),
+        'obtener_todos_los_productos': (lambda: inventario.obtener_todos_los_productos(), 1),
+    }
+
+
+def medir_lecturas_durante_escrituras(ruta: str, tamano: int, semilla: int, lectores: int,
+                                      duracion: float) -> Dict[str, Dict[str, float]]:
+    """
+    Mide lecturas por id desde varios hilos mientras otro hilo escribe
+    ráfagas de altas sin pausa, primero con una única conexión compartida y luego con el pool
+    de lectura separado del escritor.
+
+    Args:
+        ruta: Base de datos ya sembrada
+        tamano: Cantidad de productos sembrados (rango de ids)
+        semilla: Semilla de los ids consultados
+        lectores: Hilos lectores (y tamaño del pool)
+        duracion: Segundos de cada escenario
+
+    Returns:
+        Escenario -> lecturas/s, escrituras/s y latencias de lectura en ms
+    """
+    resultados = {}
+    for escenario, pool in (('conexion_unica', 0), ('pool_lectura', lectores)):
+        inventario = InventarioManager(ruta)
+        inventario.db = DatabaseManager(ruta, lectores=pool)
+        detener = threading.Event()
+        latencias: List[List[float]] = [[] for _ in range(lectores)]
+        escrituras = [0]
+
+        def escritor():
+            # Ráfagas de 1000 altas por transacción
+            rafaga = [Producto("Ráfaga", "Escritura concurrente", 1, 1.0, "Benchmark")] * 1000
+            while not detener.is_set():
+                escrituras[0] += inventario.registrar_productos(rafaga)
+
+        def lector(propias: List[float], rng: random.Random):
+            while not detener.is_set():
+                inicio = time.perf_counter()
+                inventario.buscar_producto_por_id(rng.randint(1, tamano))
+                propias.append(time.perf_counter() - inicio)
+
+        hilos = [threading.Thread(target=escritor)] + [
+            threading.Thread(target=lector, args=(latencias[i], random.Random(semilla + i))) for i in range(lectores)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        time.sleep(duracion)
+        detener.set()
+        for hilo in hilos:
+            hilo.join()
+        inventario.cerrar()
+
+        todas = sorted(l for propias in latencias for l in propias)
+        resultados[escenario] = {
+            'lecturas_s': round(len(todas) / duracion, 1),
+            'escrituras_s': round(escrituras[0] / duracion, 1),
+            'lectura_p50_ms': round(todas[len(todas) // 2] * 1000, 4) if todas else 0.0,
+            'lectura_p95_ms': round(todas[int(len(todas) * 0.95)] * 1000, 4) if todas else 0.0,
+            'lectura_max_ms': round(todas[-1] * 1000, 4) if todas else 0.0
+        }
+        print(f"   {escenario:<16} {resultados[escenario]['lecturas_s']:>10,.0f} lecturas/s "
+              f"(p95 {resultados[escenario]['lectura_p95_ms']:.3f} ms, máx {resultados[escenario]['lectura_max_ms']:.1f} ms) · "
+              f"{resultados[escenario]['escrituras_s']:,.0f} escrituras/s")
+    return resultados
+
+
+def filas_como_base(filas: int, semilla: int) -> List[tuple]:
+    """Filas del catálogo generado como las devuelve la base con como_filas (precio en centavos)."""
+    return [(i, nombre, descripcion, cantidad, a_centavos(precio), categoria, 0)
+            for i, (nombre, descripcion, cantidad, precio, categoria)
+            in enumerate(GeneradorCatalogo(semilla=semilla).filas(filas), start=1)]
+
+
+def medir_serializacion(filas: int, semilla: int, repeticiones: int) -> Dict[str, Dict[str, float]]:
+    """
+    Compara la serialización de una respuesta de 'filas' productos por el
+    camino clásico de FastAPI (Producto -> to_dict -> validación con
+    response_model -> JSON) y por el camino rápido de api.py (filas -> JSON).
+
+    Returns:
+        Camino -> estadísticas en milisegundos por respuesta
+    """
+    try:
+        from fastapi.encoders import jsonable_encoder
+        from pydantic import TypeAdapter
+        from api import ProductoResponse, responder_filas
+    except ImportError as e:
+        print(f"   ⚠️ Serialización omitida (dependencia faltante: {e})")
+        return {}
+
+    datos = filas_como_base(filas, semilla)
+    adaptador = TypeAdapter(List[ProductoResponse])
+
+    def clasica():
+        productos = [Producto(id=f[0], nombre=f[1], descripcion=f[2], cantidad=f[3], precio=None, precio_centavos=f[4],
+                              categoria=f[5], stock_minimo=f[6])
+                     for f in datos]
+        validados = adaptador.validate_python([p.to_dict() for p in productos])
+        return json.dumps(jsonable_encoder(validados), ensure_ascii=False).encode("utf-8")
+
+    def rapida():
+        return responder_filas(datos).body
+
+    resultados = {}
+    for nombre, operacion in (('clasica', clasica), ('rapida', rapida)):
+        resultados[nombre] = medir_operacion(operacion, 1, 1, repeticiones)
+        resultados[nombre]['bytes'] = len(operacion())
+        print(f"   {nombre:<16} {resultados[nombre]['mediana_ms']:>10.2f} ms por respuesta "
+              f"({resultados[nombre]['bytes']:,} bytes)")
+    return resultados
+
+
+def medir_formatos(filas: int, semilla: int, repeticiones: int) -> Dict[str, Dict[str, float]]:
+    """
+    Compara los formatos de respuesta de los listados (JSON, JSON columnar y
+    MessagePack) en tamaño del payload y tiempo de codificación y decodificación.
+
+    Returns:
+        Formato -> bytes y milisegundos por respuesta al codificar y decodificar
+    """
+    try:
+        import api
+    except ImportError as e:
+        print(f"   ⚠️ Formatos omitidos (dependencia faltante: {e})")
+        return {}
+
+    datos = filas_como_base(filas, semilla)
+    decodificar_json = api.orjson.loads if api.ORJSON_DISPONIBLE else json.loads
+    formatos = {'json': (api.TIPO_JSON, decodificar_json), 'columnar': (api.TIPO_COLUMNAS, decodificar_json)}
+    if api.MSGPACK_DISPONIBLE:
+        formatos['msgpack'] = (api.TIPO_MSGPACK, api.msgpack.unpackb)
+    else:
+        print("   ⚠️ MessagePack omitido (msgpack no está instalado)")
+
+    resultados = {}
+    for nombre, (tipo, decodificar) in formatos.items():
+        payload = api.codificar_filas(datos, tipo)
+        codificacion = medir_operacion(lambda: api.codificar_filas(datos, tipo), 1, 1, repeticiones)
+        decodificacion = medir_operacion(lambda: decodificar(payload), 1, 1, repeticiones)
+        resultados[nombre] = {
+            'bytes': len(payload),
+            'codificar_ms': codificacion['mediana_ms'],
+            'decodificar_ms': decodificacion['mediana_ms']
+        }
+        print(f"   {nombre:<10} {len(payload):>12,} bytes  codificar {codificacion['mediana_ms']:>8.2f} ms  "
+              f"decodificar {decodificacion['mediana_ms']:>8.2f} ms")
+    return resultados
+
+
+def medir_valorizacion(filas: int, semilla: int, repeticiones: int) -> Dict[str, Any]:
+    """
+    Mide la valorización del inventario (suma de cantidad * precio) con
+    precios en centavos enteros y con precios REAL, y verifica que los
+    totales del manejador sean exactos.
+
+    La referencia se calcula en Python con Decimal a partir de los precios
+    generados, sin pasar por moneda.a_centavos ni por la base.
+
+    Returns:
+        Tiempos en milisegundos por suma, totales y 'exacto' (False si
+        algún total del manejador no coincide con la referencia)
+    """
+    directorio = tempfile.mkdtemp(prefix="bench_valorizacion_")
+    try:
+        ruta = os.path.join(directorio, "valorizacion.db")
+        inventario = InventarioManager(ruta)
+        generador = GeneradorCatalogo(semilla=semilla)
+        inicio = time.perf_counter()
+        generador.cargar_en_base(inventario, filas)
+        print(f"   Siembra: {time.perf_counter() - inicio:.2f} s")
+
+        # Las mismas filas en dos tablas angostas: precio REAL y precio en
+        # centavos, así la comparación mide solo la aritmética de la suma
+        referencia = Decimal(0)
+        conn = sqlite3.connect(ruta)
+        conn.execute("CREATE TABLE valorizacion_real (cantidad INTEGER, precio REAL)")
+        conn.execute("CREATE TABLE valorizacion_centavos (cantidad INTEGER, precio_centavos INTEGER)")
+        for _, _, cantidad, precio, _ in generador.filas(filas):
+            referencia += cantidad * Decimal(repr(precio))
+        conn.executemany("INSERT INTO valorizacion_real VALUES (?, ?)",
+                         ((cantidad, precio) for _, _, cantidad, precio, _ in generador.filas(filas)))
+        conn.execute("INSERT INTO valorizacion_centavos SELECT cantidad, precio_centavos FROM productos")
+        conn.commit()
+        referencia_centavos = int(referencia * 100)
+
+        sumas = {
+            'real': lambda: conn.execute("SELECT SUM(cantidad * precio) FROM valorizacion_real").fetchone()[0],
+            'centavos': lambda: conn.execute(
+                "SELECT SUM(cantidad * precio_centavos) FROM valorizacion_centavos").fetchone()[0],
+            'resumen': lambda: inventario.obtener_resumen_inventario()['valor_inventario_centavos'],
+            'por_categoria': lambda: sum(valor for *_, valor in inventario.valorizar_por_categoria()),
+        }
+        resultados: Dict[str, Any] = {}
+        totales = {}
+        for nombre, operacion in sumas.items():
+            totales[nombre] = operacion()
+            resultados[nombre] = medir_operacion(operacion, 1, 1, repeticiones)
+            print(f"   {nombre:<16} {resultados[nombre]['mediana_ms']:>10.2f} ms  total {totales[nombre]}")
+        conn.close()
+        inventario.cerrar()
+
+        exacto = all(totales[nombre] == referencia_centavos for nombre in ('centavos', 'resumen', 'por_categoria'))
+        desvio_real = float(Decimal(repr(totales['real'])) - referencia)
+        resultados.update({
+            'filas': filas,
+            'referencia_centavos': referencia_centavos,
+            'desvio_real': desvio_real,
+            'exacto': exacto,
+        })
+        print(f"   Referencia exacta: {referencia_centavos} centavos; desvío de la suma REAL: {desvio_real:+.6f}")
+        print(f"   {'✅ Totales en centavos exactos' if exacto else '❌ Los totales en centavos no coinciden'}")
+        return resultados
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def ejecutar_benchmarks(tamanos: List[int], calentamiento: int, repeticiones: int,
+                        semilla: int, filtro: str = None, lectores_concurrentes: int = 0,
+                        duracion_concurrencia: float = 3.0) -> Dict[str, Any]:
+    """
+    Ejecuta la suite completa para cada tamaño de catálogo.
+
+    Returns:
+        Resultados con metadatos del entorno y estadísticas por operación
+    """
+    resultados: Dict[str, Any] = {'meta': obtener_metadatos(semilla), 'resultados': {}}
+    directorio = tempfile.mkdtemp(prefix="bench_inventario_")
+
+    try:
+        for tamano in tamanos:
+            print(f"\n📦 Catálogo de {tamano:,} productos")
+            inventario = InventarioManager(os.path.join(directorio, f"bench_{tamano}.db"))
+
+            inicio = time.perf_counter()
+            sembrar_catalogo(inventario, tamano, semilla)
+            print(f"   Siembra: {time.perf_counter() - inicio:.2f} s")
+
+            rng = random.Random(semilla)
+            resultados_tamano = {}
+            for nombre, (operacion, lote) in definir_operaciones(inventario, tamano, rng).items():
+                if filtro and filtro not in nombre:
+                    continue
+                estadisticas = medir_operacion(operacion, lote, calentamiento, repeticiones)
+                resultados_tamano[nombre] = estadisticas
+                print(f"   {nombre:<34} {estadisticas['mediana_ms']:>12.4f} ms "
+                      f"(min {estadisticas['min_ms']:.4f}, ±{estadisticas['desvio_ms']:.4f})")
+
+            resultados['resultados'][str(tamano)] = resultados_tamano
+
+            if lectores_concurrentes:
+                print(f"   Lecturas durante escrituras ({lectores_concurrentes} hilos lectores):")
+                inventario.cerrar()
+                resultados.setdefault('concurrencia', {})[str(tamano)] = medir_lecturas_durante_escrituras(
+                    inventario.db.db_name, tamano, semilla, lectores_concurrentes, duracion_concurrencia)
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    return resultados
+
+
+def obtener_metadatos(semilla: int) -> Dict[str, Any]:
+    """Describe el entorno en el que se ejecutó el benchmark."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'plataforma': platform.platform(),
+        'semilla': semilla
+    }
+
+
+def comparar_con_baseline(resultados: Dict[str, Any], baseline: Dict[str, Any],
+                          tolerancia: float) -> List[str]:
+    """
+    Compara las medianas contra el baseline.
+
+    Args:
+        resultados: Resultados de la ejecución actual
+        baseline: Resultados guardados previamente
+        tolerancia: Empeoramiento relativo admitido (0.2 = 20 %)
+
+    Returns:
+        Lista de descripciones de las regresiones encontradas
+    """
+    regresiones = []
+    for tamano, operaciones in resultados['resultados'].items():
+        for nombre, actual in operaciones.items():
+            anterior = baseline.get('resultados', {}).get(tamano, {}).get(nombre)
+            if not anterior or anterior['mediana_ms'] <= 0:
+                continue
+            cambio = actual['mediana_ms'] / anterior['mediana_ms'] - 1
+            if cambio > tolerancia:
+                regresiones.append(
+                    f"{nombre} @ {int(tamano):,}: {anterior['mediana_ms']:.4f} → "
+                    f"{actual['mediana_ms']:.4f} ms (+{cambio:.0%})"
+                )
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de InventarioManager")
+    parser.add_argument("--tamanos", default=TAMANOS_POR_DEFECTO,
+                        help="Tamaños de catálogo separados por coma")
+    parser.add_argument("--calentamiento", type=int, default=1, help="Repeticiones de calentamiento")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Repeticiones medidas")
+    parser.add_argument("--semilla", type=int, default=42, help="Semilla de los datos sintéticos")
+    parser.add_argument("--filtro", help="Medir solo las operaciones cuyo nombre contenga este texto")
+    parser.add_argument("--salida", default=ARCHIVO_RESULTADOS, help="Archivo JSON de resultados")
+    parser.add_argument("--baseline", default=ARCHIVO_BASELINE, help="Archivo JSON del baseline")
+    parser.add_argument("--tolerancia", type=float, default=0.20,
+                        help="Empeoramiento relativo admitido antes de marcar regresión")
+    parser.add_argument("--guardar-baseline", action="store_true",
+                        help="Guardar estos resultados como nuevo baseline")
+    parser.add_argument("--lectores-concurrentes", type=int, default=0,
+                        help="Medir lecturas de N hilos durante ráfagas de escritura (0 = no medir)")
+    parser.add_argument("--serializacion", type=int, nargs="?", const=10000, default=0,
+                        help="Medir la serialización de respuestas de N filas (por defecto 10000)")
+    parser.add_argument("--formatos", type=int, nargs="?", const=10000, default=0,
+                        help="Comparar JSON, columnar y MessagePack con N filas (por defecto 10000)")
+    parser.add_argument("--valorizacion", type=int, nargs="?", const=1000000, default=0,
+                        help="Medir y verificar la valorización exacta con N filas (por defecto 1000000)")
+    args = parser.parse_args()
+
+    tamanos = [int(t) for t in args.tamanos.split(",") if t.strip()]
+    print("⏱️ BENCHMARKS - SISTEMA DE GESTIÓN DE INVENTARIO")
+    print("=" * 60)
+
+    resultados = ejecutar_benchmarks(tamanos, args.calentamiento, args.repeticiones,
+                                     args.semilla, args.filtro, args.lectores_concurrentes)
+    if args.serializacion:
+        print(f"\n🧾 Serialización de respuestas de {args.serializacion:,} filas")
+        resultados['serializacion'] = medir_serializacion(args.serializacion, args.semilla, args.repeticiones)
+    if args.formatos:
+        print(f"\n📦 Formatos de respuesta de {args.formatos:,} filas")
+        resultados['formatos'] = medir_formatos(args.formatos, args.semilla, args.repeticiones)
+    if args.valorizacion:
+        print(f"\n💰 Valorización de {args.valorizacion:,} filas")
+        resultados['valorizacion'] = medir_valorizacion(args.valorizacion, args.semilla, args.repeticiones)
+
+    with open(args.salida, "w", encoding="utf-8") as archivo:
+        json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+    print(f"\n💾 Resultados guardados en {args.salida}")
+
+    if args.valorizacion and not resultados['valorizacion']['exacto']:
+        print("\n❌ La valorización en centavos no coincide con la referencia exacta")
+        return 1
+
+    if args.guardar_baseline:
+        shutil.copyfile(args.salida, args.baseline)
+        print(f"📌 Baseline actualizado en {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"ℹ️ No hay baseline en {args.baseline}; ejecute con --guardar-baseline para crearlo")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as archivo:
+        baseline = json.load(archivo)
+
+    regresiones = comparar_con_baseline(resultados, baseline, args.tolerancia)
+    if regresiones:
+        print(f"\n❌ {len(regresiones)} regresión(es) respecto del baseline "
+              f"({baseline['meta'].get('commit') or 'sin commit'}):")
+        for regresion in regresiones:
+            print(f"   - {regresion}")
+        return 1
+
+    print(f"\n✅ Sin regresiones respecto del baseline (tolerancia {args.tolerancia:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Configuración de logging estructurado para el Sistema de Gestión de Inventario.
+
+Los módulos de la librería (database.py, inventario.py, ...) solo crean su
+logger con logging.getLogger(__name__) y quedan en silencio mientras la
+aplicación no llame a configurar_bitacora(). Al configurarla, los registros
+pasan por una cola: el hilo que loguea solo encola y un QueueListener en
+segundo plano formatea y escribe, así ninguna solicitud espera por E/S.
+
+Variables de entorno reconocidas por configurar_desde_entorno():
+    INVENTARIO_LOG_NIVEL=INFO
+    INVENTARIO_LOG_FORMATO=json|texto
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from typing import Optional, TextIO
+
+# Atributos estándar de LogRecord; el resto se considera campo estructurado
+_ATRIBUTOS_ESTANDAR = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class FormateadorJSON(logging.Formatter):
+    """
+    Formatea cada registro como un objeto JSON en una sola línea.
+
+    Los campos pasados con extra={...} se agregan como claves propias.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        datos = {
+            'timestamp': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensaje': record.getMessage(),
+        }
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_ESTANDAR and not clave.startswith('_'):
+                datos[clave] = valor
+        if record.exc_info:
+            datos['excepcion'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            datos['excepcion'] = record.exc_text
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class ManejadorCola(logging.handlers.QueueHandler):
+    """
+    QueueHandler que conserva los campos estructurados y el traceback
+    como texto, sin formatear el mensaje en el hilo que loguea.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Se modifica una copia: los demás manejadores del registro (otro
+        # archivo, caplog de pytest) siguen viendo los args y el traceback
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+def configurar_bitacora(nivel: str = "INFO", formato: str = "json", destino: TextIO = None) -> None:
+    """
+    Configura el logging de la aplicación con un manejador basado en cola.
+
+    Args:
+        nivel: Nivel mínimo a registrar (DEBUG, INFO, WARNING, ERROR)
+        formato: 'json' para una línea JSON por registro, 'texto' para
+            un formato legible
+        destino: Flujo de salida (por defecto sys.stderr)
+    """
+    global _listener
+    detener_bitacora()
+
+    salida = logging.StreamHandler(destino or sys.stderr)
+    if formato == "json":
+        salida.setFormatter(FormateadorJSON())
+    else:
+        salida.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    cola: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    raiz = logging.getLogger()
+    for manejador in list(raiz.handlers):
+        if isinstance(manejador, ManejadorCola):
+            raiz.removeHandler(manejador)
+    raiz.addHandler(ManejadorCola(cola))
+    raiz.setLevel(nivel.upper())
+
+    _listener = logging.handlers.QueueListener(cola, salida, respect_handler_level=True)
+    _listener.start()
+
+
+def detener_bitacora() -> None:
+    """Vacía la cola pendiente y detiene el hilo escritor."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configurar_desde_entorno(nivel: str = "INFO", formato: str = "json") -> None:
+    """
+    Configura el logging leyendo INVENTARIO_LOG_NIVEL e INVENTARIO_LOG_FORMATO.
+
+    Args:
+        nivel: Nivel por defecto si la variable no está definida
+        formato: Formato por defecto si la variable no está definida
+    """
+    configurar_bitacora(
+        nivel=os.environ.get("INVENTARIO_LOG_NIVEL", nivel),
+        formato=os.environ.get("INVENTARIO_LOG_FORMATO", formato)
+    )
+
+
+atexit.register(detener_bitacora)
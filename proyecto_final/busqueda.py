@@ -0,0 +1,560 @@
+"""
+Índices en memoria para buscar productos por nombre: búsqueda aproximada
+con trigramas y sugerencias por prefijo para autocompletar.
+
+Los nombres se normalizan (minúsculas, sin acentos ni signos: "Cámara
+Logitech C-920" -> "camara logitech c 920") y cada palabra se parte en
+trigramas con dos espacios antes y uno después ("  l", " lo", "log", ...).
+Una palabra mal escrita comparte la mayoría de sus trigramas con la
+correcta: "logitec" tiene 7 de sus 8 trigramas en "logitech".
+
+Los trigramas se indexan sobre el vocabulario (las palabras distintas de
+todos los nombres) y no sobre cada producto: "samsung" aparece en miles
+de nombres pero es una sola entrada. Cada palabra de la consulta se
+compara con las del vocabulario que comparten trigramas con ella y los
+productos se puntúan con la mejor coincidencia de cada palabra buscada.
+
+Las sugerencias salen de una lista ordenada de nombres y categorías
+normalizados: las completaciones de un prefijo quedan contiguas y se
+ubican con una búsqueda binaria (bisect).
+
+Los índices se mantienen al día con el feed de cambios de la base, así
+incluyen también las escrituras de otros procesos.
+"""
+
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left, insort
+from itertools import islice
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
+
+# Presupuesto por defecto para recorrer el índice en cada búsqueda
+PRESUPUESTO_MS = 50.0
+# Similitud mínima entre una palabra buscada y una del vocabulario
+SIMILITUD_PALABRA = 0.3
+# Similitud mínima de un nombre (promedio sobre las palabras buscadas)
+SIMILITUD_MINIMA = 0.4
+# Candidatos que se vuelven a puntuar por cada resultado pedido
+CANDIDATOS_POR_RESULTADO = 20
+# A partir de este tamaño, los ids de una palabra se agregan de una vez
+AGREGADO_EN_BLOQUE = 64
+# Entradas de nombres anteriores o eliminados toleradas antes de reconstruir
+PROPORCION_OBSOLETAS = 0.2
+# Con más cambios pendientes se reconstruye en lugar de aplicarlos uno a uno
+CAMBIOS_PARA_RECONSTRUIR = 50000
+CAMBIOS_POR_LECTURA = 5000
+# Segundos entre lecturas del feed para las sugerencias (las escrituras del
+# propio proceso se aplican al momento)
+INTERVALO_SUGERENCIAS = 1.0
+
+_DIACRITICOS = re.compile("[\u0300-\u036f]")
+_SEPARADORES = re.compile(r"[\W_]+")
+
+
+def normalizar(texto: str) -> str:
+    """
+    Pasa el texto a minúsculas, sin acentos y con las palabras separadas
+    por un espacio ("Cámara  Logitech C-920" -> "camara logitech c 920").
+    """
+    sin_acentos = _DIACRITICOS.sub("", unicodedata.normalize("NFKD", texto.casefold()))
+    return _SEPARADORES.sub(" ", sin_acentos).strip()
+
+
+def trigramas(palabra: str) -> Set[str]:
+    """Trigramas de una palabra ya normalizada."""
+    relleno = f"  {palabra} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    comunes = len(a & b)
+    return comunes / (len(a) + len(b) - comunes)
+
+
+def similitud(consulta: str, nombre: str) -> float:
+    """
+    Puntúa un nombre contra una consulta con el mismo criterio del índice:
+    el promedio, sobre las palabras buscadas, de la similitud de trigramas
+    con la palabra más parecida del nombre.
+
+    Returns:
+        Valor entre 0 (nada en común) y 1 (todas las palabras presentes)
+    """
+    buscadas = [trigramas(p) for p in dict.fromkeys(normalizar(consulta).split())]
+    propias = [trigramas(p) for p in set(normalizar(nombre or "").split())]
+    if not buscadas or not propias:
+        return 0.0
+    total = 0.0
+    for buscada in buscadas:
+        mejor = max(_jaccard(buscada, propia) for propia in propias)
+        if mejor >= SIMILITUD_PALABRA:
+            total += mejor
+    return total / len(buscadas)
+
+
+class IndiceSincronizado(ABC):
+    """
+    Base de los índices en memoria que se mantienen al día con el feed de
+    cambios del inventario.
+
+    Las subclases indican en COLUMNAS qué leen de cada producto (empezando
+    por el id) y definen _limpiar, _agregar (con esas columnas) y _quitar.
+    Aplicar dos veces el mismo cambio no debe alterar el índice.
+    """
+
+    COLUMNAS: Tuple[str, ...] = ("id",)
+    # Segundos mínimos entre consultas al contador de cambios (0: en cada uso)
+    intervalo = 0.0
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._limpiar()
+        # Versión del inventario incluida en el índice (None: sin cargar)
+        self.version: Optional[int] = None
+        self._revisado = 0.0
+
+    @abstractmethod
+    def _limpiar(self) -> None:
+        """Deja el índice vacío."""
+
+    @abstractmethod
+    def _agregar(self, id_producto: int, *valores) -> None:
+        """Agrega (o reemplaza) un producto con los valores de COLUMNAS sin el id."""
+
+    @abstractmethod
+    def _quitar(self, id_producto: int) -> None:
+        """Quita un producto del índice, si estaba."""
+
+    def _debe_reconstruirse(self) -> bool:
+        """Indica si conviene reconstruir el índice tras aplicar cambios."""
+        return False
+
+    def cargar(self, inventario) -> None:
+        """Construye el índice desde cero con todos los productos."""
+        with self._lock:
+            version = inventario.obtener_version_inventario()[0]
+            self._limpiar()
+            for lote in inventario.exportar_productos(columnas=self.COLUMNAS):
+                for fila in lote:
+                    self._agregar(*fila)
+            # Los cambios hechos durante la carga se vuelven a aplicar en la
+            # próxima sincronización (aplicar dos veces no cambia nada)
+            self.version = version
+            self._revisado = time.monotonic()
+
+    def invalidar(self) -> None:
+        """Hace que el próximo uso consulte el feed aunque no haya pasado el intervalo."""
+        self._revisado = 0.0
+
+    def sincronizar(self, inventario) -> None:
+        """
+        Aplica los cambios del inventario posteriores a la versión del
+        índice (o lo carga si todavía no se cargó). Si no hubo escrituras
+        cuesta una sola consulta al contador de cambios, y ninguna si la
+        última fue hace menos de 'intervalo' segundos.
+        """
+        if self.version is not None and time.monotonic() - self._revisado < self.intervalo:
+            return
+        with self._lock:
+            if self.version is None:
+                self.cargar(inventario)
+                return
+            self._revisado = time.monotonic()
+            actual = inventario.obtener_version_inventario()[0]
+            if actual <= self.version:
+                return
+            if actual - self.version > CAMBIOS_PARA_RECONSTRUIR:
+                self.cargar(inventario)
+                return
+
+            desde = self.version
+            while True:
+                cambios = inventario.obtener_cambios(desde, CAMBIOS_POR_LECTURA, columnas=self.COLUMNAS)
+                for *fila, _ in cambios['productos']:
+                    self._agregar(*fila)
+                for id_producto, _ in cambios['eliminados']:
+                    self._quitar(id_producto)
+                desde = cambios['hasta']
+                if not cambios['hay_mas']:
+                    break
+            self.version = max(desde, actual)
+
+            if self._debe_reconstruirse():
+                self.cargar(inventario)
+
+
+class IndiceTrigramas(IndiceSincronizado):
+    """
+    Índice en memoria: trigrama -> palabras del vocabulario y palabra ->
+    ids de los productos que la tienen en el nombre.
+
+    Las listas solo crecen: al renombrar o eliminar un producto sus
+    entradas anteriores quedan obsoletas (los eliminados se descartan al
+    buscar y los candidatos se vuelven a puntuar con su nombre actual) y
+    el índice se reconstruye cuando superan PROPORCION_OBSOLETAS.
+    """
+
+    COLUMNAS = ("id", "nombre")
+
+    def _limpiar(self) -> None:
+        self._numeros: Dict[str, int] = {}
+        self._trigramas_por_palabra = array('H')
+        self._listas: Dict[str, array] = {}
+        # Ids de cada palabra: un int mientras aparece en un solo nombre (la
+        # mayoría de los códigos de modelo) y un array cuando se repite
+        self._productos: List[Union[int, array]] = []
+        # Por id: palabras del nombre (0 si no existe) y CRC32 del nombre
+        # normalizado, para ignorar los cambios que no tocan el nombre
+        self._palabras_por_id = array('B')
+        self._huellas = array('I')
+        self._entradas = 0
+        self._obsoletas = 0
+
+    @property
+    def entradas(self) -> int:
+        """Cantidad de entradas (palabra, id) del índice, incluidas las obsoletas."""
+        return self._entradas
+
+    @property
+    def vocabulario(self) -> int:
+        """Cantidad de palabras distintas indexadas."""
+        return len(self._numeros)
+
+    def _indexar_palabra(self, palabra: str, id_producto: int) -> None:
+        numero = self._numeros.get(palabra)
+        if numero is not None:
+            ids = self._productos[numero]
+            if isinstance(ids, int):
+                self._productos[numero] = array('I', (ids, id_producto))
+            else:
+                ids.append(id_producto)
+            return
+
+        numero = self._numeros[palabra] = len(self._productos)
+        self._productos.append(id_producto)
+        propios = trigramas(palabra)
+        self._trigramas_por_palabra.append(min(len(propios), 0xFFFF))
+        listas = self._listas
+        for trigrama in propios:
+            lista = listas.get(trigrama)
+            if lista is None:
+                lista = listas[trigrama] = array('I')
+            lista.append(numero)
+
+    def _agregar(self, id_producto: int, nombre: Optional[str]) -> None:
+        normalizado = normalizar(nombre or "")
+        huella = zlib.crc32(normalizado.encode("utf-8"))
+        if id_producto >= len(self._huellas):
+            faltan = id_producto + 1 - len(self._huellas)
+            self._palabras_por_id.extend(bytes(faltan))
+            self._huellas.extend(array('I', [0]) * faltan)
+        anterior = self._palabras_por_id[id_producto]
+        if anterior and self._huellas[id_producto] == huella:
+            return
+        self._obsoletas += anterior
+
+        palabras = set(normalizado.split())
+        for palabra in palabras:
+            self._indexar_palabra(palabra, id_producto)
+        self._palabras_por_id[id_producto] = min(len(palabras), 0xFF)
+        self._huellas[id_producto] = huella
+        self._entradas += len(palabras)
+
+    def _quitar(self, id_producto: int) -> None:
+        if id_producto < len(self._huellas) and self._palabras_por_id[id_producto]:
+            self._obsoletas += self._palabras_por_id[id_producto]
+            self._palabras_por_id[id_producto] = 0
+            self._huellas[id_producto] = 0
+
+    def _debe_reconstruirse(self) -> bool:
+        return self._obsoletas > PROPORCION_OBSOLETAS * self._entradas
+
+    def _parecidas(self, palabra: str) -> List[Tuple[float, Sequence[int]]]:
+        """
+        Palabras del vocabulario parecidas a 'palabra', de más a menos
+        similar, como tuplas (similitud, ids de los productos que la tienen).
+        """
+        propios = trigramas(palabra)
+        conteo: Counter = Counter()
+        for trigrama in propios:
+            lista = self._listas.get(trigrama)
+            if lista is not None:
+                conteo.update(lista)
+        cantidad = len(propios)
+        por_palabra = self._trigramas_por_palabra
+        parecidas = []
+        for numero, comunes in conteo.items():
+            valor = comunes / (cantidad + por_palabra[numero] - comunes)
+            if valor >= SIMILITUD_PALABRA:
+                parecidas.append((valor, numero))
+        parecidas.sort(reverse=True)
+        productos = self._productos
+        return [(valor, (productos[numero],) if isinstance(productos[numero], int) else productos[numero])
+                for valor, numero in parecidas]
+
+    def candidatos(self, consulta: str, cantidad: int,
+                   presupuesto_ms: float = PRESUPUESTO_MS) -> Tuple[List[int], bool]:
+        """
+        Busca los productos cuyos nombres más se parecen a la consulta.
+
+        Args:
+            consulta: Texto buscado (se normaliza)
+            cantidad: Candidatos a devolver como máximo
+            presupuesto_ms: Tiempo máximo para recorrer el índice
+
+        Returns:
+            Tupla (ids de mayor a menor similitud según el índice, False si
+            el presupuesto cortó el recorrido antes de terminar)
+        """
+        buscadas = list(dict.fromkeys(normalizar(consulta).split()))
+        limite = time.perf_counter() + presupuesto_ms / 1000
+        completo = True
+        with self._lock:
+            vigentes = self._palabras_por_id
+            # La palabra buscada que aparece en más productos queda para el
+            # final y nunca se vuelca entera a un diccionario
+            por_palabra = sorted((self._parecidas(p) for p in buscadas),
+                                 key=lambda niveles: sum(len(ids) for _, ids in niveles))
+            base = por_palabra.pop()
+
+            # Suma de la mejor similitud de cada una de las demás palabras
+            puntajes: Dict[int, float] = {}
+            for niveles in por_palabra:
+                mejores: Dict[int, float] = {}
+                for valor, ids in niveles:
+                    if time.perf_counter() > limite:
+                        completo = False
+                        break
+                    if len(ids) < AGREGADO_EN_BLOQUE:
+                        for id_producto in ids:
+                            mejores.setdefault(id_producto, valor)
+                    else:
+                        # Las parecidas vienen de mayor a menor: gana la primera
+                        nuevos = dict.fromkeys(ids, valor)
+                        nuevos.update(mejores)
+                        mejores = nuevos
+                if len(mejores) > len(puntajes):
+                    puntajes, mejores = mejores, puntajes
+                for id_producto, valor in mejores.items():
+                    puntajes[id_producto] = puntajes.get(id_producto, 0.0) + valor
+                if not completo:
+                    break
+
+            # La palabra base se suma a los productos que ya tienen puntaje y,
+            # de los que solo la tienen a ella, alcanza con los primeros de
+            # sus niveles más parecidos
+            con_base = set()
+            solo_base: Dict[int, float] = {}
+            for valor, ids in base:
+                if time.perf_counter() > limite:
+                    completo = False
+                    break
+                comunes = (puntajes.keys() & ids) - con_base
+                for id_producto in comunes:
+                    puntajes[id_producto] += valor
+                con_base |= comunes
+                if len(solo_base) < cantidad:
+                    nuevos = (i for i in ids if i not in puntajes and i not in solo_base and vigentes[i])
+                    solo_base.update(dict.fromkeys(islice(nuevos, cantidad - len(solo_base)), valor))
+
+            # Los puntajes son sumas de pocas similitudes distintas: en lugar
+            # de ordenar todo se busca el menor puntaje que entra entre los
+            # mejores y se filtra en una sola pasada
+            frecuencias = Counter(puntajes.values())
+            umbral, acumulados = 0.0, 0
+            for valor in sorted(frecuencias, reverse=True):
+                umbral, acumulados = valor, acumulados + frecuencias[valor]
+                if acumulados >= cantidad:
+                    break
+            superan = [i for i, valor in puntajes.items() if valor > umbral and vigentes[i]]
+            empatados = (i for i, valor in puntajes.items() if valor == umbral and vigentes[i])
+            elegidos = {i: puntajes[i] for i in superan}
+            elegidos.update((i, umbral) for i in islice(empatados, max(cantidad - len(superan), 0)))
+            elegidos.update((i, valor) for i, valor in solo_base.items())
+            return sorted(elegidos, key=elegidos.__getitem__, reverse=True)[:cantidad], completo
+
+
+class IndicePrefijos(IndiceSincronizado):
+    """
+    Índice para autocompletar nombres y categorías.
+
+    Los nombres se guardan como entradas "clave\\0id" (nombre normalizado
+    e id) en una lista ordenada; el texto original se lee de la base solo
+    para las sugerencias devueltas, así el índice ocupa poco más que las
+    claves. Las categorías, que son pocas, se guardan con su texto y la
+    cantidad de productos de cada una.
+
+    Además del feed, lo actualizan los métodos de escritura de
+    InventarioManager (agregar, actualizar y quitar), así las escrituras
+    del propio proceso se ven en la siguiente sugerencia.
+    """
+
+    COLUMNAS = ("id", "nombre", "categoria")
+    intervalo = INTERVALO_SUGERENCIAS
+
+    def _limpiar(self) -> None:
+        self._nombres: List[str] = []
+        # Por id: entrada del nombre (None si no existe) y número de categoría
+        self._nombre_por_id: List[Optional[str]] = []
+        self._categoria_por_id = array('I')
+        # Categorías numeradas desde 1 como entradas "clave\\0texto"
+        self._numeros_categoria: Dict[str, int] = {}
+        self._textos_categoria: List[Optional[str]] = [None]
+        self._usos_categoria: List[int] = [0]
+        self._categorias: List[str] = []
+
+    def _numero_categoria(self, categoria: Optional[str]) -> int:
+        clave = normalizar(categoria or "")
+        if not clave:
+            return 0
+        entrada = f"{clave}\0{categoria}"
+        numero = self._numeros_categoria.get(entrada)
+        if numero is None:
+            numero = self._numeros_categoria[entrada] = len(self._textos_categoria)
+            self._textos_categoria.append(entrada)
+            self._usos_categoria.append(0)
+        return numero
+
+    def _usar_categoria(self, numero: int, delta: int) -> None:
+        if not numero:
+            return
+        self._usos_categoria[numero] += delta
+        usos = self._usos_categoria[numero]
+        # Las listas se ordenan al final de la carga (version es None)
+        if self.version is not None and (usos == 0 or (usos == 1 and delta > 0)):
+            entrada = self._textos_categoria[numero]
+            if usos:
+                insort(self._categorias, entrada)
+            else:
+                del self._categorias[bisect_left(self._categorias, entrada)]
+
+    def _agregar(self, id_producto: int, nombre: Optional[str], categoria: Optional[str]) -> None:
+        clave = normalizar(nombre or "")
+        entrada = f"{clave}\0{id_producto}" if clave else None
+        numero = self._numero_categoria(categoria)
+        if id_producto >= len(self._nombre_por_id):
+            faltan = id_producto + 1 - len(self._nombre_por_id)
+            self._nombre_por_id.extend([None] * faltan)
+            self._categoria_por_id.extend(array('I', [0]) * faltan)
+        elif self._nombre_por_id[id_producto] == entrada and self._categoria_por_id[id_producto] == numero:
+            return
+        self._quitar(id_producto)
+
+        if entrada is not None:
+            if self.version is not None:
+                insort(self._nombres, entrada)
+            else:
+                self._nombres.append(entrada)
+        self._nombre_por_id[id_producto] = entrada
+        self._categoria_por_id[id_producto] = numero
+        self._usar_categoria(numero, 1)
+
+    def _quitar(self, id_producto: int) -> None:
+        if id_producto >= len(self._nombre_por_id):
+            return
+        entrada = self._nombre_por_id[id_producto]
+        if entrada is not None:
+            del self._nombres[bisect_left(self._nombres, entrada)]
+            self._nombre_por_id[id_producto] = None
+        self._usar_categoria(self._categoria_por_id[id_producto], -1)
+        self._categoria_por_id[id_producto] = 0
+
+    def cargar(self, inventario) -> None:
+        with self._lock:
+            # Durante la carga las entradas se acumulan sin ordenar (version es
+            # None) y las listas se ordenan una sola vez al final
+            self.version = None
+            super().cargar(inventario)
+            self._nombres.sort()
+            self._categorias = sorted(entrada for entrada, numero in self._numeros_categoria.items()
+                                      if self._usos_categoria[numero])
+
+    def agregar(self, id_producto: int, nombre: Optional[str], categoria: Optional[str]) -> None:
+        """Agrega un producto recién registrado (si el índice ya está cargado)."""
+        with self._lock:
+            if self.version is not None:
+                self._agregar(id_producto, nombre, categoria)
+
+    def actualizar(self, id_producto: int, nombre: Optional[str] = None,
+                   categoria: Optional[str] = None) -> None:
+        """
+        Aplica un cambio de nombre o categoría. Como el índice no guarda el
+        nombre original, un cambio solo de categoría no toca el nombre y un
+        cambio de nombre conserva la categoría.
+        """
+        with self._lock:
+            if self.version is None or id_producto >= len(self._nombre_por_id):
+                return
+            if nombre is not None:
+                entrada = self._nombre_por_id[id_producto]
+                if entrada is not None:
+                    del self._nombres[bisect_left(self._nombres, entrada)]
+                clave = normalizar(nombre)
+                entrada = f"{clave}\0{id_producto}" if clave else None
+                if entrada is not None:
+                    insort(self._nombres, entrada)
+                self._nombre_por_id[id_producto] = entrada
+            if categoria is not None:
+                self._usar_categoria(self._categoria_por_id[id_producto], -1)
+                numero = self._numero_categoria(categoria)
+                self._categoria_por_id[id_producto] = numero
+                self._usar_categoria(numero, 1)
+
+    def quitar(self, id_producto: int) -> None:
+        """Quita un producto eliminado (si el índice ya está cargado)."""
+        with self._lock:
+            if self.version is not None:
+                self._quitar(id_producto)
+
+    def sugerir(self, prefijo: str, limite: int = 10) -> List[Tuple[str, Union[str, int], int]]:
+        """
+        Completa un prefijo con categorías y nombres de productos, sin
+        distinguir mayúsculas ni acentos ("mic" -> "Micrófono HP 9F3").
+
+        Args:
+            prefijo: Texto escrito hasta ahora
+            limite: Cantidad máxima de sugerencias
+
+        Returns:
+            Lista de tuplas (tipo, valor, cantidad de productos): primero las
+            categorías, con su texto como valor, y después los nombres, con
+            el id de uno de los productos que lo tienen; cada grupo en orden
+            alfabético
+        """
+        clave = normalizar(prefijo)
+        if not clave:
+            return []
+        sugerencias: List[Tuple[str, Union[str, int], int]] = []
+        with self._lock:
+            categorias = self._categorias
+            posicion = bisect_left(categorias, clave)
+            while len(sugerencias) < limite and posicion < len(categorias):
+                entrada = categorias[posicion]
+                if not entrada.startswith(clave):
+                    break
+                numero = self._numeros_categoria[entrada]
+                sugerencias.append(('categoria', entrada.split("\0", 1)[1], self._usos_categoria[numero]))
+                posicion += 1
+
+            # Los productos con el mismo nombre quedan seguidos: se sugiere
+            # el nombre una vez con la cantidad de productos, que se cuenta
+            # con una búsqueda binaria hasta la primera entrada posterior
+            # ("\1" ordena después de "\0id" y antes de cualquier nombre más
+            # largo) en lugar de recorrer los repetidos
+            nombres = self._nombres
+            posicion = bisect_left(nombres, clave)
+            while len(sugerencias) < limite and posicion < len(nombres):
+                entrada = nombres[posicion]
+                if not entrada.startswith(clave):
+                    break
+                normalizado, id_producto = entrada.rsplit("\0", 1)
+                siguiente = bisect_left(nombres, normalizado + "\1", posicion + 1)
+                sugerencias.append(('nombre', int(id_producto), siguiente - posicion))
+                posicion = siguiente
+        return sugerencias
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Generador de carga HTTP para la API del Sistema de Gestión de Inventario.
+
+Ejecuta una mezcla configurable de operaciones (GET por id, búsqueda por
+nombre, reporte de stock bajo, estadísticas, POST y PUT) contra la
+aplicación ASGI en el mismo proceso o contra un servidor uvicorn local, y
+reporta throughput, latencias p50/p95/p99 y tasa de errores por operación.
+
+Dos modelos de concurrencia:
+    cerrado  N clientes que envían una solicitud apenas reciben la anterior.
+    abierto  llegadas de Poisson a una tasa fija, independientes de las
+             respuestas. La latencia se mide desde el instante programado
+             de llegada, de modo que las colas del servidor se reflejan en
+             los percentiles en lugar de frenar al generador.
+
+Los resultados se guardan en JSON junto con el commit para comparar entre
+versiones.
+
+Uso:
+    python carga.py                                    # en proceso, 10k productos
+    python carga.py --modo abierto --tasa 300 --duracion 30
+    python carga.py --url http://127.0.0.1:8000 --productos 100000
+    python carga.py --mezcla id=70,buscar=10,crear=10,actualizar=10
+    python carga.py --comparar carga_anterior.json
+    python carga.py --workers 1,2,4,8 --concurrencia 32   # uvicorn con N workers
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from benchmark import obtener_metadatos
+from generador import MARCAS, SUSTANTIVOS, GeneradorCatalogo
+from inventario import InventarioManager
+
+ARCHIVO_RESULTADOS = "carga_resultados.json"
+MEZCLA_POR_DEFECTO = "id=50,buscar=15,stock=5,estadisticas=5,crear=10,actualizar=15"
+
+# Una solicitud: (método, ruta, cuerpo JSON opcional)
+Solicitud = Tuple[str, str, Optional[Dict[str, Any]]]
+
+
+def definir_operaciones(productos: int, rng: random.Random) -> Dict[str, Callable[[], Solicitud]]:
+    """
+    Define cómo construir cada tipo de solicitud.
+
+    Args:
+        productos: Cantidad de productos existentes (rango de ids válidos)
+        rng: Generador aleatorio de la corrida
+
+    Returns:
+        Diccionario nombre -> función que arma la solicitud
+    """
+    terminos = SUSTANTIVOS + MARCAS
+    contador = iter(range(1, sys.maxsize))
+
+    return {
+        'id': lambda: ("GET", f"/productos/{rng.randint(1, productos)}", None),
+        'buscar': lambda: ("GET", f"/productos/buscar/nombre/{rng.choice(terminos)} {rng.randint(1, productos):X}", None),
+        'stock': lambda: ("GET", f"/reportes/stock-bajo/{rng.randint(0, 3)}", None),
+        'estadisticas': lambda: ("GET", "/estadisticas", None),
+        'crear': lambda: ("POST", "/productos/", {
+            'nombre': f"Carga {next(contador)}", 'descripcion': "Alta de la prueba de carga",
+            'cantidad': rng.randint(0, 100), 'precio': round(rng.uniform(1, 500), 2), 'categoria': "Carga"
+        }),
+        'actualizar': lambda: ("PUT", f"/productos/{rng.randint(1, productos)}", {'cantidad': rng.randint(0, 200)}),
+    }
+
+
+def parsear_mezcla(texto: str) -> Dict[str, float]:
+    """Convierte 'id=50,buscar=15,...' en un diccionario de pesos."""
+    mezcla = {}
+    for parte in texto.split(","):
+        if not parte.strip():
+            continue
+        nombre, _, peso = parte.partition("=")
+        mezcla[nombre.strip()] = float(peso)
+    return mezcla
+
+
+def percentil(ordenados: List[float], p: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not ordenados:
+        return 0.0
+    indice = max(0, min(len(ordenados) - 1, int(round(p / 100 * len(ordenados) + 0.5)) - 1))
+    return ordenados[indice]
+
+
+class Registro:
+    """
+    Acumula latencias y errores por operación durante la ventana medida.
+    """
+
+    def __init__(self):
+        self.latencias: Dict[str, List[float]] = {}
+        self.errores: Dict[str, Dict[str, int]] = {}
+        self.medir = False
+        self.descartadas = 0
+
+    def anotar(self, operacion: str, latencia: float, estado: str) -> None:
+        """Registra una solicitud completada (estado = código HTTP o tipo de excepción)."""
+        if not self.medir:
+            return
+        self.latencias.setdefault(operacion, []).append(latencia)
+        if not estado.isdigit() or int(estado) >= 400:
+            errores = self.errores.setdefault(operacion, {})
+            errores[estado] = errores.get(estado, 0) + 1
+
+    def resumir(self, duracion: float) -> Dict[str, Any]:
+        """Calcula throughput, percentiles y tasas de error."""
+        def resumen(latencias: List[float], errores: int) -> Dict[str, Any]:
+            ordenadas = sorted(latencias)
+            return {
+                'solicitudes': len(ordenadas),
+                'throughput_rps': round(len(ordenadas) / duracion, 2) if duracion else 0.0,
+                'p50_ms': round(percentil(ordenadas, 50) * 1000, 3),
+                'p95_ms': round(percentil(ordenadas, 95) * 1000, 3),
+                'p99_ms': round(percentil(ordenadas, 99) * 1000, 3),
+                'max_ms': round(ordenadas[-1] * 1000, 3) if ordenadas else 0.0,
+                'errores': errores,
+                'tasa_errores': round(errores / len(ordenadas), 4) if ordenadas else 0.0
+            }
+
+        operaciones = {}
+        for nombre, latencias in sorted(self.latencias.items()):
+            operaciones[nombre] = resumen(latencias, sum(self.errores.get(nombre, {}).values()))
+            operaciones[nombre]['estados_error'] = self.errores.get(nombre, {})
+
+        todas = [l for latencias in self.latencias.values() for l in latencias]
+        total = resumen(todas, sum(sum(e.values()) for e in self.errores.values()))
+        total['descartadas'] = self.descartadas
+        return {'total': total, 'operaciones': operaciones}
+
+
+async def ejecutar_solicitud(cliente: httpx.AsyncClient, registro: Registro, operacion: str,
+                             solicitud: Solicitud, inicio: float) -> None:
+    """Envía una solicitud y anota su latencia desde 'inicio'."""
+    metodo, ruta, cuerpo = solicitud
+    try:
+        respuesta = await cliente.request(metodo, ruta, json=cuerpo)
+        estado = str(respuesta.status_code)
+    except httpx.HTTPError as e:
+        estado = type(e).__name__
+    registro.anotar(operacion, time.perf_counter() - inicio, estado)
+
+
+async def lazo_cerrado(cliente: httpx.AsyncClient, registro: Registro, sortear: Callable[[], str],
+                       operaciones: Dict[str, Callable[[], Solicitud]], fin: float,
+                       concurrencia: int) -> None:
+    """N clientes concurrentes, cada uno con una solicitud en curso a la vez."""
+    async def cliente_virtual():
+        while time.perf_counter() < fin:
+            operacion = sortear()
+            await ejecutar_solicitud(cliente, registro, operacion, operaciones[operacion](),
+                                     time.perf_counter())
+
+    await asyncio.gather(*(cliente_virtual() for _ in range(concurrencia)))
+
+
+async def lazo_abierto(cliente: httpx.AsyncClient, registro: Registro, sortear: Callable[[], str],
+                       operaciones: Dict[str, Callable[[], Solicitud]], fin: float, tasa: float,
+                       max_en_curso: int, rng: random.Random) -> None:
+    """
+    Llegadas de Poisson a 'tasa' solicitudes por segundo.
+
+    Si hay 'max_en_curso' solicitudes pendientes, la llegada se descarta y
+    se cuenta aparte para no agotar la memoria del generador.
+    """
+    pendientes = set()
+    llegada = time.perf_counter()
+    while True:
+        llegada += rng.expovariate(tasa)
+        if llegada >= fin:
+            break
+        espera = llegada - time.perf_counter()
+        if espera > 0:
+            await asyncio.sleep(espera)
+        if len(pendientes) >= max_en_curso:
+            if registro.medir:
+                registro.descartadas += 1
+            continue
+        operacion = sortear()
+        tarea = asyncio.ensure_future(
+            ejecutar_solicitud(cliente, registro, operacion, operaciones[operacion](), llegada))
+        pendientes.add(tarea)
+        tarea.add_done_callback(pendientes.discard)
+
+    if pendientes:
+        await asyncio.gather(*pendientes)
+
+
+def crear_cliente(url: Optional[str], concurrencia: int) -> httpx.AsyncClient:
+    """
+    Crea el cliente HTTP: contra 'url' si se indica, o contra la aplicación
+    ASGI importada en este proceso.
+    """
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+    if url:
+        return httpx.AsyncClient(base_url=url, limits=limites, timeout=30.0)
+
+    from api import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://carga",
+                             limits=limites, timeout=30.0)
+
+
+async def correr(args: argparse.Namespace) -> Dict[str, Any]:
+    """Ejecuta el calentamiento y la ventana medida."""
+    rng = random.Random(args.semilla)
+    mezcla = parsear_mezcla(args.mezcla)
+    operaciones = definir_operaciones(args.productos, rng)
+    desconocidas = set(mezcla) - set(operaciones)
+    if desconocidas:
+        raise ValueError(f"Operaciones desconocidas en la mezcla: {', '.join(sorted(desconocidas))}")
+    nombres, pesos = list(mezcla), list(mezcla.values())
+
+    def sortear() -> str:
+        return rng.choices(nombres, weights=pesos)[0]
+
+    registro = Registro()
+    duracion = 0.0
+    concurrencia = args.concurrencia if args.modo == "cerrado" else args.max_en_curso
+
+    async with crear_cliente(args.url, concurrencia) as cliente:
+        for fase, segundos in (("calentamiento", args.calentamiento), ("medicion", args.duracion)):
+            if segundos <= 0:
+                continue
+            registro.medir = fase == "medicion"
+            inicio = time.perf_counter()
+            fin = inicio + segundos
+            if args.modo == "cerrado":
+                await lazo_cerrado(cliente, registro, sortear, operaciones, fin, args.concurrencia)
+            else:
+                await lazo_abierto(cliente, registro, sortear, operaciones, fin, args.tasa,
+                                   args.max_en_curso, rng)
+            duracion = time.perf_counter() - inicio
+
+    return registro.resumir(duracion)
+
+
+def preparar_base(productos: int, semilla: int) -> str:
+    """
+    Siembra una base temporal para la corrida en proceso.
+
+    Returns:
+        Ruta de la base de datos creada
+    """
+    ruta = os.path.join(tempfile.mkdtemp(prefix="carga_inventario_"), "inventario.db")
+    inventario = InventarioManager(ruta)
+    GeneradorCatalogo(semilla=semilla).cargar_en_base(inventario, productos)
+    # Al cerrar, SQLite vuelca el WAL y la base queda en un único archivo
+    inventario.cerrar()
+    return ruta
+
+
+@contextmanager
+def levantar_servidor(workers: int, puerto: int, base: str, espera: float = 60.0) -> Iterator[str]:
+    """
+    Inicia api.py en modo producción con 'workers' procesos y lo detiene
+    (SIGTERM, cierre ordenado) al salir del bloque.
+
+    Args:
+        workers: Cantidad de procesos worker de uvicorn
+        puerto: Puerto local de escucha
+        base: Base de datos que usarán los workers
+        espera: Segundos máximos hasta que el servidor responda
+
+    Yields:
+        URL base del servidor
+    """
+    url = f"http://127.0.0.1:{puerto}"
+    entorno = dict(os.environ, INVENTARIO_DB=base, INVENTARIO_LOG_NIVEL="WARNING")
+    proceso = subprocess.Popen(
+        [sys.executable, "api.py", "--host", "127.0.0.1", "--port", str(puerto), "--workers", str(workers)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=entorno
+    )
+    try:
+        limite = time.monotonic() + espera
+        while True:
+            if proceso.poll() is not None:
+                raise RuntimeError(f"El servidor terminó al iniciar (código {proceso.returncode})")
+            try:
+                if httpx.get(url + "/", timeout=1.0).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > limite:
+                raise RuntimeError(f"El servidor no respondió en {espera:g} s")
+            time.sleep(0.2)
+        yield url
+    finally:
+        proceso.terminate()
+        try:
+            proceso.wait(timeout=20)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+            proceso.wait()
+
+
+def comparar_workers(args: argparse.Namespace, cantidades: List[int]) -> Dict[str, Any]:
+    """
+    Ejecuta la misma carga contra servidores con distinta cantidad de
+    workers, cada uno sobre una copia recién sembrada del catálogo.
+
+    Returns:
+        Resultados por cantidad de workers
+    """
+    plantilla = preparar_base(args.productos, args.semilla)
+    resultados = {}
+    for workers in cantidades:
+        base = os.path.join(os.path.dirname(plantilla), f"workers_{workers}.db")
+        shutil.copyfile(plantilla, base)
+        print(f"\n🏭 {workers} worker(s)")
+        with levantar_servidor(workers, args.puerto, base) as url:
+            args.url = url
+            resultados[str(workers)] = asyncio.run(correr(args))
+        total = resultados[str(workers)]['total']
+        print(f"   {total['throughput_rps']:.1f} solicitudes/s · p50 {total['p50_ms']:.2f} ms · "
+              f"p95 {total['p95_ms']:.2f} ms · p99 {total['p99_ms']:.2f} ms · errores {total['tasa_errores']:.2%}")
+    args.url = None
+    return resultados
+
+
+def imprimir_resultados(resultados: Dict[str, Any], anterior: Dict[str, Any] = None) -> None:
+    """Muestra la tabla de resultados, con la variación respecto de una corrida anterior."""
+    print(f"\n{'Operación':<14} {'Solic.':>8} {'RPS':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'Errores':>8}")
+    print("-" * 70)
+    filas = list(resultados['operaciones'].items()) + [('TOTAL', resultados['total'])]
+    previas = dict(anterior['operaciones'], TOTAL=anterior['total']) if anterior else {}
+    for nombre, r in filas:
+        print(f"{nombre:<14} {r['solicitudes']:>8} {r['throughput_rps']:>9.1f} {r['p50_ms']:>9.2f} "
+              f"{r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['tasa_errores']:>8.2%}")
+        previa = previas.get(nombre)
+        if previa and previa['p95_ms'] and previa['throughput_rps']:
+            print(f"{'  Δ anterior':<14} {'':>8} {r['throughput_rps'] / previa['throughput_rps'] - 1:>+9.0%} "
+                  f"{'':>9} {r['p95_ms'] / previa['p95_ms'] - 1:>+9.0%}")
+    if resultados['total']['descartadas']:
+        print(f"\n⚠️ {resultados['total']['descartadas']} llegadas descartadas por superar --max-en-curso")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API de inventario")
+    parser.add_argument("--url", help="URL de un servidor en ejecución (por defecto, en proceso)")
+    parser.add_argument("--productos", type=int, default=10000,
+                        help="Productos a sembrar en proceso / rango de ids existentes con --url")
+    parser.add_argument("--modo", choices=["cerrado", "abierto"], default="cerrado", help="Modelo de concurrencia")
+    parser.add_argument("--concurrencia", type=int, default=8, help="Clientes concurrentes (modo cerrado)")
+    parser.add_argument("--tasa", type=float, default=200.0, help="Solicitudes por segundo (modo abierto)")
+    parser.add_argument("--max-en-curso", type=int, default=256,
+                        help="Solicitudes pendientes máximas (modo abierto)")
+    parser.add_argument("--duracion", type=float, default=20.0, help="Segundos de medición")
+    parser.add_argument("--calentamiento", type=float, default=3.0, help="Segundos de calentamiento")
+    parser.add_argument("--mezcla", default=MEZCLA_POR_DEFECTO, help="Pesos por operación 'op=peso,...'")
+    parser.add_argument("--semilla", type=int, default=42, help="Semilla del catálogo y de la mezcla")
+    parser.add_argument("--salida", default=ARCHIVO_RESULTADOS, help="Archivo JSON de resultados")
+    parser.add_argument("--comparar", help="Resultados previos contra los que mostrar la variación")
+    parser.add_argument("--workers", help="Comparar servidores uvicorn con estas cantidades de workers (ej. 1,2,4,8)")
+    parser.add_argument("--puerto", type=int, default=8765, help="Puerto local para --workers")
+    args = parser.parse_args(argv)
+
+    print("🚦 PRUEBA DE CARGA - API DE INVENTARIO")
+    print("=" * 60)
+    if args.workers:
+        cantidades = [int(w) for w in args.workers.split(",") if w.strip()]
+        print(f"🎯 modo {args.modo} · workers {', '.join(map(str, cantidades))} · {args.duracion:g} s por corrida")
+        try:
+            por_workers = comparar_workers(args, cantidades)
+        except (RuntimeError, ValueError) as e:
+            print(f"❌ {e}")
+            return 2
+        resultados = {
+            'meta': dict(obtener_metadatos(args.semilla), destino="uvicorn", modo=args.modo,
+                         concurrencia=args.concurrencia, tasa=args.tasa, duracion=args.duracion,
+                         mezcla=parsear_mezcla(args.mezcla), productos=args.productos),
+            'workers': por_workers
+        }
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultados guardados en {args.salida}")
+        return 0
+
+    if not args.url:
+        inicio = time.perf_counter()
+        os.environ["INVENTARIO_DB"] = preparar_base(args.productos, args.semilla)
+        print(f"📦 {args.productos:,} productos sembrados en {time.perf_counter() - inicio:.2f} s")
+    destino = args.url or "en proceso"
+    detalle = f"{args.concurrencia} clientes" if args.modo == "cerrado" else f"{args.tasa:g} solicitudes/s"
+    print(f"🎯 {destino} · modo {args.modo} ({detalle}) · {args.duracion:g} s")
+
+    try:
+        metricas = asyncio.run(correr(args))
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+
+    resultados = {
+        'meta': dict(obtener_metadatos(args.semilla), destino=destino, modo=args.modo,
+                     concurrencia=args.concurrencia, tasa=args.tasa, duracion=args.duracion,
+                     mezcla=parsear_mezcla(args.mezcla), productos=args.productos),
+        **metricas
+    }
+
+    anterior = None
+    if args.comparar and os.path.exists(args.comparar):
+        with open(args.comparar, encoding="utf-8") as archivo:
+            anterior = json.load(archivo)
+    imprimir_resultados(resultados, anterior)
+
+    with open(args.salida, "w", encoding="utf-8") as archivo:
+        json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+    print(f"\n💾 Resultados guardados en {args.salida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,300 @@
+"""
+Consultas de productos que combinan filtros y orden en una sola sentencia.
+
+Una ConsultaProductos valida los filtros (igualdad, rango y texto) y las
+claves de orden, y los compila en un único SELECT parametrizado. Los
+filtros por categoría, precio, cantidad y valor tienen índices (simples y
+compuestos con categoria_id), igual que los órdenes por id, precio,
+cantidad y valor; en un inventario grande se rechaza la combinación que
+SQLite solo podría resolver recorriendo toda la tabla: sin ningún filtro
+indexado, o sin filtros y ordenada por una columna sin índice. Cuando
+hay filtros y el orden tiene índice, se prueba primero un tramo acotado
+del índice del orden y, si no alcanza para la página, se resuelven los
+filtros con su índice (ver ConsultaProductos.compilar).
+
+La paginación es por clave (keyset): cada página termina en un cursor con
+los valores de orden de su última fila y la siguiente empieza después de
+ellos. A diferencia de OFFSET, pedir la página 1000 cuesta lo mismo que
+la primera y una escritura entre páginas no repite ni saltea productos.
+"""
+
+import base64
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from moneda import a_centavos
+
+# Filtros admitidos: nombre -> (tipo, expresión SQL, operador, conversión).
+# Los montos se reciben en pesos y se comparan en centavos, como se guardan
+FILTROS = {
+    "categoria": ("igualdad", "categoria_id", "=", str),
+    "precio_min": ("rango", "precio_centavos", ">=", a_centavos),
+    "precio_max": ("rango", "precio_centavos", "<=", a_centavos),
+    "cantidad_min": ("rango", "cantidad", ">=", int),
+    "cantidad_max": ("rango", "cantidad", "<=", int),
+    "valor_min": ("rango", "cantidad * precio_centavos", ">=", a_centavos),
+    "valor_max": ("rango", "cantidad * precio_centavos", "<=", a_centavos),
+    "texto": ("texto", "nombre", "LIKE", str),
+    "a_reponer": ("condicion", "cantidad <= stock_minimo", None, bool),
+}
+# Filtros que SQLite resuelve con un índice (el de texto no)
+FILTROS_INDEXADOS = frozenset(nombre for nombre, (tipo, *_) in FILTROS.items() if tipo != "texto")
+
+# Claves de orden: nombre -> expresión SQL
+ORDENES = {
+    "id": "id",
+    "nombre": "nombre",
+    "precio": "precio_centavos",
+    "cantidad": "cantidad",
+    "stock_minimo": "stock_minimo",
+    "valor": "cantidad * precio_centavos",
+}
+ORDENES_INDEXADOS = frozenset({"id", "precio", "cantidad", "valor"})
+
+# Por encima de esta cantidad de productos se rechazan las combinaciones sin índice
+FILAS_SIN_INDICE = 20000
+LIMITE_POR_DEFECTO = 50
+LIMITE_MAXIMO = 1000
+# Filas del índice del orden que se recorren, por fila pedida, antes de
+# resolver los filtros con su propio índice
+RECORRIDO_POR_FILA = 20
+
+
+def interpretar_orden(orden: str) -> List[Tuple[str, bool]]:
+    """
+    Interpreta las claves de orden separadas por comas; un '-' adelante
+    ordena de mayor a menor ("-valor,nombre").
+
+    Args:
+        orden: Texto con las claves de orden
+
+    Returns:
+        Lista de tuplas (clave, descendente)
+
+    Raises:
+        ValueError: Si no hay claves, alguna es desconocida o se repite
+    """
+    claves = []
+    for parte in orden.split(","):
+        parte = parte.strip()
+        descendente = parte.startswith("-")
+        clave = parte.lstrip("-")
+        if clave not in ORDENES:
+            raise ValueError(f"Orden desconocido: {parte or '(vacío)'} (válidos: {', '.join(ORDENES)})")
+        if any(clave == anterior for anterior, _ in claves):
+            raise ValueError(f"La clave de orden {clave} está repetida")
+        claves.append((clave, descendente))
+    return claves
+
+
+def _escapar_like(texto: str) -> str:
+    """Escapa los comodines de LIKE para buscar el texto literal."""
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class ConsultaProductos:
+    """
+    Filtros, orden y página de una consulta de productos, validados y
+    listos para compilar en SQL.
+    """
+
+    def __init__(self, filtros: Optional[Dict[str, Any]] = None, orden: str = "id",
+                 limite: int = LIMITE_POR_DEFECTO, cursor: Optional[str] = None):
+        """
+        Args:
+            filtros: Diccionario nombre -> valor (ver FILTROS); los valores
+                None se ignoran
+            orden: Claves de orden (ver interpretar_orden); el id desempata
+            limite: Productos por página
+            cursor: Cursor devuelto con la página anterior
+
+        Raises:
+            ValueError: Si un filtro, el orden, el límite o el cursor no son válidos
+        """
+        self.filtros: Dict[str, Any] = {}
+        for nombre, valor in (filtros or {}).items():
+            if valor is None:
+                continue
+            if nombre not in FILTROS:
+                raise ValueError(f"Filtro desconocido: {nombre} (válidos: {', '.join(FILTROS)})")
+            try:
+                valor = FILTROS[nombre][3](valor)
+            except (TypeError, ValueError):
+                raise ValueError(f"Valor inválido para el filtro {nombre}: {valor!r}")
+            if nombre == "a_reponer" and not valor:
+                continue
+            self.filtros[nombre] = valor
+        for minimo, maximo in (("precio_min", "precio_max"), ("cantidad_min", "cantidad_max"),
+                               ("valor_min", "valor_max")):
+            if minimo in self.filtros and maximo in self.filtros and self.filtros[minimo] > self.filtros[maximo]:
+                raise ValueError(f"{minimo} no puede ser mayor que {maximo}")
+
+        self.orden = interpretar_orden(orden)
+        # El id desempata (y es la última clave del cursor)
+        if all(clave != "id" for clave, _ in self.orden):
+            self.orden.append(("id", self.orden[0][1]))
+        if not 1 <= limite <= LIMITE_MAXIMO:
+            raise ValueError(f"El límite debe estar entre 1 y {LIMITE_MAXIMO}")
+        self.limite = limite
+        self.despues_de = self._leer_cursor(cursor) if cursor else None
+
+    @property
+    def indexada(self) -> bool:
+        """Indica si un índice acota la consulta: un filtro indexado, o sin filtros un orden indexado."""
+        if self.filtros:
+            return any(nombre in FILTROS_INDEXADOS for nombre in self.filtros)
+        return self.orden[0][0] in ORDENES_INDEXADOS
+
+    def _huella(self) -> str:
+        """
+        Resumen de filtros y orden: un cursor solo vale para la misma consulta.
+        Incluye las expresiones SQL del orden, así los cursores emitidos con
+        otro esquema (por ejemplo, precios REAL en lugar de centavos) se rechazan.
+        """
+        orden = [(ORDENES[clave], descendente) for clave, descendente in self.orden]
+        texto = json.dumps([sorted(self.filtros.items()), orden], default=str)
+        return hashlib.blake2s(texto.encode(), digest_size=6).hexdigest()
+
+    def _leer_cursor(self, cursor: str) -> list:
+        """Decodifica un cursor y comprueba que corresponde a esta consulta."""
+        try:
+            datos = json.loads(base64.urlsafe_b64decode(cursor.encode() + b"=" * (-len(cursor) % 4)))
+            huella, valores = datos["c"], datos["v"]
+        except (ValueError, TypeError, KeyError):
+            raise ValueError("Cursor inválido")
+        if huella != self._huella() or not isinstance(valores, list) or len(valores) != len(self.orden):
+            raise ValueError("El cursor corresponde a otra consulta (otros filtros u orden)")
+        return valores
+
+    def cursor(self, valores: Sequence[Any]) -> str:
+        """
+        Crea el cursor que continúa después de una fila.
+
+        Args:
+            valores: Valores de las claves de orden de la fila
+
+        Returns:
+            Cursor opaco (base64 URL-safe)
+        """
+        datos = json.dumps({"c": self._huella(), "v": list(valores)}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(datos.encode()).decode().rstrip("=")
+
+    @property
+    def recorrer_orden(self) -> bool:
+        """
+        Indica si conviene probar primero el recorrido del índice del orden
+        (ver compilar): el orden tiene índice y hay filtros que ese índice
+        no resuelve (todos menos la categoría y un rango sobre la clave).
+        """
+        clave = self.orden[0][0]
+        return clave in ORDENES_INDEXADOS and any(
+            FILTROS[nombre][0] != "igualdad" and FILTROS[nombre][1] != ORDENES[clave] for nombre in self.filtros)
+
+    def compilar(self, columnas: Sequence[str], categoria_id: Optional[int] = None,
+                 recorrido: Optional[int] = None) -> Tuple[str, tuple]:
+        """
+        Compila la consulta en un SELECT parametrizado.
+
+        Las filas traen las columnas pedidas seguidas de los valores de las
+        claves de orden (para el cursor) y se piden limite + 1 para saber
+        si hay otra página.
+
+        Sin estadísticas de los rangos, SQLite elige el índice de un filtro
+        y ordena todas las filas que cumplen (en una categoría grande, decenas
+        de miles) aunque se pidan 50. Con 'recorrido', la consulta se limita
+        a las primeras filas de ese largo en el índice del orden (dentro de
+        la categoría y a partir del cursor) y los demás filtros se marcan con
+        '+' para que SQLite no los use como índice: si entre esas filas hay
+        una página completa, es la correcta. Si no, los filtros son escasos
+        en ese tramo del orden y el que llama repite la consulta sin
+        'recorrido': entonces es el orden el que se marca con '+', así
+        SQLite no recorre el índice del orden hasta juntar la página y
+        ordena solo las filas que cumplen los filtros.
+
+        Args:
+            columnas: Expresiones SQL de las columnas a leer, ya validadas
+            categoria_id: Id de la categoría del filtro 'categoria'
+            recorrido: Filas del índice del orden a recorrer como máximo
+
+        Returns:
+            Tupla (sentencia, parámetros)
+        """
+        por_filtros = recorrido is None and self.recorrer_orden
+        condiciones, params = [], []
+        if recorrido is not None:
+            acotado, valores = [], []
+            if "categoria" in self.filtros:
+                acotado.append("categoria_id = ?")
+                valores.append(categoria_id)
+            if self.despues_de is not None:
+                condicion, posteriores = self._despues_de()
+                acotado.append(condicion)
+                valores.extend(posteriores)
+            donde = f"WHERE {' AND '.join(acotado)} " if acotado else ""
+            condiciones.append(f"id IN (SELECT id FROM productos {donde}ORDER BY {self._orden()} LIMIT ?)")
+            params.extend(valores + [recorrido])
+        for nombre, valor in self.filtros.items():
+            tipo, expresion, operador, _ = FILTROS[nombre]
+            if recorrido is not None:
+                if tipo == "igualdad":
+                    continue
+                expresion = f"+{expresion}" if tipo == "condicion" else f"+({expresion})"
+            if tipo == "igualdad":
+                condiciones.append(f"{expresion} {operador} ?")
+                params.append(categoria_id if nombre == "categoria" else valor)
+            elif tipo == "rango":
+                condiciones.append(f"{expresion} {operador} ?")
+                params.append(valor)
+            elif tipo == "texto":
+                condiciones.append(f"{expresion} LIKE ? ESCAPE '\\'")
+                params.append(f"%{_escapar_like(valor)}%")
+            else:
+                condiciones.append(expresion)
+
+        if self.despues_de is not None and recorrido is None:
+            # Resolviendo por los filtros, la cota del cursor llevaría a
+            # SQLite de vuelta al índice del orden: se omite
+            condicion, valores = self._despues_de(cota=not por_filtros)
+            condiciones.append(condicion)
+            params.extend(valores)
+
+        expresiones = [ORDENES[clave] for clave, _ in self.orden]
+        query = f"SELECT {', '.join(list(columnas) + expresiones)} FROM productos"
+        if condiciones:
+            query += " WHERE " + " AND ".join(condiciones)
+        query += f" ORDER BY {self._orden(sin_indice=por_filtros)} LIMIT ?"
+        params.append(self.limite + 1)
+        return query, tuple(params)
+
+    def _orden(self, sin_indice: bool = False) -> str:
+        """Cláusula ORDER BY; con 'sin_indice' las claves van con '+' y SQLite no usa su índice."""
+        return ", ".join(
+            f"{f'+({ORDENES[clave]})' if sin_indice else ORDENES[clave]} {'DESC' if descendente else 'ASC'}"
+            for clave, descendente in self.orden)
+
+    def _despues_de(self, cota: bool = True) -> Tuple[str, list]:
+        """
+        Condición de las filas posteriores al cursor en el orden pedido.
+
+        La comparación lexicográfica completa se escribe anidada
+        (k1 > a OR (k1 = a AND (k2 > b OR ...))) y, con 'cota', se
+        antepone una cota simple sobre la primera clave (k1 >= a), que es la
+        que SQLite usa para empezar el recorrido del índice en el lugar del
+        cursor.
+        """
+        def comparar(posicion: int) -> Tuple[str, list]:
+            clave, descendente = self.orden[posicion]
+            expresion, valor = ORDENES[clave], self.despues_de[posicion]
+            operador = "<" if descendente else ">"
+            if posicion == len(self.orden) - 1:
+                return f"{expresion} {operador} ?", [valor]
+            resto, valores = comparar(posicion + 1)
+            return f"({expresion} {operador} ? OR ({expresion} = ? AND {resto}))", [valor, valor] + valores
+
+        clave, descendente = self.orden[0]
+        if len(self.orden) == 1 or not cota:
+            return comparar(0)
+        lexicografica, valores = comparar(0)
+        cota = f"{ORDENES[clave]} {'<=' if descendente else '>='} ?"
+        return f"{cota} AND {lexicografica}", [self.despues_de[0]] + valores
@@ -1,39 +1,283 @@
+import logging
+import queue
+import random
 import sqlite3
 import os
-from typing import Optional
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Iterable, Iterator, List, Optional, TypeVar, Union
+from urllib.request import pathname2url
+from busqueda import normalizar
+from instrumentacion import instrumentacion, normalizar_sql, tiempo_db_actual, traza_actual
+from metricas import registrar_bloqueo
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Espera de SQLite ante un bloqueo antes de devolver SQLITE_BUSY (en cada
+# intento); configurable con INVENTARIO_ESPERA_BLOQUEO
+TIEMPO_ESPERA_BLOQUEO = 1.0
+# Reintentos adicionales cuando, aun así, la base sigue bloqueada
+REINTENTOS_BLOQUEO = 8
+# Tope de la espera exponencial entre reintentos; cada espera se sortea
+# entre 0 y el tope del intento para que los escritores no se sincronicen
+ESPERA_REINTENTO = 0.02
+ESPERA_REINTENTO_MAXIMA = 1.0
+# Conexiones de solo lectura del pool; configurable con INVENTARIO_LECTORES
+LECTORES_POR_DEFECTO = 4
+
+# Instante actual en segundos Unix, para las columnas actualizado_en
+AHORA_SQL = "CAST(strftime('%s', 'now') AS INTEGER)"
+
+# Cada alta o modificación de un producto toma el siguiente valor del
+# contador global 'productos' como versión de la fila; cada baja también
+# lo incrementa y deja una lápida con esa versión en productos_eliminados.
+# El contador identifica así el estado de toda la tabla y las versiones
+# permiten pedir solo los cambios posteriores a un punto de control.
+# Los INSERT de InventarioManager ya traen la versión (VERSION_NUEVA_SQL)
+# y el trigger solo incrementa el contador: volver a escribir cada fila
+# recién insertada duplicaba el tiempo de las cargas masivas. El trigger
+# de modificación solo mira las columnas de datos, por eso el UPDATE de
+# version/actualizado_en que hacen los triggers no lo dispara.
+VERSION_NUEVA_SQL = "(SELECT valor + 1 FROM contadores WHERE nombre = 'productos')"
+_INCREMENTAR_CONTADOR = f"""
+    UPDATE contadores SET valor = valor + 1, actualizado_en = {AHORA_SQL}
+    WHERE nombre = 'productos';
+"""
+_VERSIONAR_FILA = f"""
+    UPDATE productos
+    SET version = (SELECT valor FROM contadores WHERE nombre = 'productos'),
+        actualizado_en = {AHORA_SQL}
+    WHERE id = NEW.id;
+"""
+TRIGGERS_VERSION = {
+    'trg_productos_alta': ("AFTER INSERT ON productos WHEN NEW.version <> 0", _INCREMENTAR_CONTADOR),
+    'trg_productos_alta_sin_version': ("AFTER INSERT ON productos WHEN NEW.version = 0",
+                                       _INCREMENTAR_CONTADOR + _VERSIONAR_FILA),
+    'trg_productos_cambio': ("AFTER UPDATE OF nombre, descripcion, cantidad, precio_centavos, categoria, stock_minimo "
+                             "ON productos",
+                             _INCREMENTAR_CONTADOR + _VERSIONAR_FILA),
+    'trg_productos_baja': ("AFTER DELETE ON productos", _INCREMENTAR_CONTADOR + f"""
+    INSERT OR REPLACE INTO productos_eliminados (id, version, eliminado_en)
+    VALUES (OLD.id, (SELECT valor FROM contadores WHERE nombre = 'productos'), {AHORA_SQL});
+"""),
+}
+
+# Índices de las consultas combinadas de filtros y orden
+INDICES_CONSULTA = {
+    'idx_productos_categoria_precio': "categoria_id, precio_centavos",
+    'idx_productos_categoria_cantidad': "categoria_id, cantidad",
+    'idx_productos_categoria_valor': "categoria_id, cantidad * precio_centavos",
+    'idx_productos_precio': "precio_centavos",
+    'idx_productos_cantidad': "cantidad",
+}
+
+T = TypeVar("T")
+
+# Tipo de acceso del método de InventarioManager en curso ('lectura' o 'escritura')
+acceso_actual: ContextVar[Optional[str]] = ContextVar("acceso_actual", default=None)
+
+
+def es_error_bloqueo(error: sqlite3.Error) -> bool:
+    """Indica si el error corresponde a SQLITE_BUSY / SQLITE_LOCKED."""
+    mensaje = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in mensaje or "busy" in mensaje)
+
+
+def _con_acceso(tipo: str):
+    """Crea un decorador que marca el tipo de acceso del método decorado."""
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            # Dentro de una escritura, las lecturas anidadas siguen usando el escritor
+            if acceso_actual.get() == 'escritura':
+                return funcion(*args, **kwargs)
+            token = acceso_actual.set(tipo)
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                acceso_actual.reset(token)
+        return envoltura
+    return decorador
+
+
+# Las consultas de un método @lectura van al pool de solo lectura; todas las
+# sentencias de un método @escritura usan la conexión de escritura. Fuera de
+# ambos, se decide por el verbo SQL.
+lectura = _con_acceso('lectura')
+escritura = _con_acceso('escritura')
+
+
+def _operacion_actual() -> str:
+    """Nombre de la primera función fuera de este módulo en la pila (ej. registrar_producto)."""
+    marco = sys._getframe(1)
+    while marco is not None and marco.f_code.co_filename == __file__:
+        marco = marco.f_back
+    return marco.f_code.co_name if marco is not None else "desconocido"
+
 
 class DatabaseManager:
     """
     Clase para manejar la base de datos del inventario.
     Proporciona métodos para conectar, crear tablas y ejecutar operaciones.
+    
+    Las lecturas usan un pool de conexiones de solo lectura (mode=ro,
+    query_only) y las escrituras una única conexión serializada, ya que
+    SQLite admite un solo escritor a la vez. En modo WAL los lectores no
+    esperan al escritor.
     """
     
-    def __init__(self, db_name: str = "inventario.db"):
+    def __init__(self, db_name: str = "inventario.db", timeout: float = None, lectores: int = None):
         """
         Inicializa el manejador de base de datos.
         
         Args:
             db_name: Nombre del archivo de base de datos
+            timeout: Segundos que SQLite espera a que se libere un bloqueo
+                en cada intento (por defecto INVENTARIO_ESPERA_BLOQUEO)
+            lectores: Tamaño máximo del pool de lectura (por defecto
+                INVENTARIO_LECTORES; 0 desactiva la separación)
         """
         self.db_name = db_name
+        if timeout is None:
+            timeout = float(os.environ.get("INVENTARIO_ESPERA_BLOQUEO", TIEMPO_ESPERA_BLOQUEO))
+        self.timeout = timeout
+        if lectores is None:
+            lectores = int(os.environ.get("INVENTARIO_LECTORES", LECTORES_POR_DEFECTO))
+        # Una base en memoria existe solo dentro de su conexión: todo va al escritor
+        self.separar_lecturas = db_name != ":memory:" and lectores > 0
+        self.max_lectores = lectores
+        self._escritor: Optional[sqlite3.Connection] = None
+        self._lock_escritor = threading.Lock()
+        self._lectores: List[sqlite3.Connection] = []
+        self._lectores_libres: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
         self.create_database()
     
     def get_connection(self) -> sqlite3.Connection:
         """
-        Obtiene una conexión a la base de datos.
+        Obtiene la conexión de escritura, abriéndola la primera vez.
+        
+        Es compartida por todos los hilos: usarla a través de
+        conexion_escritura(), que la serializa.
         
         Returns:
             Conexión a la base de datos SQLite
         """
-        return sqlite3.connect(self.db_name)
+        if self._escritor is None:
+            with self._lock:
+                if self._escritor is None:
+                    self._escritor = self._abrir_escritor()
+        return self._escritor
+    
+    def _abrir_escritor(self) -> sqlite3.Connection:
+        """Abre y configura la conexión de escritura."""
+        conn = sqlite3.connect(self.db_name, timeout=self.timeout, check_same_thread=False)
+        if self.db_name != ":memory:":
+            try:
+                # WAL permite lecturas concurrentes con un escritor
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.execute("PRAGMA synchronous = NORMAL")
+            except sqlite3.Error as e:
+                logger.warning("No se pudo activar WAL: %s", e, extra={'db': self.db_name})
+        return conn
+    
+    def _abrir_lector(self) -> sqlite3.Connection:
+        """Abre una conexión de solo lectura."""
+        uri = f"file:{pathname2url(os.path.abspath(self.db_name))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=self.timeout, check_same_thread=False)
+        conn.execute("PRAGMA query_only = 1")
+        return conn
+    
+    @contextmanager
+    def conexion_escritura(self) -> Iterator[sqlite3.Connection]:
+        """
+        Presta la conexión de escritura en exclusiva; confirma la
+        transacción al salir o la revierte si hubo una excepción.
+        """
+        with self._lock_escritor:
+            conn = self.get_connection()
+            with conn:
+                yield conn
+    
+    @contextmanager
+    def conexion_lectura(self) -> Iterator[sqlite3.Connection]:
+        """
+        Presta una conexión del pool de lectura, abriendo una nueva si
+        todas están ocupadas y el pool no llegó a su máximo.
+        """
+        if not self.separar_lecturas:
+            with self.conexion_escritura() as conn:
+                yield conn
+            return
+        
+        try:
+            conn = self._lectores_libres.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if len(self._lectores) < self.max_lectores:
+                    conn = self._abrir_lector()
+                    self._lectores.append(conn)
+            if conn is None:
+                conn = self._lectores_libres.get()
+        try:
+            yield conn
+        finally:
+            self._lectores_libres.put(conn)
+    
+    def _con_reintentos(self, operacion: Callable[[], T]) -> T:
+        """
+        Ejecuta la operación reintentando con espera exponencial acotada y
+        aleatoria mientras la base de datos siga bloqueada.
+        
+        El tiempo perdido por bloqueos y la cantidad de reintentos se
+        registran como métricas por operación de InventarioManager.
+        
+        Args:
+            operacion: Función sin argumentos que ejecuta la sentencia
+            
+        Returns:
+            El resultado de la operación
+            
+        Raises:
+            sqlite3.OperationalError: Si la base sigue bloqueada tras
+                REINTENTOS_BLOQUEO reintentos, o ante cualquier otro error
+        """
+        primer_intento = time.perf_counter()
+        for intento in range(REINTENTOS_BLOQUEO + 1):
+            inicio_intento = time.perf_counter()
+            try:
+                resultado = operacion()
+            except sqlite3.OperationalError as e:
+                if not es_error_bloqueo(e):
+                    raise
+                if intento == REINTENTOS_BLOQUEO:
+                    registrar_bloqueo(_operacion_actual(), time.perf_counter() - primer_intento,
+                                      intento, agotado=True)
+                    raise
+                tope = min(ESPERA_REINTENTO_MAXIMA, ESPERA_REINTENTO * 2 ** intento)
+                time.sleep(random.uniform(0, tope))
+                continue
+            if intento:
+                # Espera = intentos fallidos + pausas entre reintentos
+                registrar_bloqueo(_operacion_actual(), inicio_intento - primer_intento, intento)
+            return resultado
     
     def create_database(self) -> None:
         """
         Crea la base de datos y la tabla productos si no existen.
         """
         try:
-            with self.get_connection() as conn:
+            with self.conexion_escritura() as conn:
                 cursor = conn.cursor()
+                # Todo el esquema en una transacción: otro proceso que arranca
+                # a la vez no ve tablas a medio migrar ni triggers faltantes
+                cursor.execute("BEGIN IMMEDIATE")
                 
                 # Crear tabla productos
                 cursor.execute('''
@@ -42,16 +286,211 @@ class DatabaseManager:
                         nombre TEXT NOT NULL,
                         descripcion TEXT,
                         cantidad INTEGER NOT NULL,
-                        precio REAL NOT NULL,
-                        categoria TEXT
+                        precio_centavos INTEGER NOT NULL,
+                        categoria TEXT,
+                        categoria_id INTEGER REFERENCES categorias (id),
+                        stock_minimo INTEGER NOT NULL DEFAULT 0,
+                        version INTEGER NOT NULL DEFAULT 0,
+                        actualizado_en INTEGER NOT NULL DEFAULT 0
                     )
                 ''')
-                
+                self._migrar_versiones(cursor)
+                self._migrar_stock_minimo(cursor)
+                self._migrar_categorias(cursor)
+                self._migrar_precio_centavos(cursor)
+
+                # Índice para los datos de los gráficos: el Top por valor
+                # usa la expresión cantidad * precio_centavos (la distribución por
+                # categoría agrupa sobre idx_productos_categoria_id)
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_productos_valor
+                    ON productos (cantidad * precio_centavos)
+                ''')
+                # Consultas combinadas (InventarioManager.consultar_productos):
+                # un rango u orden por precio, cantidad o valor se resuelve
+                # dentro de una categoría con los índices compuestos y sin
+                # categoría con los simples
+                for nombre, columnas in INDICES_CONSULTA.items():
+                    cursor.execute(f"CREATE INDEX IF NOT EXISTS {nombre} ON productos ({columnas})")
+                # Productos a reponer: índice parcial que solo contiene las
+                # filas con cantidad <= stock_minimo. SQLite lo mantiene en
+                # cada escritura, así el reporte recorre únicamente esas
+                # filas (y contarlas no toca la tabla) en lugar de todo el
+                # inventario
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_productos_reposicion
+                    ON productos (cantidad, stock_minimo) WHERE cantidad <= stock_minimo
+                ''')
+                # Feed de cambios: filas con versión posterior a un punto de control
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_productos_version
+                    ON productos (version)
+                ''')
+
+                # Contador de cambios por tabla y triggers que versionan las filas
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS contadores (
+                        nombre TEXT PRIMARY KEY,
+                        valor INTEGER NOT NULL,
+                        actualizado_en INTEGER NOT NULL
+                    )
+                ''')
+                cursor.execute(f"INSERT OR IGNORE INTO contadores VALUES ('productos', 0, {AHORA_SQL})")
+                # Lápidas de los productos eliminados (los ids no se reutilizan
+                # porque la tabla usa AUTOINCREMENT)
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS productos_eliminados (
+                        id INTEGER PRIMARY KEY,
+                        version INTEGER NOT NULL,
+                        eliminado_en INTEGER NOT NULL
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_productos_eliminados_version
+                    ON productos_eliminados (version)
+                ''')
+                self._versionar_filas_existentes(cursor)
+                self._crear_triggers(cursor)
+
                 conn.commit()
-                print("Base de datos creada exitosamente.")
+                logger.debug("Base de datos inicializada", extra={'db': self.db_name})
                 
         except sqlite3.Error as e:
-            print(f"Error al crear la base de datos: {e}")
+            logger.error("Error al crear la base de datos: %s", e, extra={'db': self.db_name})
+    
+    @staticmethod
+    def _migrar_versiones(cursor: sqlite3.Cursor) -> None:
+        """
+        Agrega las columnas version y actualizado_en a una tabla productos
+        creada por una versión anterior. Las filas existentes quedan con la
+        fecha de la migración (la versión la asigna _versionar_filas_existentes).
+        """
+        columnas = {fila[1] for fila in cursor.execute("PRAGMA table_info(productos)")}
+        if 'version' not in columnas:
+            cursor.execute("ALTER TABLE productos ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        if 'actualizado_en' not in columnas:
+            cursor.execute("ALTER TABLE productos ADD COLUMN actualizado_en INTEGER NOT NULL DEFAULT 0")
+            cursor.execute(f"UPDATE productos SET actualizado_en = {AHORA_SQL}")
+            logger.info("Tabla productos migrada con columnas de versión", extra={'evento': 'migracion_versiones'})
+    
+    @staticmethod
+    def _migrar_stock_minimo(cursor: sqlite3.Cursor) -> None:
+        """
+        Agrega la columna stock_minimo a una tabla productos creada por una
+        versión anterior. Las filas existentes quedan con mínimo 0, es decir,
+        se reponen solo cuando se quedan sin stock.
+        """
+        columnas = {fila[1] for fila in cursor.execute("PRAGMA table_info(productos)")}
+        if 'stock_minimo' not in columnas:
+            cursor.execute("ALTER TABLE productos ADD COLUMN stock_minimo INTEGER NOT NULL DEFAULT 0")
+            logger.info("Tabla productos migrada con stock mínimo", extra={'evento': 'migracion_stock_minimo'})
+    
+    @staticmethod
+    def _migrar_categorias(cursor: sqlite3.Cursor) -> None:
+        """
+        Crea la tabla categorias y la columna categoria_id, y asigna su
+        categoría a los productos que no la tienen (bases anteriores). Las
+        variantes de un mismo nombre ("Electrónicos", "electronicos ") se
+        unifican en una categoría cuyo nombre es el ya registrado o, si es
+        nueva, la variante más usada; esos productos reciben el nombre
+        canónico y por eso cambian de versión.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS categorias (
+                id INTEGER PRIMARY KEY,
+                clave TEXT NOT NULL UNIQUE,
+                nombre TEXT NOT NULL
+            )
+        ''')
+        columnas = {fila[1] for fila in cursor.execute("PRAGMA table_info(productos)")}
+        if 'categoria_id' not in columnas:
+            cursor.execute("ALTER TABLE productos ADD COLUMN categoria_id INTEGER REFERENCES categorias (id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_productos_categoria_id ON productos (categoria_id)")
+        
+        variantes = {}
+        for texto, usos in cursor.execute(
+                "SELECT categoria, COUNT(*) FROM productos "
+                "WHERE categoria_id IS NULL AND categoria IS NOT NULL GROUP BY categoria"):
+            clave = normalizar(texto)
+            if clave:
+                variantes.setdefault(clave, []).append((-usos, texto))
+        if variantes:
+            cursor.execute("CREATE TEMP TABLE mapa_categorias (texto TEXT PRIMARY KEY, categoria_id INTEGER, nombre TEXT)")
+            for clave, textos in variantes.items():
+                cursor.execute("INSERT OR IGNORE INTO categorias (clave, nombre) VALUES (?, ?)",
+                               (clave, " ".join(min(textos)[1].split())))
+                categoria_id, nombre = cursor.execute(
+                    "SELECT id, nombre FROM categorias WHERE clave = ?", (clave,)).fetchone()
+                cursor.executemany("INSERT INTO temp.mapa_categorias VALUES (?, ?, ?)",
+                                   [(texto, categoria_id, nombre) for _, texto in textos])
+            # categoria_id no es una columna de datos: asignarla no cambia la versión
+            cursor.execute('''
+                UPDATE productos
+                SET categoria_id = (SELECT categoria_id FROM temp.mapa_categorias WHERE texto = productos.categoria)
+                WHERE categoria_id IS NULL AND categoria IN (SELECT texto FROM temp.mapa_categorias)
+            ''')
+            cursor.execute('''
+                UPDATE productos
+                SET categoria = (SELECT nombre FROM temp.mapa_categorias WHERE texto = productos.categoria)
+                WHERE categoria IN (SELECT texto FROM temp.mapa_categorias WHERE nombre <> texto)
+            ''')
+            cursor.execute("DROP TABLE temp.mapa_categorias")
+            logger.info("Productos migrados a %d categorías", len(variantes), extra={'evento': 'migracion_categorias'})
+        # El índice sobre el texto libre queda reemplazado por el de categoria_id
+        cursor.execute("DROP INDEX IF EXISTS idx_productos_categoria")
+    
+    @staticmethod
+    def _migrar_precio_centavos(cursor: sqlite3.Cursor) -> None:
+        """
+        Reemplaza la columna precio (REAL, en pesos) de una tabla creada por
+        una versión anterior por precio_centavos (INTEGER). Cada precio se
+        redondea a dos decimales antes de pasarlo a centavos, como hace
+        moneda.a_centavos, así 1.005 queda en 101 y no en 100.
+
+        Los índices sobre precio se eliminan (create_database los vuelve a
+        crear sobre precio_centavos) y el trigger de cambios también, porque
+        SQLite no permite eliminar una columna que se usa en ellos. El valor
+        de cada producto no cambia, así que tampoco su versión.
+        """
+        columnas = {fila[1] for fila in cursor.execute("PRAGMA table_info(productos)")}
+        if 'precio' not in columnas:
+            return
+        if 'precio_centavos' not in columnas:
+            cursor.execute("ALTER TABLE productos ADD COLUMN precio_centavos INTEGER NOT NULL DEFAULT 0")
+        cursor.execute("UPDATE productos SET precio_centavos = CAST(ROUND(ROUND(precio, 2) * 100) AS INTEGER)")
+        for indice in ('idx_productos_valor', 'idx_productos_categoria_precio', 'idx_productos_categoria_valor',
+                       'idx_productos_precio'):
+            cursor.execute(f"DROP INDEX IF EXISTS {indice}")
+        cursor.execute("DROP TRIGGER IF EXISTS trg_productos_cambio")
+        cursor.execute("ALTER TABLE productos DROP COLUMN precio")
+        logger.info("Precios migrados a centavos", extra={'evento': 'migracion_precio_centavos'})
+    
+    @staticmethod
+    def _versionar_filas_existentes(cursor: sqlite3.Cursor) -> None:
+        """
+        Asigna versión a las filas que quedaron en 0 al migrar, para que el
+        feed de cambios las incluya. Cada una recibe contador + id y el
+        contador avanza hasta la mayor, así ninguna versión se repite.
+        """
+        if cursor.execute("SELECT 1 FROM productos WHERE version = 0 LIMIT 1").fetchone() is None:
+            return
+        contador = cursor.execute("SELECT valor FROM contadores WHERE nombre = 'productos'").fetchone()[0]
+        cursor.execute("UPDATE productos SET version = ? + id WHERE version = 0", (contador,))
+        cursor.execute(f"""
+            UPDATE contadores SET valor = (SELECT MAX(version) FROM productos), actualizado_en = {AHORA_SQL}
+            WHERE nombre = 'productos'
+        """)
+    
+    @staticmethod
+    def _crear_triggers(cursor: sqlite3.Cursor) -> None:
+        """Crea los triggers de versión, o los reemplaza si su definición cambió."""
+        for nombre, (evento, cuerpo) in TRIGGERS_VERSION.items():
+            sql = f"CREATE TRIGGER {nombre} {evento} BEGIN {cuerpo} END"
+            actual = cursor.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (nombre,)).fetchone()
+            if actual is None or actual[0] != sql:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+                cursor.execute(sql)
     
     def execute_query(self, query: str, params: tuple = ()) -> Optional[list]:
         """
@@ -63,26 +502,208 @@ class DatabaseManager:
             
         Returns:
             Resultados de la consulta (para SELECT) o None
+            
+        Raises:
+            sqlite3.Error: Si falla una sentencia de escritura (las
+                lecturas fallidas devuelven None)
+        """
+        resultado = self._ejecutar(query, params)
+        return None if isinstance(resultado, sqlite3.Cursor) else resultado
+    
+    def ejecutar_escritura(self, query: str, params: tuple = ()) -> sqlite3.Cursor:
+        """
+        Ejecuta una sentencia de escritura como execute_query, pero devuelve
+        el cursor para consultar rowcount (comparar y actualizar) y lastrowid.
+        
+        Raises:
+            sqlite3.Error: Si falla la sentencia
+        """
+        return self._ejecutar(query, params)
+    
+    def transaccion(self, operacion: Callable[[sqlite3.Connection], T], query: str) -> T:
+        """
+        Ejecuta varias sentencias en una única transacción de escritura.
+
+        La transacción empieza con BEGIN IMMEDIATE: lo que la operación lee
+        no puede cambiar (ni desde otro hilo ni desde otro proceso) hasta
+        que confirma, así una lectura del estado anterior y la escritura
+        que depende de él son atómicas.
+
+        Args:
+            operacion: Función que recibe la conexión de escritura; se
+                vuelve a ejecutar entera si la base está bloqueada
+            query: Sentencia principal, con la que se reporta la duración
+
+        Returns:
+            El resultado de la operación
+
+        Raises:
+            sqlite3.Error: Si falla una sentencia (la transacción se revierte)
         """
+        acumulador = tiempo_db_actual.get()
+        medir = instrumentacion.activa or acumulador is not None or traza_actual.get() is not None
+        inicio = time.perf_counter() if medir else 0.0
+        def ejecutar():
+            with self.conexion_escritura() as conn:
+                antes = conn.total_changes
+                conn.execute("BEGIN IMMEDIATE")
+                resultado = operacion(conn)
+                conn.commit()
+                if medir:
+                    self._registrar_medicion(query, (), inicio, conn.total_changes - antes, acumulador, conn)
+                return resultado
+
         try:
-            with self.get_connection() as conn:
+            return self._con_reintentos(ejecutar)
+        except sqlite3.Error as e:
+            if medir:
+                self._registrar_medicion(query, (), inicio, 0, acumulador, error=True)
+            logger.error("Error al ejecutar transacción: %s", e, extra={'sql': normalizar_sql(query)})
+            raise
+
+    def _ejecutar(self, query: str, params: tuple):
+        """Ejecuta la sentencia: devuelve las filas de un SELECT o el cursor de una escritura."""
+        acumulador = tiempo_db_actual.get()
+        medir = instrumentacion.activa or acumulador is not None or traza_actual.get() is not None
+        inicio = time.perf_counter() if medir else 0.0
+        es_lectura = query.strip().upper().startswith('SELECT')
+        usar_lector = es_lectura and acceso_actual.get() != 'escritura'
+        def ejecutar():
+            with (self.conexion_lectura() if usar_lector else self.conexion_escritura()) as conn:
                 cursor = conn.cursor()
                 cursor.execute(query, params)
                 
                 # Si es una consulta SELECT, devolver resultados
-                if query.strip().upper().startswith('SELECT'):
-                    return cursor.fetchall()
+                if es_lectura:
+                    resultados = cursor.fetchall()
+                    if medir:
+                        self._registrar_medicion(query, params, inicio, len(resultados), acumulador, conn)
+                    return resultados
                 
                 conn.commit()
-                return None
+                if medir:
+                    self._registrar_medicion(query, params, inicio, max(cursor.rowcount, 0), acumulador, conn)
+                return cursor
+        
+        try:
+            return self._con_reintentos(ejecutar)
                 
         except sqlite3.Error as e:
-            print(f"Error al ejecutar consulta: {e}")
+            if medir:
+                self._registrar_medicion(query, params, inicio, 0, acumulador, error=True)
+            logger.error("Error al ejecutar consulta: %s", e, extra={'sql': normalizar_sql(query)})
+            # Una escritura fallida no debe pasar por exitosa
+            if not es_lectura:
+                raise
             return None
     
+    def execute_many(self, query: str, params_seq: Union[Iterable[tuple], Callable[[sqlite3.Connection], Iterable[tuple]]],
+                     diferir_indices: str = None) -> int:
+        """
+        Ejecuta una sentencia de escritura para cada conjunto de parámetros
+        dentro de una única transacción (carga masiva).
+        
+        Args:
+            query: Sentencia SQL a ejecutar
+            params_seq: Secuencia o iterador de tuplas de parámetros, o una
+                función que recibe la conexión de escritura y los devuelve
+                (para escribir datos relacionados, como categorías nuevas,
+                en la misma transacción)
+            diferir_indices: Tabla cuyos índices secundarios se eliminan
+                antes de la carga y se reconstruyen al final, dentro de la
+                misma transacción. Conviene en cargas de cientos de miles
+                de filas, donde ordenar una vez es más barato que mantener
+                cada índice fila por fila.
+            
+        Returns:
+            Cantidad de filas afectadas (0 si hubo un error)
+        """
+        acumulador = tiempo_db_actual.get()
+        medir = instrumentacion.activa or acumulador is not None or traza_actual.get() is not None
+        inicio = time.perf_counter() if medir else 0.0
+        def ejecutar():
+            with self.conexion_escritura() as conn:
+                cursor = conn.cursor()
+                indices = []
+                if diferir_indices:
+                    cursor.execute("BEGIN")
+                    indices = cursor.execute(
+                        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                        (diferir_indices,)
+                    ).fetchall()
+                    for nombre, _ in indices:
+                        cursor.execute(f'DROP INDEX "{nombre}"')
+                cursor.executemany(query, params_seq(conn) if callable(params_seq) else params_seq)
+                filas = cursor.rowcount
+                for _, sql in indices:
+                    cursor.execute(sql)
+                conn.commit()
+                filas = max(filas, 0)
+                if medir:
+                    self._registrar_medicion(query, (), inicio, filas, acumulador)
+                return filas
+        
+        try:
+            # Un iterador ya consumido no se puede volver a enviar
+            if isinstance(params_seq, (list, tuple)):
+                return self._con_reintentos(ejecutar)
+            return ejecutar()
+                
+        except sqlite3.Error as e:
+            if medir:
+                self._registrar_medicion(query, (), inicio, 0, acumulador, error=True)
+            logger.error("Error al ejecutar carga masiva: %s", e, extra={'sql': normalizar_sql(query)})
+            return 0
+    
+    def _registrar_medicion(self, query: str, params: tuple, inicio: float, filas: int,
+                            acumulador: Optional[list], conn: sqlite3.Connection = None,
+                            error: bool = False) -> None:
+        """
+        Reporta la duración de una sentencia a la instrumentación, al
+        acumulador de tiempo de base de datos y a la traza de la solicitud
+        en curso.
+        """
+        duracion = time.perf_counter() - inicio
+        if acumulador is not None:
+            acumulador[0] += duracion
+            acumulador[1] += 1
+        traza = traza_actual.get()
+        if traza is not None:
+            traza.agregar('db', inicio, duracion, sql=normalizar_sql(query), filas=filas)
+        if instrumentacion.activa:
+            instrumentacion.registrar_consulta(
+                query, params, duracion, filas,
+                _operacion_actual(), conn, error=error
+            )
+    
+    def calentar(self) -> None:
+        """
+        Abre las conexiones y recorre la tabla y sus índices para que las
+        primeras solicitudes encuentren las páginas en caché.
+        """
+        with self.conexion_escritura():
+            pass
+        with self.conexion_lectura() as conn:
+            conn.execute("SELECT COUNT(*), SUM(cantidad * precio_centavos) FROM productos").fetchone()
+            conn.execute("SELECT COUNT(*) FROM productos INDEXED BY idx_productos_categoria_id").fetchone()
+            conn.execute("SELECT COUNT(*) FROM productos WHERE cantidad <= stock_minimo").fetchone()
+    
     def close(self) -> None:
         """
-        Cierra la conexión a la base de datos.
+        Cierra la conexión de escritura y las del pool de lectura.
         """
-        # SQLite se cierra automáticamente con el context manager
-        pass 
\ No newline at end of file
+        with self._lock:
+            conexiones, self._lectores = self._lectores, []
+            self._lectores_libres = queue.LifoQueue()
+            escritor, self._escritor = self._escritor, None
+        for conn in conexiones:
+            conn.close()
+        # El escritor se cierra al final: al ser la última conexión, SQLite
+        # vuelca el WAL en la base
+        if escritor is not None:
+            with self._lock_escritor:
+                try:
+                    escritor.execute("PRAGMA optimize")
+                    escritor.close()
+                except sqlite3.Error as e:
+                    logger.warning("Error al cerrar la conexión de escritura: %s", e, extra={'db': self.db_name})
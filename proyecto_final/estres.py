@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Prueba de estrés de escrituras concurrentes sobre la misma base SQLite.
+
+Lanza varios procesos escritores que registran y actualizan productos al
+mismo tiempo (como la API y la interfaz web sobre un volumen compartido)
+y verifica al final que ninguna escritura confirmada se haya perdido.
+Informa el throughput y los reintentos y la espera por bloqueos de cada
+operación.
+
+Uso:
+    python estres.py                                   # 4 escritores x 500 altas
+    python estres.py --escritores 8 --escrituras 1000
+    python estres.py --espera-bloqueo 0.005            # forzar reintentos
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Dict
+
+PREFIJO = "Estrés"
+
+
+def escritor(numero: int, base: str, escrituras: int, barrera) -> Dict[str, Any]:
+    """
+    Registra 'escrituras' productos y actualiza uno de ellos después de cada alta.
+
+    Returns:
+        Altas y actualizaciones confirmadas, y las métricas de bloqueo del proceso
+    """
+    from inventario import InventarioManager, Producto
+    from metricas import db_bloqueos_agotados, db_espera_bloqueo, db_reintentos
+
+    inventario = InventarioManager(base)
+    rng = random.Random(numero)
+    altas = actualizaciones = 0
+    barrera.wait()
+
+    for i in range(escrituras):
+        producto = Producto(f"{PREFIJO} {numero}-{i}", "Alta concurrente", rng.randint(0, 100), 10.0, "Estrés")
+        if inventario.registrar_producto(producto):
+            altas += 1
+        if inventario.actualizar_producto(rng.randint(1, i + 1), cantidad=i):
+            actualizaciones += 1
+
+    inventario.cerrar()
+    return {
+        'altas': altas,
+        'actualizaciones': actualizaciones,
+        'reintentos': db_reintentos.valores(),
+        'espera': {clave: serie[-1] for clave, serie in db_espera_bloqueo.valores().items()},
+        'agotados': db_bloqueos_agotados.valores()
+    }
+
+
+def sumar(destino: Dict, origen: Dict) -> None:
+    """Suma los valores de 'origen' en 'destino' clave por clave."""
+    for clave, valor in origen.items():
+        destino[clave] = destino.get(clave, 0) + valor
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Prueba de estrés de escritores concurrentes")
+    parser.add_argument("--escritores", type=int, default=4, help="Procesos escritores")
+    parser.add_argument("--escrituras", type=int, default=500, help="Altas por escritor")
+    parser.add_argument("--espera-bloqueo", type=float,
+                        help="Segundos de busy timeout por intento (INVENTARIO_ESPERA_BLOQUEO)")
+    parser.add_argument("--base", help="Base de datos a usar (por defecto, una temporal)")
+    args = parser.parse_args(argv)
+
+    if args.espera_bloqueo is not None:
+        os.environ["INVENTARIO_ESPERA_BLOQUEO"] = str(args.espera_bloqueo)
+    base = args.base or os.path.join(tempfile.mkdtemp(prefix="estres_inventario_"), "inventario.db")
+
+    from inventario import InventarioManager
+    inventario = InventarioManager(base)
+    previas = inventario.db.execute_query("SELECT COUNT(*) FROM productos WHERE nombre LIKE ?", (f"{PREFIJO} %",))[0][0]
+
+    print("🔥 PRUEBA DE ESTRÉS - ESCRITORES CONCURRENTES")
+    print("=" * 60)
+    print(f"📍 {base} · {args.escritores} escritores x {args.escrituras} altas")
+
+    with multiprocessing.Manager() as administrador:
+        barrera = administrador.Barrier(args.escritores + 1)
+        with multiprocessing.Pool(args.escritores) as pool:
+            pendientes = [pool.apply_async(escritor, (n, base, args.escrituras, barrera))
+                          for n in range(1, args.escritores + 1)]
+            barrera.wait()
+            inicio = time.perf_counter()
+            resultados = [p.get() for p in pendientes]
+            duracion = time.perf_counter() - inicio
+
+    altas = sum(r['altas'] for r in resultados)
+    actualizaciones = sum(r['actualizaciones'] for r in resultados)
+    reintentos: Dict = {}
+    espera: Dict = {}
+    agotados: Dict = {}
+    for r in resultados:
+        sumar(reintentos, r['reintentos'])
+        sumar(espera, r['espera'])
+        sumar(agotados, r['agotados'])
+
+    guardadas = inventario.db.execute_query(
+        "SELECT COUNT(*) FROM productos WHERE nombre LIKE ?", (f"{PREFIJO} %",))[0][0] - previas
+    inventario.cerrar()
+
+    esperadas = args.escritores * args.escrituras
+    print(f"\n⏱️ {duracion:.2f} s · {(altas + actualizaciones) / duracion:,.0f} escrituras/s "
+          f"({altas:,} altas, {actualizaciones:,} actualizaciones)")
+    for (operacion,), cantidad in sorted(reintentos.items()):
+        print(f"   🔁 {operacion}: {int(cantidad)} reintentos, {espera.get((operacion,), 0):.3f} s de espera")
+    for (operacion,), cantidad in sorted(agotados.items()):
+        print(f"   ⛔ {operacion}: {int(cantidad)} sentencias fallaron tras agotar los reintentos")
+
+    if guardadas != altas:
+        print(f"\n❌ Se confirmaron {altas:,} altas pero hay {guardadas:,} en la base")
+        return 1
+    if altas != esperadas:
+        print(f"\n⚠️ {esperadas - altas:,} altas fallaron (reportadas como error, ninguna se perdió)")
+        return 1
+    print(f"\n✅ Las {guardadas:,} altas confirmadas están en la base: ninguna escritura se perdió")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
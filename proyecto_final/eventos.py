@@ -0,0 +1,331 @@
+"""
+Canal de publicación/suscripción de los cambios de stock.
+
+InventarioManager publica un evento por cada alta, modificación o baja
+(solo si hay suscriptores, así sin clientes conectados las escrituras no
+pagan nada) y el bus lo reparte a las suscripciones cuyos filtros lo
+aceptan. El evento se codifica una sola vez y todas las suscripciones
+comparten los mismos bytes; por cada publicación se despierta el event
+loop una sola vez, sin importar cuántos clientes reciban el evento.
+
+Cuando un alta o una modificación deja un producto en su stock mínimo o
+por debajo se publica además una alerta 'stock_bajo', y 'stock_repuesto'
+cuando vuelve a superarlo.
+
+Cada suscripción tiene un buffer acotado con una de dos políticas:
+    descartar  -- con el buffer lleno se pierde el evento más viejo
+    combinar   -- un evento nuevo de un producto reemplaza al pendiente del
+                  mismo producto (el cliente solo necesita el último estado)
+Los eventos perdidos se informan con un evento 'perdidos', para que el
+cliente se resincronice con GET /productos/cambios.
+
+Las suscripciones se consumen desde asyncio (SSE y WebSocket en api.py);
+la publicación puede venir de cualquier hilo. Las escrituras de otros
+procesos (otros workers, la interfaz web) llegan a través de
+seguir_cambios(), que lee el feed de cambios de la base.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+from busqueda import normalizar
+from metricas import eventos_descartados, eventos_publicados, eventos_suscriptores
+from moneda import a_unidades
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+POLITICAS = ("descartar", "combinar")
+CAPACIDAD_POR_DEFECTO = 100
+CAPACIDAD_MAXIMA = 10000
+MAXIMO_SUSCRIPTORES = 1000
+# Versiones publicadas localmente que se recuerdan para no repetirlas al
+# leer el feed de cambios
+VERSIONES_RECORDADAS = 10000
+# Cambios por lectura del feed; si un proceso externo escribió más que
+# esto entre dos lecturas se publica un único evento 'carga'
+CAMBIOS_POR_LECTURA = 1000
+# Eventos de un producto, sujetos a los filtros de cada suscripción
+TIPOS_PRODUCTO = ("alta", "cambio", "baja", "stock_bajo", "stock_repuesto")
+# Cruces del stock mínimo: se combinan entre sí pero no con los cambios
+# del producto, para que una alerta pendiente no se pierda
+TIPOS_ALERTA = ("stock_bajo", "stock_repuesto")
+
+
+class Evento:
+    """
+    Cambio de un producto ('alta', 'cambio', 'baja'), cruce de su stock
+    mínimo ('stock_bajo', 'stock_repuesto') o aviso general ('carga',
+    'perdidos'), codificado una sola vez para todos los clientes.
+    """
+
+    __slots__ = ("tipo", "datos", "_json", "_sse")
+
+    def __init__(self, tipo: str, datos: Dict[str, Any]):
+        self.tipo = tipo
+        self.datos = datos
+        self._json: Optional[str] = None
+        self._sse: Optional[bytes] = None
+
+    @property
+    def clave(self) -> Any:
+        """ID del producto (o alerta y ID), usado para combinar eventos pendientes."""
+        id_producto = self.datos.get('id')
+        if id_producto is not None and self.tipo in TIPOS_ALERTA:
+            return ('alerta', id_producto)
+        return id_producto
+
+    def json(self) -> str:
+        """Evento como objeto JSON ({"tipo": ..., datos...})."""
+        if self._json is None:
+            self._json = json.dumps({'tipo': self.tipo, **self.datos}, ensure_ascii=False, separators=(",", ":"))
+        return self._json
+
+    def sse(self) -> bytes:
+        """Evento en el formato de Server-Sent Events."""
+        if self._sse is None:
+            version = self.datos.get('version')
+            encabezado = f"id: {version}\n" if version is not None else ""
+            self._sse = f"{encabezado}event: {self.tipo}\ndata: {self.json()}\n\n".encode("utf-8")
+        return self._sse
+
+
+class Suscripcion:
+    """
+    Suscripción de un cliente, con filtros y un buffer acotado.
+
+    Se crea con BusEventos.suscribir() desde el event loop que la va a consumir.
+    """
+
+    def __init__(self, categoria: Optional[str] = None, umbral_stock: Optional[int] = None,
+                 capacidad: int = CAPACIDAD_POR_DEFECTO, politica: str = "combinar"):
+        """
+        Args:
+            categoria: Solo eventos de esta categoría, sin distinguir
+                mayúsculas ni acentos (las bajas de otros procesos, cuya
+                categoría se desconoce, llegan siempre)
+            umbral_stock: Solo cambios que dejan el stock en este valor o
+                menos, o que lo sacan de ese rango
+            capacidad: Eventos pendientes como máximo
+            politica: 'descartar' o 'combinar'
+
+        Raises:
+            ValueError: Si la política o la capacidad no son válidas
+        """
+        if politica not in POLITICAS:
+            raise ValueError(f"Política desconocida: {politica} (válidas: {', '.join(POLITICAS)})")
+        if not 1 <= capacidad <= CAPACIDAD_MAXIMA:
+            raise ValueError(f"La capacidad debe estar entre 1 y {CAPACIDAD_MAXIMA}")
+
+        self.categoria = categoria
+        self._clave_categoria = normalizar(categoria) if categoria is not None else None
+        self.umbral_stock = umbral_stock
+        self.capacidad = capacidad
+        self.politica = politica
+        self.perdidos = 0
+        self._pendientes: "OrderedDict[Any, Evento]" = OrderedDict()
+        self._secuencia = itertools.count()
+        self._lock = threading.Lock()
+        self._loop = asyncio.get_running_loop()
+        self._aviso = asyncio.Event()
+        self._avisada = False
+
+    def acepta(self, evento: Evento) -> bool:
+        """Indica si el evento pasa los filtros de la suscripción."""
+        datos = evento.datos
+        if evento.tipo not in TIPOS_PRODUCTO:
+            return True
+        if (self.categoria is not None and 'categoria' in datos
+                and normalizar(datos['categoria'] or "") != self._clave_categoria):
+            return False
+        if self.umbral_stock is not None and evento.tipo != 'baja':
+            return any(cantidad is not None and cantidad <= self.umbral_stock
+                       for cantidad in (datos.get('cantidad'), datos.get('cantidad_anterior')))
+        return True
+
+    def encolar(self, evento: Evento) -> bool:
+        """
+        Agrega el evento al buffer aplicando la política.
+
+        Returns:
+            True si hay que despertar al consumidor
+        """
+        with self._lock:
+            clave = evento.clave
+            if self.politica == "descartar" or clave is None:
+                clave = ('evento', next(self._secuencia))
+            else:
+                self._pendientes.pop(clave, None)
+            self._pendientes[clave] = evento
+            while len(self._pendientes) > self.capacidad:
+                self._pendientes.popitem(last=False)
+                self.perdidos += 1
+                eventos_descartados.inc(self.politica)
+            despertar = not self._avisada
+            self._avisada = True
+            return despertar
+
+    def _despertar(self) -> None:
+        self._aviso.set()
+
+    async def siguientes(self, espera: float) -> List[Evento]:
+        """
+        Espera eventos pendientes y los devuelve todos juntos.
+
+        Args:
+            espera: Segundos máximos de espera
+
+        Returns:
+            Eventos en orden de llegada (vacía si no llegó ninguno)
+        """
+        try:
+            await asyncio.wait_for(self._aviso.wait(), espera)
+        except asyncio.TimeoutError:
+            return []
+        with self._lock:
+            eventos = list(self._pendientes.values())
+            self._pendientes.clear()
+            perdidos, self.perdidos = self.perdidos, 0
+            self._aviso.clear()
+            self._avisada = False
+        if perdidos:
+            eventos.insert(0, Evento('perdidos', {'cantidad': perdidos}))
+        return eventos
+
+
+def _despertar_todas(suscripciones: List[Suscripcion]) -> None:
+    for suscripcion in suscripciones:
+        suscripcion._despertar()
+
+
+class BusEventos:
+    """
+    Reparte los eventos publicados a las suscripciones activas.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscripciones: tuple = ()
+        self._versiones: deque = deque(maxlen=VERSIONES_RECORDADAS)
+        self._versiones_publicadas: set = set()
+
+    @property
+    def activo(self) -> bool:
+        """True si hay al menos un suscriptor (si no, no vale la pena publicar)."""
+        return bool(self._suscripciones)
+
+    def suscribir(self, **filtros) -> Suscripcion:
+        """
+        Crea una suscripción (ver Suscripcion) desde el event loop que la consumirá.
+
+        Raises:
+            ValueError: Si los filtros no son válidos
+            OverflowError: Si se alcanzó MAXIMO_SUSCRIPTORES
+        """
+        suscripcion = Suscripcion(**filtros)
+        with self._lock:
+            if len(self._suscripciones) >= MAXIMO_SUSCRIPTORES:
+                raise OverflowError(f"Se alcanzó el máximo de {MAXIMO_SUSCRIPTORES} suscriptores")
+            self._suscripciones += (suscripcion,)
+        eventos_suscriptores.inc()
+        return suscripcion
+
+    def desuscribir(self, suscripcion: Suscripcion) -> None:
+        """Quita una suscripción (no hace nada si ya no estaba)."""
+        with self._lock:
+            if suscripcion not in self._suscripciones:
+                return
+            self._suscripciones = tuple(s for s in self._suscripciones if s is not suscripcion)
+        eventos_suscriptores.dec()
+
+    def publicar(self, tipo: str, datos: Dict[str, Any]) -> None:
+        """
+        Publica un evento a todas las suscripciones que lo aceptan.
+
+        Args:
+            tipo: 'alta', 'cambio', 'baja', 'stock_bajo', 'carga', ...
+            datos: Datos del evento (con 'id' y 'version' si es de un producto)
+        """
+        suscripciones = self._suscripciones
+        if not suscripciones:
+            return
+        evento = Evento(tipo, datos)
+        self._recordar(datos.get('version'))
+        eventos_publicados.inc(tipo)
+
+        # Un único llamado por event loop despierta a todos sus suscriptores
+        por_despertar: Dict[asyncio.AbstractEventLoop, List[Suscripcion]] = {}
+        for suscripcion in suscripciones:
+            if suscripcion.acepta(evento) and suscripcion.encolar(evento):
+                por_despertar.setdefault(suscripcion._loop, []).append(suscripcion)
+        for loop, lista in por_despertar.items():
+            try:
+                loop.call_soon_threadsafe(_despertar_todas, lista)
+            except RuntimeError:
+                # El event loop ya se cerró; sus suscripciones se descartan solas
+                pass
+
+    def _recordar(self, version: Optional[int]) -> None:
+        """Recuerda una versión publicada para no repetirla desde el feed de cambios."""
+        if version is None or version in self._versiones_publicadas:
+            return
+        with self._lock:
+            if len(self._versiones) == self._versiones.maxlen:
+                self._versiones_publicadas.discard(self._versiones[0])
+            self._versiones.append(version)
+            self._versiones_publicadas.add(version)
+
+    def ya_publicada(self, version: int) -> bool:
+        """Indica si la versión se publicó en este proceso."""
+        return version in self._versiones_publicadas
+
+
+bus = BusEventos()
+
+
+async def seguir_cambios(inventario, intervalo: float = 1.0, eventos: BusEventos = bus) -> None:
+    """
+    Publica los cambios hechos por otros procesos leyendo el feed de cambios.
+
+    Mientras no hay suscriptores solo avanza el punto de control. Los cambios
+    que este proceso ya publicó se saltean por su versión. Se ejecuta hasta
+    que se cancela la tarea.
+
+    Args:
+        inventario: InventarioManager del que leer los cambios
+        intervalo: Segundos entre lecturas
+        eventos: Bus donde publicar
+    """
+    # Las lecturas corren en un hilo: el event loop sigue atendiendo los flujos
+    desde, _ = await asyncio.to_thread(inventario.obtener_version_inventario)
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            actual, _ = await asyncio.to_thread(inventario.obtener_version_inventario)
+            if actual <= desde or not eventos.activo:
+                desde = max(desde, actual)
+                continue
+            if actual - desde > CAMBIOS_POR_LECTURA:
+                eventos.publicar('carga', {'desde': desde, 'hasta': actual})
+                desde = actual
+                continue
+
+            cambios = await asyncio.to_thread(inventario.obtener_cambios, desde, CAMBIOS_POR_LECTURA,
+                                              columnas=("id", "nombre", "cantidad", "precio", "categoria",
+                                                        "stock_minimo"))
+            for id_producto, nombre, cantidad, precio, categoria, stock_minimo, version in cambios['productos']:
+                if not eventos.ya_publicada(version):
+                    eventos.publicar('cambio', {'id': id_producto, 'nombre': nombre, 'cantidad': cantidad,
+                                                'precio': a_unidades(precio), 'categoria': categoria,
+                                                'stock_minimo': stock_minimo, 'version': version})
+            for id_producto, version in cambios['eliminados']:
+                if not eventos.ya_publicada(version):
+                    eventos.publicar('baja', {'id': id_producto, 'version': version})
+            desde = cambios['hasta']
+        except Exception:
+            logger.exception("Error al leer el feed de cambios para los eventos")
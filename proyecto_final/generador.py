@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Generador determinístico de catálogos sintéticos para pruebas de carga y escala.
+
+Produce productos con una distribución parecida a la de un catálogo real:
+categorías y marcas con sesgo tipo Zipf, nombres de largo variable con cola
+larga, una proporción de productos sin stock y precios log-normales. La
+misma semilla siempre genera el mismo catálogo.
+
+Uso:
+    python generador.py --cantidad 1000000 --salida inventario.db
+    python generador.py --cantidad 100000 --formato csv --salida catalogo.csv
+    python generador.py --cantidad 100000 --formato ndjson --salida catalogo.ndjson
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import random
+import sys
+import time
+from typing import Iterator, List, Sequence, Tuple
+
+from inventario import InventarioManager, Producto
+from moneda import a_centavos
+
+CATEGORIAS_BASE = [
+    "Electrónicos", "Accesorios", "Audio", "Celulares", "Computación", "Oficina",
+    "Hogar", "Gaming", "Redes", "Almacenamiento", "Impresión", "Fotografía",
+    "Televisores", "Climatización", "Iluminación", "Herramientas", "Cables",
+    "Energía", "Seguridad", "Domótica"
+]
+MARCAS = [
+    "Samsung", "Logitech", "Sony", "HP", "Lenovo", "Dell", "Apple", "Xiaomi",
+    "Philips", "Corsair", "Kingston", "TP-Link", "Asus", "Acer", "JBL", "Epson",
+    "Canon", "Motorola", "Genius", "Noblex", "BGH", "Redragon", "HyperX", "Razer"
+]
+SUSTANTIVOS = [
+    "Mouse", "Teclado", "Monitor", "Auriculares", "Parlante", "Notebook", "Tablet",
+    "Cargador", "Cable", "Router", "Disco", "Pendrive", "Impresora", "Cámara",
+    "Micrófono", "Webcam", "Lámpara", "Adaptador", "Soporte", "Funda"
+]
+ADJETIVOS = [
+    "inalámbrico", "ergonómico", "gamer", "compacto", "profesional", "portátil",
+    "RGB", "mecánico", "ultradelgado", "reforzado", "USB-C", "Bluetooth", "4K",
+    "silencioso", "premium", "básico", "edición limitada", "negro", "blanco", "plateado"
+]
+
+Fila = Tuple[str, str, int, float, str]
+
+# Tamaño de carga desde el cual conviene reconstruir los índices al final
+UMBRAL_RECONSTRUIR_INDICES = 50000
+
+
+def pesos_zipf(cantidad: int, sesgo: float) -> List[float]:
+    """
+    Calcula pesos acumulados de una distribución tipo Zipf.
+
+    Args:
+        cantidad: Cantidad de valores posibles
+        sesgo: Exponente (0 = uniforme, valores mayores = más concentrado)
+
+    Returns:
+        Pesos acumulados para random.choices(cum_weights=...)
+    """
+    return list(itertools.accumulate(1 / (k ** sesgo) for k in range(1, cantidad + 1)))
+
+
+class GeneradorCatalogo:
+    """
+    Generador de productos sintéticos configurable y reproducible.
+    """
+
+    def __init__(self, semilla: int = 42, categorias: int = 20, sesgo: float = 1.1,
+                 proporcion_sin_stock: float = 0.05, precio_mediana: float = 80.0,
+                 precio_dispersion: float = 1.2, palabras_extra: Tuple[int, int] = (0, 4),
+                 largo_descripcion: Tuple[int, int] = (3, 20)):
+        """
+        Inicializa el generador.
+
+        Args:
+            semilla: Semilla del generador aleatorio
+            categorias: Cantidad de categorías distintas (cardinalidad)
+            sesgo: Exponente Zipf de categorías y marcas
+            proporcion_sin_stock: Fracción de productos con cantidad 0
+            precio_mediana: Mediana de la distribución log-normal de precios
+            precio_dispersion: Sigma de la distribución log-normal de precios
+            palabras_extra: Rango de adjetivos agregados al nombre (cola larga)
+            largo_descripcion: Rango de palabras de la descripción
+        """
+        self.semilla = semilla
+        self.categorias = self._nombres_categorias(categorias)
+        self.sesgo = sesgo
+        self.proporcion_sin_stock = proporcion_sin_stock
+        self.precio_mediana = precio_mediana
+        self.precio_dispersion = precio_dispersion
+        self.palabras_extra = palabras_extra
+        self.largo_descripcion = largo_descripcion
+
+    @staticmethod
+    def _nombres_categorias(cantidad: int) -> List[str]:
+        """Genera 'cantidad' nombres de categoría a partir de la lista base."""
+        nombres = CATEGORIAS_BASE[:cantidad]
+        sufijo = 2
+        while len(nombres) < cantidad:
+            for base in CATEGORIAS_BASE:
+                if len(nombres) == cantidad:
+                    break
+                nombres.append(f"{base} {sufijo}")
+            sufijo += 1
+        return nombres
+
+    def _pools(self, rng: random.Random, tamano: int = 8192):
+        """
+        Pre-sortea pools de sufijos, descripciones, stocks y precios.
+
+        Sortear cada fila desde estos pools (con random.choices en bloque)
+        mantiene las distribuciones y evita varias llamadas al generador
+        aleatorio por fila, que son el costo dominante en catálogos grandes.
+        """
+        min_extra, max_extra = self.palabras_extra
+        min_desc, max_desc = self.largo_descripcion
+        palabras = ADJETIVOS + SUSTANTIVOS
+
+        sufijos = []
+        for _ in range(tamano):
+            extra = rng.randint(min_extra, max_extra)
+            sufijos.append(" " + " ".join(rng.sample(ADJETIVOS, extra)) if extra else "")
+        descripciones = [" ".join(rng.choices(palabras, k=rng.randint(min_desc, max_desc)))
+                         for _ in range(tamano)]
+        stocks = [0 if rng.random() < self.proporcion_sin_stock else 1 + int(rng.expovariate(1 / 40))
+                  for _ in range(tamano)]
+        precios = [round(min(max(rng.lognormvariate(0, self.precio_dispersion) * self.precio_mediana, 0.5), 50000), 2)
+                   for _ in range(tamano)]
+        return sufijos, descripciones, stocks, precios
+
+    def filas(self, cantidad: int, bloque: int = 10000) -> Iterator[Fila]:
+        """
+        Genera filas (nombre, descripcion, cantidad, precio, categoria).
+
+        Args:
+            cantidad: Cantidad de filas a generar
+            bloque: Filas sorteadas por bloque (solo afecta el rendimiento)
+
+        Yields:
+            Tuplas listas para insertar en la tabla productos
+        """
+        rng = random.Random(self.semilla)
+        pesos_categorias = pesos_zipf(len(self.categorias), self.sesgo)
+        pesos_marcas = pesos_zipf(len(MARCAS), self.sesgo)
+        sufijos, descripciones, stocks, precios = self._pools(rng)
+
+        generadas = 0
+        while generadas < cantidad:
+            n = min(bloque, cantidad - generadas)
+            lote = zip(
+                range(generadas + 1, generadas + n + 1),
+                rng.choices(SUSTANTIVOS, k=n),
+                rng.choices(MARCAS, cum_weights=pesos_marcas, k=n),
+                rng.choices(sufijos, k=n),
+                rng.choices(descripciones, k=n),
+                rng.choices(stocks, k=n),
+                rng.choices(precios, k=n),
+                rng.choices(self.categorias, cum_weights=pesos_categorias, k=n)
+            )
+            for numero, sustantivo, marca, sufijo, descripcion, stock, precio, categoria in lote:
+                yield (f"{sustantivo} {marca} {numero:X}{sufijo}", descripcion, stock, precio, categoria)
+
+            generadas += n
+
+    def productos(self, cantidad: int) -> Iterator[Producto]:
+        """Genera objetos Producto (ver filas())."""
+        # Los precios salen de un pool chico: cada uno se pasa a centavos una vez
+        centavos = {}
+        for nombre, descripcion, stock, precio, categoria in self.filas(cantidad):
+            if precio not in centavos:
+                centavos[precio] = a_centavos(precio)
+            yield Producto(nombre, descripcion, stock, None, categoria, precio_centavos=centavos[precio])
+
+    def cargar_en_base(self, inventario: InventarioManager, cantidad: int) -> int:
+        """
+        Carga el catálogo mediante la carga masiva de InventarioManager.
+
+        A partir de UMBRAL_RECONSTRUIR_INDICES filas los índices se
+        reconstruyen al final de la carga en lugar de mantenerse fila por fila.
+
+        Returns:
+            Cantidad de productos registrados
+        """
+        return inventario.registrar_productos(self.productos(cantidad),
+                                              reconstruir_indices=cantidad >= UMBRAL_RECONSTRUIR_INDICES)
+
+    def escribir_csv(self, ruta: str, cantidad: int) -> int:
+        """Escribe el catálogo en CSV con encabezado. Devuelve las filas escritas."""
+        with open(ruta, "w", newline="", encoding="utf-8") as archivo:
+            escritor = csv.writer(archivo)
+            escritor.writerow(["nombre", "descripcion", "cantidad", "precio", "categoria"])
+            escritor.writerows(self.filas(cantidad))
+        return cantidad
+
+    def escribir_ndjson(self, ruta: str, cantidad: int) -> int:
+        """Escribe el catálogo como un objeto JSON por línea. Devuelve las filas escritas."""
+        claves = ("nombre", "descripcion", "cantidad", "precio", "categoria")
+        codificar = json.JSONEncoder(ensure_ascii=False).encode
+        with open(ruta, "w", encoding="utf-8") as archivo:
+            archivo.writelines(codificar(dict(zip(claves, fila))) + "\n" for fila in self.filas(cantidad))
+        return cantidad
+
+
+def _rango(texto: str) -> Tuple[int, int]:
+    """Convierte 'min,max' en una tupla de enteros."""
+    minimo, maximo = (int(v) for v in texto.split(","))
+    return minimo, maximo
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generador de catálogos sintéticos")
+    parser.add_argument("--cantidad", type=int, default=100000, help="Cantidad de productos")
+    parser.add_argument("--formato", choices=["db", "csv", "ndjson"], default="db", help="Destino")
+    parser.add_argument("--salida", default="inventario.db", help="Base de datos o archivo de salida")
+    parser.add_argument("--semilla", type=int, default=42, help="Semilla del generador")
+    parser.add_argument("--categorias", type=int, default=20, help="Cantidad de categorías")
+    parser.add_argument("--sesgo", type=float, default=1.1, help="Exponente Zipf de categorías y marcas")
+    parser.add_argument("--sin-stock", type=float, default=0.05, help="Proporción de productos sin stock")
+    parser.add_argument("--precio-mediana", type=float, default=80.0, help="Mediana de precios")
+    parser.add_argument("--palabras-extra", type=_rango, default=(0, 4),
+                        help="Rango 'min,max' de adjetivos extra en el nombre")
+    parser.add_argument("--largo-descripcion", type=_rango, default=(3, 20),
+                        help="Rango 'min,max' de palabras de la descripción")
+    args = parser.parse_args(argv)
+
+    generador = GeneradorCatalogo(
+        semilla=args.semilla, categorias=args.categorias, sesgo=args.sesgo,
+        proporcion_sin_stock=args.sin_stock, precio_mediana=args.precio_mediana,
+        palabras_extra=args.palabras_extra, largo_descripcion=args.largo_descripcion
+    )
+
+    inicio = time.perf_counter()
+    if args.formato == "db":
+        inventario = InventarioManager(args.salida)
+        generados = generador.cargar_en_base(inventario, args.cantidad)
+        inventario.cerrar()
+    elif args.formato == "csv":
+        generados = generador.escribir_csv(args.salida, args.cantidad)
+    else:
+        generados = generador.escribir_ndjson(args.salida, args.cantidad)
+    duracion = time.perf_counter() - inicio
+
+    print(f"✅ {generados:,} productos generados en {args.salida} ({duracion:.2f} s, "
+          f"{generados / duracion if duracion else 0:,.0f} filas/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,359 @@
+"""
+Instrumentación de consultas para el Sistema de Gestión de Inventario.
+
+Registra el tiempo, las filas devueltas, la huella normalizada de cada
+sentencia SQL y el método que la originó, agregándolos en histogramas en
+memoria. Las consultas que superan el umbral configurado se registran en el
+log junto con su EXPLAIN QUERY PLAN.
+
+Se activa con las variables de entorno:
+    INVENTARIO_INSTRUMENTACION=1
+    INVENTARIO_CONSULTA_LENTA_MS=<milisegundos>
+o desde código con instrumentacion.configurar(...).
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache, wraps
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Límites superiores (en milisegundos) de los buckets de los histogramas
+LIMITES_HISTOGRAMA_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+# Span activo (método de InventarioManager u operación) del contexto actual
+_span_actual: ContextVar[Optional[str]] = ContextVar("span_actual", default=None)
+
+# Acumulador [segundos, sentencias] del tiempo de base de datos de la
+# solicitud HTTP en curso; lo fija el middleware de métricas de la API
+tiempo_db_actual: ContextVar[Optional[list]] = ContextVar("tiempo_db_actual", default=None)
+
+# Traza de la solicitud en curso; la fija el middleware de trazas de la API
+traza_actual: ContextVar[Optional["Traza"]] = ContextVar("traza_actual", default=None)
+
+_RE_CADENAS = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMEROS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_LISTAS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=512)
+def normalizar_sql(query: str) -> str:
+    """
+    Obtiene la huella normalizada de una sentencia SQL.
+
+    Reemplaza literales por '?', colapsa las listas IN (?, ?, ...) y los
+    espacios, de modo que variantes de la misma consulta compartan huella.
+
+    Args:
+        query: Sentencia SQL original
+
+    Returns:
+        Sentencia normalizada
+    """
+    huella = _RE_CADENAS.sub("?", query)
+    huella = _RE_NUMEROS.sub("?", huella)
+    huella = _RE_LISTAS.sub("(...)", huella)
+    return _RE_ESPACIOS.sub(" ", huella).strip()
+
+
+class Histograma:
+    """
+    Histograma acumulado de duraciones con buckets fijos en milisegundos.
+    """
+
+    def __init__(self):
+        self.conteo = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LIMITES_HISTOGRAMA_MS) + 1)
+
+    def observar(self, duracion_ms: float) -> None:
+        """Agrega una observación al histograma."""
+        self.conteo += 1
+        self.total_ms += duracion_ms
+        if duracion_ms > self.max_ms:
+            self.max_ms = duracion_ms
+        for i, limite in enumerate(LIMITES_HISTOGRAMA_MS):
+            if duracion_ms <= limite:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def percentil(self, p: float) -> float:
+        """
+        Estima un percentil como el límite superior del bucket que lo contiene.
+
+        Args:
+            p: Percentil entre 0 y 100
+
+        Returns:
+            Duración estimada en milisegundos
+        """
+        if not self.conteo:
+            return 0.0
+        objetivo = self.conteo * p / 100
+        acumulado = 0
+        for i, cantidad in enumerate(self.buckets):
+            acumulado += cantidad
+            if acumulado >= objetivo:
+                return LIMITES_HISTOGRAMA_MS[i] if i < len(LIMITES_HISTOGRAMA_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convierte el histograma a diccionario"""
+        return {
+            'conteo': self.conteo,
+            'total_ms': round(self.total_ms, 3),
+            'promedio_ms': round(self.total_ms / self.conteo, 3) if self.conteo else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'p50_ms': self.percentil(50),
+            'p95_ms': self.percentil(95),
+            'p99_ms': self.percentil(99),
+            'buckets': dict(zip([str(l) for l in LIMITES_HISTOGRAMA_MS] + ['+Inf'], self.buckets))
+        }
+
+
+class EstadisticaConsulta:
+    """
+    Estadísticas acumuladas de una huella SQL.
+    """
+
+    def __init__(self, huella: str):
+        self.huella = huella
+        self.histograma = Histograma()
+        self.filas = 0
+        self.errores = 0
+        self.lentas = 0
+        self.llamadores: Dict[str, int] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convierte la estadística a diccionario"""
+        datos = {'huella': self.huella, 'filas': self.filas,
+                 'errores': self.errores, 'lentas': self.lentas,
+                 'llamadores': dict(self.llamadores)}
+        datos.update(self.histograma.to_dict())
+        return datos
+
+
+class Traza:
+    """
+    Spans registrados durante una solicitud, con tiempos relativos a su inicio.
+    """
+
+    def __init__(self):
+        self.id = os.urandom(8).hex()
+        self.inicio = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.marcas: Dict[str, float] = {}
+
+    def agregar(self, nombre: str, inicio: float, duracion: float, **atributos) -> None:
+        """
+        Agrega un span a la traza.
+
+        Args:
+            nombre: Nombre del span ('db', nombre del método, etc.)
+            inicio: Instante de inicio según time.perf_counter()
+            duracion: Duración en segundos
+            atributos: Datos adicionales del span (ej. huella SQL)
+        """
+        span = {'nombre': nombre,
+                'inicio_ms': round((inicio - self.inicio) * 1000, 3),
+                'duracion_ms': round(duracion * 1000, 3)}
+        if atributos:
+            span.update(atributos)
+        self.spans.append(span)
+
+    def marcar(self, evento: str) -> None:
+        """Registra el instante de un evento (ej. inicio del endpoint)."""
+        self.marcas[evento] = time.perf_counter()
+
+    def duracion_entre(self, desde: str, hasta: str) -> Optional[float]:
+        """Duración en milisegundos entre dos marcas, si ambas existen."""
+        if desde in self.marcas and hasta in self.marcas:
+            return max(0.0, (self.marcas[hasta] - self.marcas[desde]) * 1000)
+        return None
+
+
+class Instrumentacion:
+    """
+    Recolector de métricas de consultas y spans de operaciones.
+
+    Con la instrumentación desactivada, cada consulta solo paga la lectura
+    del atributo 'activa'.
+    """
+
+    def __init__(self, activa: bool = False, umbral_lento_ms: Optional[float] = None):
+        """
+        Inicializa el recolector.
+
+        Args:
+            activa: Si se registran métricas
+            umbral_lento_ms: Duración a partir de la cual una consulta se
+                considera lenta y se registra su plan (None lo desactiva)
+        """
+        self.activa = activa
+        self.umbral_lento_ms = umbral_lento_ms
+        self._consultas: Dict[str, EstadisticaConsulta] = {}
+        self._spans: Dict[str, Histograma] = {}
+        self._lock = threading.Lock()
+
+    def configurar(self, activa: Optional[bool] = None, umbral_lento_ms: Optional[float] = None) -> None:
+        """
+        Cambia la configuración en caliente.
+
+        Args:
+            activa: Activa o desactiva la instrumentación (opcional)
+            umbral_lento_ms: Nuevo umbral de consulta lenta (opcional)
+        """
+        if activa is not None:
+            self.activa = activa
+        if umbral_lento_ms is not None:
+            self.umbral_lento_ms = umbral_lento_ms if umbral_lento_ms > 0 else None
+
+    def registrar_consulta(self, query: str, params: tuple, duracion: float, filas: int,
+                           llamador: str, conexion=None, error: bool = False) -> None:
+        """
+        Registra la ejecución de una sentencia SQL.
+
+        Args:
+            query: Sentencia ejecutada
+            params: Parámetros de la sentencia
+            duracion: Tiempo de ejecución en segundos
+            filas: Filas devueltas (SELECT) o afectadas
+            llamador: Nombre del método que originó la consulta
+            conexion: Conexión abierta, usada para obtener el plan de las
+                consultas lentas
+            error: Si la sentencia terminó con error
+        """
+        huella = normalizar_sql(query)
+        duracion_ms = duracion * 1000
+        lenta = self.umbral_lento_ms is not None and duracion_ms >= self.umbral_lento_ms
+
+        with self._lock:
+            estadistica = self._consultas.get(huella)
+            if estadistica is None:
+                estadistica = self._consultas[huella] = EstadisticaConsulta(huella)
+            estadistica.histograma.observar(duracion_ms)
+            estadistica.filas += filas
+            estadistica.llamadores[llamador] = estadistica.llamadores.get(llamador, 0) + 1
+            if error:
+                estadistica.errores += 1
+            if lenta:
+                estadistica.lentas += 1
+
+        if lenta:
+            logger.warning(
+                "Consulta lenta (%.2f ms, %d filas) desde %s: %s\nPlan:\n%s",
+                duracion_ms, filas, llamador, huella, self._plan(query, params, conexion)
+            )
+
+    def _plan(self, query: str, params: tuple, conexion) -> str:
+        """Obtiene el EXPLAIN QUERY PLAN de una consulta como texto."""
+        if conexion is None:
+            return "  (sin conexión disponible)"
+        try:
+            filas = conexion.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+            return "\n".join(f"  {fila[-1]}" for fila in filas) or "  (sin plan)"
+        except Exception as e:
+            return f"  (no disponible: {e})"
+
+    def registrar_span(self, nombre: str, duracion: float) -> None:
+        """Registra la duración (en segundos) de un span con nombre."""
+        with self._lock:
+            histograma = self._spans.get(nombre)
+            if histograma is None:
+                histograma = self._spans[nombre] = Histograma()
+            histograma.observar(duracion * 1000)
+
+    @contextmanager
+    def span(self, nombre: str):
+        """
+        Context manager que mide un bloque y lo asocia a las consultas que
+        se ejecuten dentro de él.
+
+        Args:
+            nombre: Nombre del span (ej. 'buscar_producto_por_id')
+        """
+        activa = self.activa
+        traza = traza_actual.get()
+        if not activa and traza is None:
+            yield
+            return
+        token = _span_actual.set(nombre)
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracion = time.perf_counter() - inicio
+            if activa:
+                self.registrar_span(nombre, duracion)
+            if traza is not None:
+                traza.agregar(nombre, inicio, duracion)
+            _span_actual.reset(token)
+
+    def medir(self, func: Callable) -> Callable:
+        """
+        Decorador que reporta cada llamada al método como un span, tanto
+        a las métricas como a la traza de la solicitud en curso.
+
+        Args:
+            func: Función o método a instrumentar
+
+        Returns:
+            Función envuelta
+        """
+        nombre = func.__name__
+
+        @wraps(func)
+        def envoltura(*args, **kwargs):
+            if not self.activa and traza_actual.get() is None:
+                return func(*args, **kwargs)
+            with self.span(nombre):
+                return func(*args, **kwargs)
+
+        return envoltura
+
+    def obtener_estadisticas(self) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Obtiene las métricas acumuladas.
+
+        Returns:
+            Diccionario con las listas 'consultas' (ordenadas por tiempo
+            total descendente) y 'spans'
+        """
+        with self._lock:
+            consultas = [e.to_dict() for e in self._consultas.values()]
+            spans = [dict(nombre=nombre, **h.to_dict()) for nombre, h in self._spans.items()]
+        consultas.sort(key=lambda c: c['total_ms'], reverse=True)
+        spans.sort(key=lambda s: s['total_ms'], reverse=True)
+        return {'consultas': consultas, 'spans': spans}
+
+    def reiniciar(self) -> None:
+        """Descarta todas las métricas acumuladas."""
+        with self._lock:
+            self._consultas.clear()
+            self._spans.clear()
+
+
+def _umbral_desde_entorno() -> Optional[float]:
+    """Lee el umbral de consulta lenta desde INVENTARIO_CONSULTA_LENTA_MS."""
+    try:
+        valor = float(os.environ.get("INVENTARIO_CONSULTA_LENTA_MS", "0"))
+    except ValueError:
+        return None
+    return valor if valor > 0 else None
+
+
+# Instancia compartida por DatabaseManager e InventarioManager
+instrumentacion = Instrumentacion(
+    activa=os.environ.get("INVENTARIO_INSTRUMENTACION", "0") == "1",
+    umbral_lento_ms=_umbral_desde_entorno()
+)
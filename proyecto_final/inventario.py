@@ -1,18 +1,116 @@
-from typing import List, Optional, Dict, Any
-from database import DatabaseManager
+import logging
+import sqlite3
+import time
+from typing import Iterable, Iterator, List, Optional, Dict, Any, Sequence, Tuple
+from busqueda import (CANDIDATOS_POR_RESULTADO, PRESUPUESTO_MS, SIMILITUD_MINIMA, IndicePrefijos, IndiceTrigramas,
+                      normalizar, similitud)
+from consultas import FILAS_SIN_INDICE, LIMITE_POR_DEFECTO, RECORRIDO_POR_FILA, ConsultaProductos
+from database import AHORA_SQL, VERSION_NUEVA_SQL, DatabaseManager, escritura, lectura
+from eventos import bus
+from instrumentacion import instrumentacion
+from metricas import alertas_stock
+from moneda import a_centavos, a_unidades
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Orden de las columnas en las filas devueltas con como_filas=True
+COLUMNAS = ("id", "nombre", "descripcion", "cantidad", "precio", "categoria", "stock_minimo")
+
+# Ids por consulta en las búsquedas por lote, por debajo del límite de
+# variables de SQLite (999 en versiones anteriores a 3.32)
+IDS_POR_CONSULTA = 900
+
+# Columnas de los eventos de stock publicados en eventos.bus
+COLUMNAS_EVENTO = ("id", "nombre", "cantidad", "precio", "categoria", "stock_minimo", "version")
+
+# Columnas que se leen de otra columna de la tabla: el precio se guarda en
+# centavos (precio_centavos) y las filas lo llevan así, como entero; se pasa
+# a pesos recién al serializar (ver filas_en_pesos)
+EXPRESIONES_COLUMNAS = {"precio": "precio_centavos"}
+
+def seleccionar_columnas(columnas: Optional[Iterable[str]] = None) -> Tuple[str, ...]:
+    """
+    Valida una proyección de columnas contra COLUMNAS.
+    
+    Como los nombres validados se interpolan en el SELECT, esta es la única
+    puerta de entrada de columnas a las consultas.
+    
+    Args:
+        columnas: Nombres de columna pedidos (None para todas)
+        
+    Returns:
+        Tupla de columnas sin repetidos, en el orden pedido
+        
+    Raises:
+        ValueError: Si la lista está vacía o tiene columnas desconocidas
+    """
+    if columnas is None:
+        return COLUMNAS
+    
+    seleccion = tuple(dict.fromkeys(columnas))
+    desconocidas = [c for c in seleccion if c not in COLUMNAS]
+    if desconocidas:
+        raise ValueError(f"Columnas desconocidas: {', '.join(desconocidas)} (válidas: {', '.join(COLUMNAS)})")
+    if not seleccion:
+        raise ValueError("Debe pedirse al menos una columna")
+    return seleccion
+
+def expresiones_columnas(seleccion: Iterable[str]) -> List[str]:
+    """
+    Traduce columnas ya validadas (ver seleccionar_columnas) a las
+    expresiones del SELECT que las leen.
+    """
+    return [EXPRESIONES_COLUMNAS.get(c, c) for c in seleccion]
+
+def filas_en_pesos(filas: Iterable[tuple], columnas: Sequence[str]) -> List[tuple]:
+    """
+    Pasa a pesos el precio de filas leídas con como_filas (que lo traen en
+    centavos), para serializarlas.
+    
+    Args:
+        filas: Tuplas cuyas primeras columnas siguen el orden de 'columnas'
+            (puede haber columnas extra al final, como la versión)
+        columnas: Columnas de las filas
+        
+    Returns:
+        Lista de tuplas con el precio en pesos
+    """
+    if "precio" not in columnas:
+        return filas if isinstance(filas, list) else list(filas)
+    posicion = columnas.index("precio")
+    return [(*fila[:posicion], a_unidades(fila[posicion]), *fila[posicion + 1:]) for fila in filas]
 
 class Producto:
     """
     Clase que representa un producto del inventario.
     """
     
-    def __init__(self, nombre: str, descripcion: str, cantidad: int, precio: float, categoria: str, id: int = None):
+    def __init__(self, nombre: str, descripcion: str, cantidad: int, precio: float, categoria: str, id: int = None,
+                 stock_minimo: int = 0, precio_centavos: int = None):
         self.id = id
         self.nombre = nombre
         self.descripcion = descripcion
         self.cantidad = cantidad
-        self.precio = precio
+        # El precio se guarda en centavos; 'precio' lo expone en pesos
+        self.precio_centavos = precio_centavos if precio_centavos is not None else a_centavos(precio)
         self.categoria = categoria
+        # Por debajo de este stock (o en él) el producto debe reponerse
+        self.stock_minimo = stock_minimo
+    
+    @property
+    def precio(self) -> float:
+        """Precio en pesos"""
+        return a_unidades(self.precio_centavos)
+    
+    @precio.setter
+    def precio(self, precio: float) -> None:
+        self.precio_centavos = a_centavos(precio)
+    
+    @property
+    def valor_centavos(self) -> int:
+        """Valor del stock (cantidad * precio) en centavos, exacto"""
+        return self.cantidad * self.precio_centavos
     
     def to_dict(self) -> Dict[str, Any]:
         """Convierte el producto a diccionario"""
@@ -22,173 +120,468 @@ class Producto:
             'descripcion': self.descripcion,
             'cantidad': self.cantidad,
             'precio': self.precio,
-            'categoria': self.categoria
+            'categoria': self.categoria,
+            'stock_minimo': self.stock_minimo
         }
 
+def _producto_desde_fila(fila: tuple) -> Producto:
+    """
+    Construye un Producto a partir de una fila leída en el orden de COLUMNAS
+    (con el precio en centavos).
+    
+    Args:
+        fila: Tupla con las columnas de COLUMNAS
+        
+    Returns:
+        Producto con los datos de la fila
+    """
+    return Producto(
+        id=fila[0],
+        nombre=fila[1],
+        descripcion=fila[2],
+        cantidad=fila[3],
+        precio=None,
+        precio_centavos=fila[4],
+        categoria=fila[5],
+        stock_minimo=fila[6]
+    )
+
 class InventarioManager:
     """
     Clase para manejar las operaciones del inventario.
     """
     
-    def __init__(self):
-        """Inicializa el manejador de inventario."""
-        self.db = DatabaseManager()
+    def __init__(self, db_name: str = "inventario.db"):
+        """
+        Inicializa el manejador de inventario.
+        
+        Args:
+            db_name: Nombre del archivo de base de datos
+        """
+        self.db = DatabaseManager(db_name)
+        # Índice de trigramas de los nombres; se carga con la primera búsqueda
+        # por similitud (o con preparar_busqueda) y se sincroniza con el feed
+        # de cambios antes de cada una
+        self.indice_nombres = IndiceTrigramas()
+        # Nombres y categorías ordenados para autocompletar; además del feed
+        # lo actualizan los métodos de escritura de este manejador
+        self.sugerencias = IndicePrefijos()
+        # Categorías ya confirmadas en la base: clave normalizada -> (id, nombre)
+        self._categorias: Dict[str, Tuple[int, str]] = {}
     
+    @instrumentacion.medir
+    @escritura
     def registrar_producto(self, producto: Producto) -> bool:
         """
         Registra un nuevo producto en el inventario.
         
         Args:
-            producto: Objeto Producto a registrar
+            producto: Objeto Producto a registrar; al registrarse se le
+                asigna el ID generado
             
         Returns:
             True si se registró exitosamente, False en caso contrario
         """
         try:
-            query = '''
-                INSERT INTO productos (nombre, descripcion, cantidad, precio, categoria)
-                VALUES (?, ?, ?, ?, ?)
+            query = f'''
+                INSERT INTO productos (nombre, descripcion, cantidad, precio_centavos, categoria, categoria_id,
+                                       stock_minimo, version, actualizado_en)
+                VALUES (?, ?, ?, ?, ?, ?, ?, {VERSION_NUEVA_SQL}, {AHORA_SQL})
             '''
-            params = (producto.nombre, producto.descripcion, producto.cantidad, 
-                     producto.precio, producto.categoria)
+            # Una categoría nueva se crea en la transacción del producto: si
+            # el alta falla, tampoco queda la categoría
+            nuevas: Dict[str, Tuple[int, str]] = {}
+            def registrar(conn):
+                nuevas.clear()
+                categoria_id, categoria = self._resolver_categoria(producto.categoria, conn, nuevas)
+                params = (producto.nombre, producto.descripcion, producto.cantidad,
+                          producto.precio_centavos, categoria, categoria_id, producto.stock_minimo)
+                return conn.execute(query, params).lastrowid, categoria
             
-            self.db.execute_query(query, params)
-            print(f"Producto '{producto.nombre}' registrado exitosamente.")
+            producto.id, producto.categoria = self.db.transaccion(registrar, query)
+            self._categorias.update(nuevas)
+            self._indexar(self.sugerencias.agregar, producto.id, producto.nombre, producto.categoria)
+            bajo_minimo = producto.cantidad <= producto.stock_minimo
+            if bus.activo or bajo_minimo:
+                datos = self._fila_evento(producto.id)
+                self._publicar('alta', datos)
+                if bajo_minimo:
+                    self._alertar_stock('stock_bajo', datos)
+            logger.info("Producto registrado", extra={'evento': 'producto_registrado', 'nombre': producto.nombre})
             return True
             
         except Exception as e:
-            print(f"Error al registrar producto: {e}")
+            logger.exception("Error al registrar producto")
             return False
     
-    def obtener_todos_los_productos(self) -> List[Producto]:
+    @instrumentacion.medir
+    @escritura
+    def registrar_productos(self, productos: Iterable[Producto], reconstruir_indices: bool = False) -> int:
+        """
+        Registra muchos productos en una sola transacción (carga masiva).
+        Los que quedan en o por debajo de su stock mínimo se alertan al
+        confirmarse la carga, como en registrar_producto.
+        
+        Args:
+            productos: Iterable de objetos Producto a registrar; su
+                categoría se reemplaza por el nombre canónico
+            reconstruir_indices: Si es True, los índices se reconstruyen una
+                vez al final en lugar de actualizarse por cada fila (más
+                rápido para cargas muy grandes)
+            
+        Returns:
+            Cantidad de productos registrados
+        """
+        try:
+            query = f'''
+                INSERT INTO productos (nombre, descripcion, cantidad, precio_centavos, categoria, categoria_id,
+                                       stock_minimo, version, actualizado_en)
+                VALUES (?, ?, ?, ?, ?, ?, ?, {VERSION_NUEVA_SQL}, {AHORA_SQL})
+            '''
+            # Las categorías nuevas se crean en la transacción de la carga y
+            # pasan a la caché solo si se confirma
+            nuevas: Dict[str, Tuple[int, str]] = {}
+            # La transacción tiene el escritor: los ids de la carga son los
+            # siguientes al último asignado, de a uno
+            carga = {'ultimo_id': 0, 'bajo_minimo': 0}
+            def params(conn):
+                carga['ultimo_id'] = conn.execute(
+                    "SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'productos'), 0), "
+                    "COALESCE((SELECT MAX(id) FROM productos), 0))").fetchone()[0]
+                for p in productos:
+                    categoria_id, p.categoria = self._resolver_categoria(p.categoria, conn, nuevas)
+                    if p.cantidad <= p.stock_minimo:
+                        carga['bajo_minimo'] += 1
+                    yield (p.nombre, p.descripcion, p.cantidad, p.precio_centavos, p.categoria, categoria_id,
+                           p.stock_minimo)
+            
+            # Una carga masiva se notifica con un único evento, no uno por fila
+            desde = self.obtener_version_inventario()[0] if bus.activo else None
+            registrados = self.db.execute_many(query, params,
+                                               diferir_indices='productos' if reconstruir_indices else None)
+            if registrados:
+                self._categorias.update(nuevas)
+            if registrados and carga['bajo_minimo']:
+                self._alertar_carga(carga['ultimo_id'], registrados)
+            # Las sugerencias toman la carga del feed en la próxima consulta
+            self.sugerencias.invalidar()
+            if registrados and desde is not None:
+                self._publicar('carga', {'cantidad': registrados, 'desde': desde,
+                                         'hasta': self.obtener_version_inventario()[0]})
+            logger.info("Carga masiva de productos", extra={'evento': 'productos_registrados', 'cantidad': registrados})
+            return registrados
+            
+        except Exception as e:
+            logger.exception("Error al registrar productos")
+            return 0
+    
+    @instrumentacion.medir
+    @lectura
+    def obtener_todos_los_productos(self, como_filas: bool = False,
+                                    columnas: Optional[Sequence[str]] = None) -> List[Producto]:
         """
         Obtiene todos los productos del inventario.
         
+        Args:
+            como_filas: Si es True, devuelve tuplas en el orden de COLUMNAS
+            columnas: Columnas a leer (ver seleccionar_columnas); implica
+                como_filas y las tuplas siguen el orden pedido
+            
         Returns:
             Lista de objetos Producto
         """
+        seleccion = seleccionar_columnas(columnas)
         try:
-            query = "SELECT id, nombre, descripcion, cantidad, precio, categoria FROM productos"
+            query = f"SELECT {', '.join(expresiones_columnas(seleccion))} FROM productos"
             resultados = self.db.execute_query(query)
+            if como_filas or columnas is not None:
+                return resultados or []
             
             productos = []
             if resultados:
                 for fila in resultados:
-                    producto = Producto(
-                        id=fila[0],
-                        nombre=fila[1],
-                        descripcion=fila[2],
-                        cantidad=fila[3],
-                        precio=fila[4],
-                        categoria=fila[5]
-                    )
-                    productos.append(producto)
+                    productos.append(_producto_desde_fila(fila))
             
             return productos
             
         except Exception as e:
-            print(f"Error al obtener productos: {e}")
+            logger.exception("Error al obtener productos")
             return []
     
-    def buscar_producto_por_id(self, id_producto: int) -> Optional[Producto]:
+    @instrumentacion.medir
+    @lectura
+    def buscar_producto_por_id(self, id_producto: int, como_filas: bool = False,
+                               columnas: Optional[Sequence[str]] = None) -> Optional[Producto]:
         """
         Busca un producto por su ID.
         
         Args:
             id_producto: ID del producto a buscar
+            como_filas: Si es True, devuelve tuplas en el orden de COLUMNAS
+            columnas: Columnas a leer (ver seleccionar_columnas); implica
+                como_filas y las tuplas siguen el orden pedido
             
         Returns:
             Objeto Producto si se encuentra, None en caso contrario
         """
+        seleccion = seleccionar_columnas(columnas)
         try:
-            query = "SELECT id, nombre, descripcion, cantidad, precio, categoria FROM productos WHERE id = ?"
+            query = f"SELECT {', '.join(expresiones_columnas(seleccion))} FROM productos WHERE id = ?"
             resultado = self.db.execute_query(query, (id_producto,))
+            if como_filas or columnas is not None:
+                return resultado[0] if resultado else None
             
             if resultado and len(resultado) > 0:
                 fila = resultado[0]
-                return Producto(
-                    id=fila[0],
-                    nombre=fila[1],
-                    descripcion=fila[2],
-                    cantidad=fila[3],
-                    precio=fila[4],
-                    categoria=fila[5]
-                )
+                return _producto_desde_fila(fila)
             
             return None
             
         except Exception as e:
-            print(f"Error al buscar producto: {e}")
+            logger.exception("Error al buscar producto")
             return None
     
-    def buscar_productos_por_nombre(self, nombre: str) -> List[Producto]:
+    @instrumentacion.medir
+    @lectura
+    def buscar_productos_por_ids(self, ids: Iterable[int], como_filas: bool = False,
+                                 columnas: Optional[Sequence[str]] = None) -> Tuple[List[Producto], List[int]]:
+        """
+        Busca varios productos por ID con una consulta WHERE id IN (...) por
+        cada IDS_POR_CONSULTA ids, en lugar de una consulta por producto.
+        
+        Args:
+            ids: IDs a buscar; los repetidos se buscan una sola vez
+            como_filas: Si es True, devuelve tuplas en el orden de COLUMNAS
+            columnas: Columnas a leer (ver seleccionar_columnas); implica
+                como_filas y las tuplas siguen el orden pedido
+            
+        Returns:
+            Tupla (productos encontrados en el orden de 'ids', ids que no existen)
+        """
+        seleccion = seleccionar_columnas(columnas)
+        ids = list(dict.fromkeys(ids))
+        # El id se lee siempre para poder devolver los productos en el orden pedido
+        agregar_id = "id" not in seleccion
+        lectura_id = ("id",) + seleccion if agregar_id else seleccion
+        posicion_id = lectura_id.index("id")
+        
+        try:
+            encontrados = {}
+            for inicio in range(0, len(ids), IDS_POR_CONSULTA):
+                tramo = ids[inicio:inicio + IDS_POR_CONSULTA]
+                query = f"SELECT {', '.join(expresiones_columnas(lectura_id))} FROM productos WHERE id IN ({', '.join('?' * len(tramo))})"
+                for fila in self.db.execute_query(query, tuple(tramo)) or []:
+                    encontrados[fila[posicion_id]] = fila[1:] if agregar_id else fila
+            
+            filas = [encontrados[i] for i in ids if i in encontrados]
+            faltantes = [i for i in ids if i not in encontrados]
+            if como_filas or columnas is not None:
+                return filas, faltantes
+            
+            productos = [_producto_desde_fila(fila) for fila in filas]
+            return productos, faltantes
+            
+        except Exception as e:
+            logger.exception("Error al buscar productos por ids")
+            return [], ids
+    
+    @instrumentacion.medir
+    @lectura
+    def buscar_productos_por_nombre(self, nombre: str, como_filas: bool = False,
+                                    columnas: Optional[Sequence[str]] = None) -> List[Producto]:
         """
         Busca productos por nombre (búsqueda parcial).
         
         Args:
             nombre: Nombre del producto a buscar
+            como_filas: Si es True, devuelve tuplas en el orden de COLUMNAS
+            columnas: Columnas a leer (ver seleccionar_columnas); implica
+                como_filas y las tuplas siguen el orden pedido
             
         Returns:
             Lista de productos que coinciden
         """
+        seleccion = seleccionar_columnas(columnas)
         try:
-            query = "SELECT id, nombre, descripcion, cantidad, precio, categoria FROM productos WHERE nombre LIKE ?"
+            query = f"SELECT {', '.join(expresiones_columnas(seleccion))} FROM productos WHERE nombre LIKE ?"
             resultado = self.db.execute_query(query, (f"%{nombre}%",))
+            if como_filas or columnas is not None:
+                return resultado or []
             
             productos = []
             if resultado:
                 for fila in resultado:
-                    producto = Producto(
-                        id=fila[0],
-                        nombre=fila[1],
-                        descripcion=fila[2],
-                        cantidad=fila[3],
-                        precio=fila[4],
-                        categoria=fila[5]
-                    )
-                    productos.append(producto)
+                    productos.append(_producto_desde_fila(fila))
             
             return productos
             
         except Exception as e:
-            print(f"Error al buscar productos por nombre: {e}")
+            logger.exception("Error al buscar productos por nombre")
             return []
     
-    def buscar_productos_por_categoria(self, categoria: str) -> List[Producto]:
+    @instrumentacion.medir
+    @lectura
+    def buscar_productos_similares(self, consulta: str, limite: int = 10,
+                                   presupuesto_ms: float = PRESUPUESTO_MS, como_filas: bool = False,
+                                   columnas: Optional[Sequence[str]] = None) -> Tuple[List[Tuple[Any, float]], bool]:
         """
-        Busca productos por categoría.
+        Busca productos por nombre tolerando errores de tipeo, acentos y
+        mayúsculas ("samsumg" encuentra "Samsung"), con el índice de trigramas.
+        
+        Los candidatos del índice se vuelven a puntuar con el nombre leído de
+        la base, así un renombre posterior a la última sincronización nunca
+        devuelve un nombre viejo.
         
         Args:
-            categoria: Categoría del producto a buscar
+            consulta: Texto buscado
+            limite: Cantidad máxima de resultados
+            presupuesto_ms: Tiempo máximo para recorrer el índice; si se
+                agota, se devuelven los mejores candidatos vistos hasta ahí
+            como_filas: Si es True, devuelve tuplas en el orden de COLUMNAS
+            columnas: Columnas a leer (ver seleccionar_columnas); implica
+                como_filas y las tuplas siguen el orden pedido
+            
+        Returns:
+            Tupla (lista de (producto o fila, similitud entre 0 y 1) de mayor a
+            menor similitud, False si el presupuesto cortó la búsqueda)
+            
+        Raises:
+            ValueError: Si la consulta no tiene letras ni números
+        """
+        seleccion = seleccionar_columnas(columnas)
+        if not normalizar(consulta):
+            raise ValueError("La búsqueda debe tener al menos una letra o número")
+        
+        try:
+            self.indice_nombres.sincronizar(self)
+            ids, completo = self.indice_nombres.candidatos(
+                consulta, limite * CANDIDATOS_POR_RESULTADO, presupuesto_ms)
+            filas, _ = self.buscar_productos_por_ids(ids, como_filas=True)
+            
+            puntuadas = []
+            for fila in filas:
+                puntaje = similitud(consulta, fila[1])
+                if puntaje >= SIMILITUD_MINIMA:
+                    puntuadas.append((puntaje, fila))
+            # A igual similitud, primero los nombres más cortos (menos palabras de más)
+            puntuadas.sort(key=lambda par: (-par[0], len(par[1][1]), par[1][0]))
+            
+            resultados = []
+            for puntaje, fila in puntuadas[:limite]:
+                if como_filas or columnas is not None:
+                    registro = tuple(fila[COLUMNAS.index(c)] for c in seleccion)
+                else:
+                    registro = _producto_desde_fila(fila)
+                resultados.append((registro, round(puntaje, 3)))
+            return resultados, completo
+            
+        except Exception as e:
+            logger.exception("Error al buscar productos similares")
+            return [], False
+    
+    def preparar_busqueda(self) -> None:
+        """
+        Carga el índice de trigramas y el de sugerencias para que la primera
+        búsqueda por similitud o sugerencia no pague su construcción.
+        """
+        try:
+            inicio = time.perf_counter()
+            self.indice_nombres.sincronizar(self)
+            self.sugerencias.sincronizar(self)
+            logger.info("Índices de búsqueda cargados",
+                        extra={'evento': 'indice_busqueda_cargado', 'entradas': self.indice_nombres.entradas,
+                               'duracion_ms': round((time.perf_counter() - inicio) * 1000, 1)})
+        except Exception as e:
+            logger.exception("Error al cargar el índice de búsqueda")
+    
+    @instrumentacion.medir
+    @lectura
+    def sugerir_productos(self, prefijo: str, limite: int = 10) -> List[Dict[str, Any]]:
+        """
+        Sugiere categorías y nombres de productos que empiezan con un prefijo
+        (autocompletar), sin distinguir mayúsculas ni acentos.
+        
+        Las completaciones salen del índice en memoria; a la base solo se
+        le piden los nombres sugeridos (una lectura por clave primaria) y,
+        como mucho una vez por segundo, las escrituras de otros procesos.
+        
+        Args:
+            prefijo: Texto escrito hasta ahora
+            limite: Cantidad máxima de sugerencias
+            
+        Returns:
+            Lista de diccionarios con 'tipo' ('categoria' o 'nombre'),
+            'texto' y 'productos' (cuántos productos lo tienen); primero las
+            categorías y después los nombres, en orden alfabético
+        """
+        try:
+            self.sugerencias.sincronizar(self)
+            sugerencias = self.sugerencias.sugerir(prefijo, limite)
+            ids = [valor for tipo, valor, _ in sugerencias if tipo == 'nombre']
+            nombres = dict(self.buscar_productos_por_ids(ids, columnas=("id", "nombre"))[0]) if ids else {}
+            return [{'tipo': tipo, 'texto': nombres.get(valor) if tipo == 'nombre' else valor, 'productos': productos}
+                    for tipo, valor, productos in sugerencias
+                    if tipo == 'categoria' or valor in nombres]
+            
+        except Exception as e:
+            logger.exception("Error al sugerir productos")
+            return []
+    
+    @instrumentacion.medir
+    @lectura
+    def buscar_productos_por_categoria(self, categoria: str, como_filas: bool = False,
+                                       columnas: Optional[Sequence[str]] = None) -> List[Producto]:
+        """
+        Busca productos por categoría, sin distinguir mayúsculas ni acentos.
+        
+        Si el texto es el nombre de una categoría, la búsqueda recorre solo
+        sus productos en idx_productos_categoria_id; si no, se buscan las
+        categorías que lo contienen (una tabla pequeña) y luego sus
+        productos por el mismo índice.
+        
+        Args:
+            categoria: Categoría del producto a buscar, o parte de su nombre
+            como_filas: Si es True, devuelve tuplas en el orden de COLUMNAS
+            columnas: Columnas a leer (ver seleccionar_columnas); implica
+                como_filas y las tuplas siguen el orden pedido
             
         Returns:
             Lista de productos de la categoría
         """
+        seleccion = seleccionar_columnas(columnas)
         try:
-            query = "SELECT id, nombre, descripcion, cantidad, precio, categoria FROM productos WHERE categoria LIKE ?"
-            resultado = self.db.execute_query(query, (f"%{categoria}%",))
+            clave = normalizar(categoria)
+            exacta = self.db.execute_query("SELECT id FROM categorias WHERE clave = ?", (clave,)) if clave else None
+            if exacta:
+                ids = [exacta[0][0]]
+            else:
+                ids = [fila[0] for fila in self.db.execute_query("SELECT id, clave FROM categorias") or []
+                       if clave in fila[1]]
+            resultado = []
+            for inicio in range(0, len(ids), IDS_POR_CONSULTA):
+                tramo = ids[inicio:inicio + IDS_POR_CONSULTA]
+                query = (f"SELECT {', '.join(expresiones_columnas(seleccion))} FROM productos "
+                         f"WHERE categoria_id IN ({', '.join('?' * len(tramo))})")
+                resultado.extend(self.db.execute_query(query, tuple(tramo)) or [])
+            if como_filas or columnas is not None:
+                return resultado or []
             
             productos = []
             if resultado:
                 for fila in resultado:
-                    producto = Producto(
-                        id=fila[0],
-                        nombre=fila[1],
-                        descripcion=fila[2],
-                        cantidad=fila[3],
-                        precio=fila[4],
-                        categoria=fila[5]
-                    )
-                    productos.append(producto)
+                    productos.append(_producto_desde_fila(fila))
             
             return productos
             
         except Exception as e:
-            print(f"Error al buscar productos por categoría: {e}")
+            logger.exception("Error al buscar productos por categoría")
             return []
     
+    @instrumentacion.medir
+    @escritura
     def actualizar_producto(self, id_producto: int, nombre: str = None, descripcion: str = None,
-                          cantidad: int = None, precio: float = None, categoria: str = None) -> bool:
+                          cantidad: int = None, precio: float = None, categoria: str = None,
+                          stock_minimo: int = None, version_esperada: int = None) -> bool:
         """
         Actualiza los datos de un producto existente.
         
@@ -199,17 +592,15 @@ class InventarioManager:
             cantidad: Nueva cantidad (opcional)
             precio: Nuevo precio (opcional)
             categoria: Nueva categoría (opcional)
+            stock_minimo: Nuevo stock mínimo (opcional)
+            version_esperada: Si se indica, solo actualiza si la fila sigue
+                en esa versión (comparar y actualizar en una sentencia)
             
         Returns:
-            True si se actualizó exitosamente, False en caso contrario
+            True si se actualizó exitosamente, False si no existe, cambió
+            de versión o no hay campos para actualizar
         """
         try:
-            # Verificar si el producto existe
-            producto_existente = self.buscar_producto_por_id(id_producto)
-            if not producto_existente:
-                print(f"No se encontró producto con ID {id_producto}")
-                return False
-            
             # Construir la consulta dinámicamente
             campos_actualizar = []
             valores = []
@@ -227,83 +618,677 @@ class InventarioManager:
                 valores.append(cantidad)
             
             if precio is not None:
-                campos_actualizar.append("precio = ?")
-                valores.append(precio)
+                campos_actualizar.append("precio_centavos = ?")
+                valores.append(a_centavos(precio))
             
             if categoria is not None:
-                campos_actualizar.append("categoria = ?")
-                valores.append(categoria)
+                # Se resuelve en la transacción del UPDATE (ver actualizar)
+                campos_actualizar.append("categoria = ?, categoria_id = ?")
+                posicion_categoria = len(valores)
+                valores.extend((categoria, None))
+            
+            if stock_minimo is not None:
+                campos_actualizar.append("stock_minimo = ?")
+                valores.append(stock_minimo)
             
             if not campos_actualizar:
-                print("No se especificaron campos para actualizar")
+                logger.info("No se especificaron campos para actualizar", extra={'producto_id': id_producto})
                 return False
             
             valores.append(id_producto)
             query = f"UPDATE productos SET {', '.join(campos_actualizar)} WHERE id = ?"
+            if version_esperada is not None:
+                query += " AND version = ?"
+                valores.append(version_esperada)
+            
+            # El estado anterior se lee si hay suscriptores o si el cambio
+            # puede cruzar el stock mínimo. Se lee en la misma transacción
+            # que el UPDATE: dos actualizaciones simultáneas no pueden ver la
+            # misma fila "anterior" y alertar dos veces (o ninguna)
+            vigilar_stock = cantidad is not None or stock_minimo is not None
+            leer_eventos = bus.activo or vigilar_stock
+            # Una categoría nueva se crea en la misma transacción: si el
+            # UPDATE no encuentra la fila, tampoco queda la categoría
+            nuevas: Dict[str, Tuple[int, str]] = {}
+            def actualizar(conn):
+                params = list(valores)
+                if categoria is not None:
+                    nuevas.clear()
+                    categoria_id, params[posicion_categoria] = self._resolver_categoria(categoria, conn, nuevas)
+                    params[posicion_categoria + 1] = categoria_id
+                anterior = self._fila_evento(id_producto, conn) if leer_eventos else None
+                if conn.execute(query, tuple(params)).rowcount == 0:
+                    conn.rollback()
+                    return None
+                evento = self._fila_evento(id_producto, conn) if leer_eventos else None
+                return anterior, evento, params[posicion_categoria] if categoria is not None else None
             
-            self.db.execute_query(query, tuple(valores))
-            print(f"Producto con ID {id_producto} actualizado exitosamente.")
+            resultado = self.db.transaccion(actualizar, query)
+            if resultado is None:
+                logger.info("No se encontró producto con ID %s en la versión esperada", id_producto)
+                return False
+            anterior, evento, categoria = resultado
+            self._categorias.update(nuevas)
+            if nombre is not None or categoria is not None:
+                self._indexar(self.sugerencias.actualizar, id_producto, nombre, categoria)
+            
+            cruce = self._cruce_stock(anterior, cantidad, stock_minimo) if anterior else None
+            if bus.activo or cruce:
+                if evento:
+                    evento['cantidad_anterior'] = anterior['cantidad'] if anterior else None
+                self._publicar('cambio', evento)
+                if cruce:
+                    self._alertar_stock(cruce, evento)
+            logger.info("Producto actualizado", extra={'evento': 'producto_actualizado', 'producto_id': id_producto})
             return True
             
         except Exception as e:
-            print(f"Error al actualizar producto: {e}")
+            logger.exception("Error al actualizar producto")
             return False
     
-    def eliminar_producto(self, id_producto: int) -> bool:
+    @instrumentacion.medir
+    @escritura
+    def eliminar_producto(self, id_producto: int, version_esperada: int = None) -> bool:
         """
         Elimina un producto del inventario.
         
         Args:
             id_producto: ID del producto a eliminar
+            version_esperada: Si se indica, solo elimina si la fila sigue en
+                esa versión
             
         Returns:
-            True si se eliminó exitosamente, False en caso contrario
+            True si se eliminó exitosamente, False si no existe o cambió de versión
         """
         try:
-            # Verificar si el producto existe
-            producto_existente = self.buscar_producto_por_id(id_producto)
-            if not producto_existente:
-                print(f"No se encontró producto con ID {id_producto}")
-                return False
-            
             query = "DELETE FROM productos WHERE id = ?"
-            self.db.execute_query(query, (id_producto,))
-            print(f"Producto con ID {id_producto} eliminado exitosamente.")
+            params = (id_producto,)
+            if version_esperada is not None:
+                query += " AND version = ?"
+                params += (version_esperada,)
+            
+            anterior = self._fila_evento(id_producto) if bus.activo else None
+            if self.db.ejecutar_escritura(query, params).rowcount == 0:
+                logger.info("No se encontró producto con ID %s en la versión esperada", id_producto)
+                return False
+            self._indexar(self.sugerencias.quitar, id_producto)
+            if anterior:
+                lapida = self.db.execute_query("SELECT version FROM productos_eliminados WHERE id = ?", (id_producto,))
+                self._publicar('baja', {
+                    'id': id_producto,
+                    'nombre': anterior['nombre'],
+                    'categoria': anterior['categoria'],
+                    'cantidad_anterior': anterior['cantidad'],
+                    'version': lapida[0][0] if lapida else None
+                })
+            logger.info("Producto eliminado", extra={'evento': 'producto_eliminado', 'producto_id': id_producto})
             return True
             
         except Exception as e:
-            print(f"Error al eliminar producto: {e}")
+            logger.exception("Error al eliminar producto")
             return False
     
-    def generar_reporte_stock_bajo(self, limite_stock: int) -> List[Producto]:
+    @instrumentacion.medir
+    @lectura
+    def generar_reporte_stock_bajo(self, limite_stock: Optional[int] = None, como_filas: bool = False,
+                                   columnas: Optional[Sequence[str]] = None) -> List[Producto]:
         """
         Genera un reporte de productos con stock bajo.
         
+        Sin límite, cada producto se compara con su propio stock mínimo y la
+        consulta recorre solo el índice parcial idx_productos_reposicion,
+        que contiene únicamente los productos a reponer.
+        
         Args:
-            limite_stock: Límite de stock para considerar como "bajo"
+            limite_stock: Límite de stock para considerar como "bajo" (None
+                para usar el stock mínimo de cada producto)
+            como_filas: Si es True, devuelve tuplas en el orden de COLUMNAS
+            columnas: Columnas a leer (ver seleccionar_columnas); implica
+                como_filas y las tuplas siguen el orden pedido
             
         Returns:
-            Lista de productos con stock igual o inferior al límite
+            Lista de productos con stock igual o inferior al límite (sin
+            límite, ordenada de menor a mayor stock)
         """
+        seleccion = seleccionar_columnas(columnas)
         try:
-            query = "SELECT id, nombre, descripcion, cantidad, precio, categoria FROM productos WHERE cantidad <= ?"
-            resultado = self.db.execute_query(query, (limite_stock,))
+            if limite_stock is None:
+                query = (f"SELECT {', '.join(expresiones_columnas(seleccion))} FROM productos "
+                         "WHERE cantidad <= stock_minimo ORDER BY cantidad")
+                resultado = self.db.execute_query(query)
+            else:
+                query = f"SELECT {', '.join(expresiones_columnas(seleccion))} FROM productos WHERE cantidad <= ?"
+                resultado = self.db.execute_query(query, (limite_stock,))
+            if como_filas or columnas is not None:
+                return resultado or []
             
             productos_stock_bajo = []
             if resultado:
                 for fila in resultado:
-                    producto = Producto(
-                        id=fila[0],
-                        nombre=fila[1],
-                        descripcion=fila[2],
-                        cantidad=fila[3],
-                        precio=fila[4],
-                        categoria=fila[5]
-                    )
-                    productos_stock_bajo.append(producto)
+                    productos_stock_bajo.append(_producto_desde_fila(fila))
             
             return productos_stock_bajo
             
         except Exception as e:
-            print(f"Error al generar reporte de stock bajo: {e}")
-            return [] 
\ No newline at end of file
+            logger.exception("Error al generar reporte de stock bajo")
+            return []
+    
+    @instrumentacion.medir
+    @lectura
+    def contar_productos_a_reponer(self) -> int:
+        """
+        Cuenta los productos con stock igual o inferior a su stock mínimo
+        leyendo solo el índice parcial (sin tocar la tabla).
+        
+        Returns:
+            Cantidad de productos a reponer
+        """
+        try:
+            resultado = self.db.execute_query("SELECT COUNT(*) FROM productos WHERE cantidad <= stock_minimo")
+            return resultado[0][0] if resultado else 0
+            
+        except Exception as e:
+            logger.exception("Error al contar productos a reponer")
+            return 0
+    
+    @instrumentacion.medir
+    @lectura
+    def obtener_version_producto(self, id_producto: int) -> Optional[Tuple[int, int]]:
+        """
+        Obtiene la versión de un producto sin leer sus datos.
+        
+        Args:
+            id_producto: ID del producto
+            
+        Returns:
+            Tupla (versión, actualizado_en en segundos Unix), o None si no existe
+        """
+        try:
+            resultado = self.db.execute_query(
+                "SELECT version, actualizado_en FROM productos WHERE id = ?", (id_producto,))
+            return resultado[0] if resultado else None
+            
+        except Exception as e:
+            logger.exception("Error al obtener versión del producto")
+            return None
+    
+    @instrumentacion.medir
+    @lectura
+    def obtener_version_inventario(self) -> Tuple[int, int]:
+        """
+        Obtiene el contador de cambios de la tabla productos, que aumenta con
+        cada alta, modificación o baja.
+        
+        Returns:
+            Tupla (contador, actualizado_en en segundos Unix)
+        """
+        try:
+            resultado = self.db.execute_query(
+                "SELECT valor, actualizado_en FROM contadores WHERE nombre = 'productos'")
+            return resultado[0] if resultado else (0, 0)
+            
+        except Exception as e:
+            logger.exception("Error al obtener versión del inventario")
+            return (0, 0)
+    
+    @instrumentacion.medir
+    @lectura
+    def obtener_cambios(self, desde: int = 0, limite: int = 1000,
+                        columnas: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """
+        Obtiene los productos creados, modificados o eliminados después de la
+        versión 'desde', en orden de versión y de a 'limite' cambios.
+        
+        Las filas y las lápidas se leen en una sola consulta (UNION ALL sobre
+        los índices de versión), así cada página sale de una misma foto de la
+        base y no se saltea ningún cambio entre páginas.
+        
+        Args:
+            desde: Última versión que el cliente ya tiene (0 para todo)
+            limite: Cantidad máxima de cambios a devolver
+            columnas: Columnas de los productos modificados (ver seleccionar_columnas)
+            
+        Returns:
+            Diccionario con 'productos' (tuplas con las columnas pedidas más
+            la versión al final), 'eliminados' (tuplas (id, versión)),
+            'hasta' (versión a usar como próximo 'desde') y 'hay_mas'
+        """
+        seleccion = seleccionar_columnas(columnas)
+        datos = ", ".join(expresiones_columnas(seleccion))
+        nulos = ", ".join("NULL" for _ in seleccion)
+        cambios = {'productos': [], 'eliminados': [], 'hasta': desde, 'hay_mas': False}
+        try:
+            query = f'''
+                SELECT 0, id, version, {datos} FROM productos WHERE version > ?
+                UNION ALL
+                SELECT 1, id, version, {nulos} FROM productos_eliminados WHERE version > ?
+                ORDER BY 3
+                LIMIT ?
+            '''
+            resultado = self.db.execute_query(query, (desde, desde, limite + 1)) or []
+            cambios['hay_mas'] = len(resultado) > limite
+            for eliminado, id_producto, version, *fila in resultado[:limite]:
+                if eliminado:
+                    cambios['eliminados'].append((id_producto, version))
+                else:
+                    cambios['productos'].append((*fila, version))
+                cambios['hasta'] = version
+            return cambios
+            
+        except Exception as e:
+            logger.exception("Error al obtener cambios")
+            return cambios
+    
+    @instrumentacion.medir
+    @lectura
+    def obtener_resumen_inventario(self) -> Dict[str, Any]:
+        """
+        Calcula las métricas generales del inventario directamente en SQL.
+        
+        Returns:
+            Diccionario con total de productos, stock total, valor del
+            inventario en centavos (suma entera, exacta) y cantidad de
+            productos sin stock
+        """
+        resumen = {
+            'total_productos': 0,
+            'stock_total': 0,
+            'valor_inventario_centavos': 0,
+            'productos_sin_stock': 0
+        }
+        try:
+            query = '''
+                SELECT COUNT(*),
+                       COALESCE(SUM(cantidad), 0),
+                       COALESCE(SUM(cantidad * precio_centavos), 0),
+                       COALESCE(SUM(CASE WHEN cantidad = 0 THEN 1 ELSE 0 END), 0)
+                FROM productos
+            '''
+            resultado = self.db.execute_query(query)
+            
+            if resultado:
+                fila = resultado[0]
+                resumen['total_productos'] = fila[0]
+                resumen['stock_total'] = fila[1]
+                resumen['valor_inventario_centavos'] = fila[2]
+                resumen['productos_sin_stock'] = fila[3]
+            
+            return resumen
+            
+        except Exception as e:
+            logger.exception("Error al obtener resumen del inventario")
+            return resumen
+    
+    @instrumentacion.medir
+    @lectura
+    def obtener_facetas_categorias(self) -> List[tuple]:
+        """
+        Cuenta los productos de cada categoría agrupando sobre
+        idx_productos_categoria_id, sin leer la tabla productos.
+        
+        Returns:
+            Lista de tuplas (id de categoría, nombre, cantidad de productos)
+            ordenada de mayor a menor; los productos sin categoría van con
+            id None y nombre 'Sin categoría'
+        """
+        try:
+            query = '''
+                SELECT p.categoria_id, COALESCE(c.nombre, 'Sin categoría'), p.total
+                FROM (SELECT categoria_id, COUNT(*) AS total FROM productos GROUP BY categoria_id) AS p
+                LEFT JOIN categorias AS c ON c.id = p.categoria_id
+                ORDER BY p.total DESC, c.nombre
+            '''
+            resultado = self.db.execute_query(query)
+            return [tuple(fila) for fila in resultado] if resultado else []
+            
+        except Exception as e:
+            logger.exception("Error al obtener facetas de categorías")
+            return []
+    
+    def contar_productos_por_categoria(self) -> List[tuple]:
+        """
+        Cuenta los productos de cada categoría (ver obtener_facetas_categorias).
+        
+        Returns:
+            Lista de tuplas (categoría, cantidad de productos) ordenada de
+            mayor a menor
+        """
+        return [(nombre, total) for _, nombre, total in self.obtener_facetas_categorias()]
+    
+    @instrumentacion.medir
+    @lectura
+    def valorizar_por_categoria(self) -> List[tuple]:
+        """
+        Calcula en SQL los productos, el stock y el valor de cada categoría.
+        
+        Returns:
+            Lista de tuplas (categoría, productos, stock, valor en centavos)
+            ordenada por valor descendente
+        """
+        try:
+            query = '''
+                SELECT COALESCE(NULLIF(categoria, ''), 'Sin categoría') AS cat,
+                       COUNT(*), COALESCE(SUM(cantidad), 0), COALESCE(SUM(cantidad * precio_centavos), 0) AS valor
+                FROM productos
+                GROUP BY cat
+                ORDER BY valor DESC
+            '''
+            resultado = self.db.execute_query(query)
+            return [tuple(fila) for fila in resultado] if resultado else []
+            
+        except Exception as e:
+            logger.exception("Error al valorizar el inventario por categoría")
+            return []
+    
+    @instrumentacion.medir
+    @lectura
+    def consultar_productos(self, filtros: Optional[Dict[str, Any]] = None, orden: str = "id",
+                            limite: int = LIMITE_POR_DEFECTO, cursor: Optional[str] = None,
+                            columnas: Optional[Sequence[str]] = None) -> Tuple[List[tuple], Optional[str]]:
+        """
+        Busca productos combinando filtros y orden en una sola consulta,
+        paginada por clave (ver consultas.ConsultaProductos).
+        
+        Args:
+            filtros: Filtros por nombre (ver consultas.FILTROS), por ejemplo
+                {'categoria': 'Audio', 'precio_max': 100, 'cantidad_max': 5}
+            orden: Claves de orden separadas por comas, con '-' para
+                descendente (ej. '-valor')
+            limite: Productos por página
+            cursor: Cursor devuelto con la página anterior
+            columnas: Columnas a leer (ver seleccionar_columnas)
+            
+        Returns:
+            Tupla (filas en el orden de 'columnas', cursor de la página
+            siguiente o None si es la última)
+            
+        Raises:
+            ValueError: Si los filtros, el orden o el cursor no son válidos,
+                o si la combinación no tiene índice y el inventario supera
+                FILAS_SIN_INDICE productos
+        """
+        seleccion = seleccionar_columnas(columnas)
+        consulta = ConsultaProductos(filtros, orden, limite, cursor)
+        if not consulta.indexada:
+            # MAX(id) sale del final de la clave primaria, sin contar filas
+            filas = (self.db.execute_query("SELECT MAX(id) FROM productos") or [(None,)])[0][0] or 0
+            if filas > FILAS_SIN_INDICE:
+                raise ValueError(
+                    f"La combinación no usa ningún índice y el inventario tiene más de {FILAS_SIN_INDICE} "
+                    "productos: agregue un filtro por categoría, precio, cantidad, valor o a_reponer, "
+                    "u ordene por id, precio, cantidad o valor")
+        
+        categoria_id = None
+        if 'categoria' in consulta.filtros:
+            clave = normalizar(consulta.filtros['categoria'])
+            encontrada = self.db.execute_query("SELECT id FROM categorias WHERE clave = ?", (clave,)) if clave else None
+            if not encontrada:
+                return [], None
+            categoria_id = encontrada[0][0]
+        
+        resultado = []
+        if consulta.recorrer_orden:
+            query, params = consulta.compilar(expresiones_columnas(seleccion), categoria_id,
+                                              recorrido=(consulta.limite + 1) * RECORRIDO_POR_FILA)
+            resultado = self.db.execute_query(query, params) or []
+        if len(resultado) <= consulta.limite:
+            query, params = consulta.compilar(expresiones_columnas(seleccion), categoria_id)
+            resultado = self.db.execute_query(query, params) or []
+        siguiente = None
+        if len(resultado) > consulta.limite:
+            resultado = resultado[:consulta.limite]
+            siguiente = consulta.cursor(resultado[-1][len(seleccion):])
+        return [fila[:len(seleccion)] for fila in resultado], siguiente
+    
+    @instrumentacion.medir
+    @lectura
+    def obtener_top_productos_por_valor(self, limite: int = 10, como_filas: bool = False,
+                                        columnas: Optional[Sequence[str]] = None) -> List[Producto]:
+        """
+        Obtiene los productos con mayor valor en stock (cantidad * precio_centavos).
+        
+        Args:
+            limite: Cantidad máxima de productos a devolver
+            como_filas: Si es True, devuelve tuplas en el orden de COLUMNAS
+            columnas: Columnas a leer (ver seleccionar_columnas); implica
+                como_filas y las tuplas siguen el orden pedido
+            
+        Returns:
+            Lista de productos ordenada por valor descendente
+        """
+        seleccion = seleccionar_columnas(columnas)
+        try:
+            # La expresión del ORDER BY coincide con idx_productos_valor
+            query = f'''
+                SELECT {', '.join(expresiones_columnas(seleccion))}
+                FROM productos
+                ORDER BY cantidad * precio_centavos DESC
+                LIMIT ?
+            '''
+            resultado = self.db.execute_query(query, (limite,))
+            if como_filas or columnas is not None:
+                return resultado or []
+            
+            productos = []
+            if resultado:
+                for fila in resultado:
+                    productos.append(_producto_desde_fila(fila))
+            
+            return productos
+            
+        except Exception as e:
+            logger.exception("Error al obtener top de productos")
+            return []
+    
+    @instrumentacion.medir
+    @lectura
+    def agrupar_stock_bajo_por_cantidad(self, limite_stock: int, max_grupos: int = 20) -> List[Dict[str, Any]]:
+        """
+        Agrupa en SQL los productos con stock bajo en rangos de cantidad.
+        
+        Se usa para graficar el reporte de stock bajo cuando hay demasiados
+        productos para mostrar una barra por producto.
+        
+        Args:
+            limite_stock: Límite de stock para considerar como "bajo"
+            max_grupos: Cantidad máxima de rangos a generar
+            
+        Returns:
+            Lista de diccionarios con 'desde', 'hasta', 'productos' y
+            'valor_centavos'
+        """
+        try:
+            ancho = max(1, -(-(limite_stock + 1) // max_grupos))
+            query = '''
+                SELECT cantidad / ? AS grupo, COUNT(*), COALESCE(SUM(cantidad * precio_centavos), 0)
+                FROM productos
+                WHERE cantidad <= ?
+                GROUP BY grupo
+                ORDER BY grupo
+            '''
+            resultado = self.db.execute_query(query, (ancho, limite_stock))
+            
+            grupos = []
+            if resultado:
+                for fila in resultado:
+                    desde = fila[0] * ancho
+                    grupos.append({
+                        'desde': desde,
+                        'hasta': min(desde + ancho - 1, limite_stock),
+                        'productos': fila[1],
+                        'valor_centavos': fila[2]
+                    })
+            
+            return grupos
+            
+        except Exception as e:
+            logger.exception("Error al agrupar reporte de stock bajo")
+            return []
+    
+    def exportar_productos(self, lote: int = 5000,
+                           columnas: Optional[Sequence[str]] = None) -> Iterator[List[tuple]]:
+        """
+        Recorre todo el inventario en lotes ordenados por id, sin cargarlo
+        entero en memoria.
+        
+        Es un generador que pagina por id a medida que se consume, por eso
+        no lleva los decoradores de medición y acceso: cada lote es un
+        SELECT independiente que va al pool de lectura.
+        
+        Args:
+            lote: Cantidad de filas por lote
+            columnas: Columnas a exportar (ver seleccionar_columnas)
+            
+        Yields:
+            Listas de tuplas en el orden de las columnas pedidas
+        """
+        seleccion = seleccionar_columnas(columnas)
+        # El id se lee siempre porque es la clave de la paginación
+        agregar_id = "id" not in seleccion
+        lectura_id = ("id",) + seleccion if agregar_id else seleccion
+        posicion_id = lectura_id.index("id")
+        query = f"SELECT {', '.join(expresiones_columnas(lectura_id))} FROM productos WHERE id > ? ORDER BY id LIMIT ?"
+        ultimo_id = 0
+        while True:
+            filas = self.db.execute_query(query, (ultimo_id, lote))
+            if not filas:
+                return
+            ultimo_id = filas[-1][posicion_id]
+            yield [fila[1:] for fila in filas] if agregar_id else filas
+    
+    def _fila_evento(self, id_producto: int, conn: Optional[sqlite3.Connection] = None) -> Optional[Dict[str, Any]]:
+        """
+        Lee los datos de un producto para un evento de stock, con el precio
+        en pesos (None si no existe). Con 'conn' la lectura es parte de esa
+        transacción de escritura.
+        """
+        query = f"SELECT {', '.join(expresiones_columnas(COLUMNAS_EVENTO))} FROM productos WHERE id = ?"
+        resultado = (self.db.execute_query(query, (id_producto,)) if conn is None
+                     else conn.execute(query, (id_producto,)).fetchall())
+        return dict(zip(COLUMNAS_EVENTO, filas_en_pesos(resultado, COLUMNAS_EVENTO)[0])) if resultado else None
+    
+    @staticmethod
+    def _cruce_stock(anterior: Dict[str, Any], cantidad: Optional[int],
+                     stock_minimo: Optional[int]) -> Optional[str]:
+        """
+        Indica si una actualización hace cruzar el stock mínimo.
+        
+        Args:
+            anterior: Fila del producto antes de actualizar (ver _fila_evento)
+            cantidad: Nueva cantidad (None si no cambia)
+            stock_minimo: Nuevo stock mínimo (None si no cambia)
+            
+        Returns:
+            'stock_bajo' si el producto pasa a necesitar reposición,
+            'stock_repuesto' si deja de necesitarla, None si no cruza
+        """
+        antes = anterior['cantidad'] <= anterior['stock_minimo']
+        despues = ((anterior['cantidad'] if cantidad is None else cantidad)
+                   <= (anterior['stock_minimo'] if stock_minimo is None else stock_minimo))
+        if antes == despues:
+            return None
+        return 'stock_bajo' if despues else 'stock_repuesto'
+    
+    def _alertar_stock(self, tipo: str, datos: Optional[Dict[str, Any]]) -> None:
+        """Registra y publica el cruce del stock mínimo de un producto ('stock_bajo' o 'stock_repuesto')."""
+        if not datos:
+            return
+        alertas_stock.inc(tipo)
+        if tipo == 'stock_bajo':
+            logger.warning("Producto con stock igual o inferior a su mínimo",
+                           extra={'evento': tipo, 'producto_id': datos['id'],
+                                  'cantidad': datos['cantidad'], 'stock_minimo': datos['stock_minimo']})
+        else:
+            logger.info("Producto repuesto por encima de su mínimo",
+                        extra={'evento': tipo, 'producto_id': datos['id'], 'cantidad': datos['cantidad']})
+        self._publicar(tipo, datos)
+    
+    def _alertar_carga(self, ultimo_id: int, registrados: int) -> None:
+        """
+        Alerta por los productos de una carga masiva registrados en o por
+        debajo de su stock mínimo: la métrica y el log se registran una vez
+        por carga y cada producto se publica como un evento 'stock_bajo'.
+        
+        Args:
+            ultimo_id: Último id asignado antes de la carga
+            registrados: Productos registrados por la carga
+        """
+        filas = self.db.execute_query(
+            f"SELECT {', '.join(expresiones_columnas(COLUMNAS_EVENTO))} FROM productos "
+            "WHERE id > ? AND id <= ? AND cantidad <= stock_minimo", (ultimo_id, ultimo_id + registrados)) or []
+        if not filas:
+            return
+        alertas_stock.inc('stock_bajo', cantidad=len(filas))
+        logger.warning("Carga masiva con productos con stock igual o inferior a su mínimo",
+                       extra={'evento': 'stock_bajo', 'cantidad': len(filas)})
+        if bus.activo:
+            for fila in filas_en_pesos(filas, COLUMNAS_EVENTO):
+                self._publicar('stock_bajo', dict(zip(COLUMNAS_EVENTO, fila)))
+    
+    def _resolver_categoria(self, categoria: Optional[str], conn: sqlite3.Connection,
+                            nuevas: Dict[str, Tuple[int, str]]) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Obtiene el id y el nombre canónico de una categoría, creándola si no
+        existe. Dos textos con la misma forma normalizada (ver
+        busqueda.normalizar) son la misma categoría.
+        
+        La categoría se crea en la transacción de la fila que la referencia,
+        así se confirman o se revierten juntas.
+        
+        Args:
+            categoria: Texto de la categoría
+            conn: Conexión de escritura de la transacción en curso
+            nuevas: Categorías creadas en esa transacción, aún sin
+                confirmar; pasan a la caché solo si la transacción se confirma
+            
+        Returns:
+            Tupla (id, nombre canónico); (None, categoria) si el texto no
+            tiene letras ni números
+        """
+        clave = normalizar(categoria or "")
+        if not clave:
+            return None, categoria
+        conocida = self._categorias.get(clave) or nuevas.get(clave)
+        if conocida:
+            return conocida
+        
+        conn.execute("INSERT OR IGNORE INTO categorias (clave, nombre) VALUES (?, ?)",
+                     (clave, " ".join(categoria.split())))
+        fila = conn.execute("SELECT id, nombre FROM categorias WHERE clave = ?", (clave,)).fetchone()
+        nuevas[clave] = (fila[0], fila[1])
+        return fila[0], fila[1]
+    
+    def _indexar(self, operacion, *args) -> None:
+        """Aplica una escritura a un índice en memoria; un error nunca hace fallar la escritura."""
+        try:
+            operacion(*args)
+        except Exception as e:
+            logger.exception("Error al actualizar índice en memoria")
+    
+    def _publicar(self, tipo: str, datos: Optional[Dict[str, Any]]) -> None:
+        """Publica un evento de stock; un error al notificar nunca hace fallar la escritura."""
+        if not datos:
+            return
+        try:
+            bus.publicar(tipo, datos)
+        except Exception as e:
+            logger.exception("Error al publicar evento de stock")
+    
+    @instrumentacion.medir
+    @lectura
+    def calentar(self) -> None:
+        """
+        Precarga conexión, tabla e índices para que las primeras
+        operaciones no paguen el arranque en frío.
+        """
+        try:
+            self.db.calentar()
+            logger.debug("Inventario precargado", extra={'evento': 'inventario_calentado'})
+        except Exception as e:
+            logger.exception("Error al precargar el inventario")
+    
+    def cerrar(self) -> None:
+        """
+        Cierra las conexiones a la base de datos.
+        """
+        self.db.close()
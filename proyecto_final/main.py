@@ -27,7 +27,9 @@ except ImportError:
     Fore = Back = MockColor()
     Style = MockStyle()
 
+from bitacora import configurar_bitacora
 from inventario import InventarioManager, Producto
+from moneda import formatear_monto
 
 class InterfazConsola:
     """
@@ -105,6 +107,16 @@ class InterfazConsola:
                 except ValueError:
                     print(f"{Fore.RED}Error: Ingrese un número válido para la cantidad.{Style.RESET_ALL}")
             
+            while True:
+                try:
+                    stock_minimo = int(input(f"{Fore.WHITE}Stock mínimo [0]: {Style.RESET_ALL}") or 0)
+                    if stock_minimo < 0:
+                        print(f"{Fore.RED}Error: El stock mínimo no puede ser negativo.{Style.RESET_ALL}")
+                        continue
+                    break
+                except ValueError:
+                    print(f"{Fore.RED}Error: Ingrese un número válido para el stock mínimo.{Style.RESET_ALL}")
+            
             while True:
                 try:
                     precio = float(input(f"{Fore.WHITE}Precio: ${Style.RESET_ALL}"))
@@ -118,9 +130,13 @@ class InterfazConsola:
             categoria = input(f"{Fore.WHITE}Categoría: {Style.RESET_ALL}").strip()
             
             # Crear y registrar el producto
-            producto = Producto(nombre, descripcion, cantidad, precio, categoria)
+            producto = Producto(nombre, descripcion, cantidad, precio, categoria, stock_minimo=stock_minimo)
             if self.inventario.registrar_producto(producto):
                 print(f"{Fore.GREEN}¡Producto registrado exitosamente!{Style.RESET_ALL}")
+                if cantidad <= stock_minimo:
+                    print(f"{Fore.YELLOW}Atención: el producto ya está en su stock mínimo o por debajo.{Style.RESET_ALL}")
+            else:
+                print(f"{Fore.RED}Error: No se pudo registrar el producto.{Style.RESET_ALL}")
             
         except KeyboardInterrupt:
             print(f"\n{Fore.YELLOW}Operación cancelada.{Style.RESET_ALL}")
@@ -204,6 +220,17 @@ class InterfazConsola:
         if productos:
             print(f"\n{Fore.GREEN}Se encontraron {len(productos)} producto(s):{Style.RESET_ALL}")
             self._mostrar_lista_productos(productos)
+            return
+        
+        # Sin coincidencias exactas, se sugieren los nombres más parecidos
+        # (errores de tipeo, acentos): "samsumg" -> "Samsung"
+        try:
+            similares, _ = self.inventario.buscar_productos_similares(nombre, limite=5)
+        except ValueError:
+            similares = []
+        if similares:
+            print(f"\n{Fore.YELLOW}No se encontraron productos con nombre '{nombre}'. ¿Quiso decir...?{Style.RESET_ALL}")
+            self._mostrar_lista_productos([producto for producto, _ in similares])
         else:
             print(f"{Fore.RED}No se encontraron productos con nombre '{nombre}'.{Style.RESET_ALL}")
     
@@ -230,6 +257,7 @@ class InterfazConsola:
         print(f"{Fore.WHITE}Nombre:      {Fore.YELLOW}{producto.nombre}")
         print(f"{Fore.WHITE}Descripción: {Fore.WHITE}{producto.descripcion}")
         print(f"{Fore.WHITE}Cantidad:    {Fore.MAGENTA}{producto.cantidad}")
+        print(f"{Fore.WHITE}Stock mín.:  {Fore.MAGENTA}{producto.stock_minimo}")
         print(f"{Fore.WHITE}Precio:      {Fore.GREEN}${producto.precio:.2f}")
         print(f"{Fore.WHITE}Categoría:   {Fore.BLUE}{producto.categoria}{Style.RESET_ALL}")
     
@@ -299,9 +327,27 @@ class InterfazConsola:
             categoria = input(f"Nueva categoría [{producto_existente.categoria}]: ").strip()
             categoria = categoria if categoria else None
             
+            minimo_str = input(f"Nuevo stock mínimo [{producto_existente.stock_minimo}]: ").strip()
+            stock_minimo = None
+            if minimo_str:
+                try:
+                    stock_minimo = int(minimo_str)
+                    if stock_minimo < 0:
+                        print(f"{Fore.RED}Error: El stock mínimo no puede ser negativo.{Style.RESET_ALL}")
+                        return
+                except ValueError:
+                    print(f"{Fore.RED}Error: Ingrese un número válido para el stock mínimo.{Style.RESET_ALL}")
+                    return
+            
             # Actualizar producto
-            if self.inventario.actualizar_producto(id_producto, nombre, descripcion, cantidad, precio, categoria):
+            if all(valor is None for valor in (nombre, descripcion, cantidad, precio, categoria, stock_minimo)):
+                print(f"{Fore.YELLOW}No se ingresaron cambios.{Style.RESET_ALL}")
+            elif self.inventario.actualizar_producto(id_producto, nombre, descripcion, cantidad, precio, categoria,
+                                                     stock_minimo=stock_minimo):
                 print(f"{Fore.GREEN}¡Producto actualizado exitosamente!{Style.RESET_ALL}")
+            else:
+                print(f"{Fore.RED}Error: No se pudo actualizar el producto con ID {id_producto} "
+                      f"(puede haber sido eliminado).{Style.RESET_ALL}")
             
         except ValueError:
             print(f"{Fore.RED}Error: Ingrese un ID válido.{Style.RESET_ALL}")
@@ -332,6 +378,9 @@ class InterfazConsola:
             if confirmacion.lower() in ['s', 'si', 'sí']:
                 if self.inventario.eliminar_producto(id_producto):
                     print(f"{Fore.GREEN}¡Producto eliminado exitosamente!{Style.RESET_ALL}")
+                else:
+                    print(f"{Fore.RED}Error: No se pudo eliminar el producto con ID {id_producto} "
+                          f"(puede haber sido eliminado).{Style.RESET_ALL}")
             else:
                 print(f"{Fore.YELLOW}Eliminación cancelada.{Style.RESET_ALL}")
             
@@ -346,44 +395,47 @@ class InterfazConsola:
         print("-" * 40)
         
         try:
-            limite = int(input(f"{Fore.WHITE}Ingrese el límite de stock: {Style.RESET_ALL}"))
+            limite_str = input(f"{Fore.WHITE}Ingrese el límite de stock "
+                               f"(Enter para usar el mínimo de cada producto): {Style.RESET_ALL}").strip()
+            limite = int(limite_str) if limite_str else None
             
-            if limite < 0:
+            if limite is not None and limite < 0:
                 print(f"{Fore.RED}Error: El límite no puede ser negativo.{Style.RESET_ALL}")
                 return
             
             productos_stock_bajo = self.inventario.generar_reporte_stock_bajo(limite)
+            criterio = "SU STOCK MÍNIMO" if limite is None else str(limite)
             
             if productos_stock_bajo:
-                print(f"\n{Fore.RED}{Style.BRIGHT}PRODUCTOS CON STOCK IGUAL O INFERIOR A {limite}:{Style.RESET_ALL}")
+                print(f"\n{Fore.RED}{Style.BRIGHT}PRODUCTOS CON STOCK IGUAL O INFERIOR A {criterio}:{Style.RESET_ALL}")
                 print(f"{Fore.WHITE}{Style.BRIGHT}")
-                print(f"{'ID':<5} {'NOMBRE':<20} {'CANTIDAD':<10} {'PRECIO':<10} {'CATEGORÍA':<15}")
-                print("-" * 65)
+                print(f"{'ID':<5} {'NOMBRE':<20} {'CANTIDAD':<10} {'MÍNIMO':<8} {'PRECIO':<10} {'CATEGORÍA':<15}")
+                print("-" * 74)
                 print(f"{Style.RESET_ALL}")
                 
-                total_valor = 0
+                total_centavos = 0
                 for producto in productos_stock_bajo:
-                    valor_stock = producto.cantidad * producto.precio
-                    total_valor += valor_stock
+                    total_centavos += producto.valor_centavos
                     
                     # Colorear según nivel crítico
                     if producto.cantidad == 0:
                         color_cantidad = Fore.RED + Style.BRIGHT
-                    elif producto.cantidad <= limite // 2:
+                    elif producto.cantidad <= (producto.stock_minimo if limite is None else limite) // 2:
                         color_cantidad = Fore.RED
                     else:
                         color_cantidad = Fore.YELLOW
                     
                     print(f"{Fore.CYAN}{producto.id:<5} {Fore.WHITE}{producto.nombre:<20} "
-                          f"{color_cantidad}{producto.cantidad:<10} {Fore.GREEN}${producto.precio:<9.2f} "
-                          f"{Fore.MAGENTA}{producto.categoria:<15}{Style.RESET_ALL}")
+                          f"{color_cantidad}{producto.cantidad:<10} {Fore.WHITE}{producto.stock_minimo:<8} "
+                          f"{Fore.GREEN}${producto.precio:<9.2f} {Fore.MAGENTA}{producto.categoria:<15}{Style.RESET_ALL}")
                 
                 print(f"\n{Fore.WHITE}Resumen del reporte:")
                 print(f"- Productos con stock bajo: {Fore.RED}{len(productos_stock_bajo)}")
-                print(f"{Fore.WHITE}- Valor total del stock bajo: {Fore.GREEN}${total_valor:.2f}{Style.RESET_ALL}")
+                print(f"{Fore.WHITE}- Valor total del stock bajo: {Fore.GREEN}{formatear_monto(total_centavos)}{Style.RESET_ALL}")
                 
             else:
-                print(f"{Fore.GREEN}¡Excelente! No hay productos con stock igual o inferior a {limite}.{Style.RESET_ALL}")
+                print(f"{Fore.GREEN}¡Excelente! No hay productos con stock igual o inferior a "
+                      f"{criterio.lower()}.{Style.RESET_ALL}")
                 
         except ValueError:
             print(f"{Fore.RED}Error: Ingrese un número válido.{Style.RESET_ALL}")
@@ -439,6 +491,9 @@ def main():
     if not COLORAMA_DISPONIBLE:
         print("Nota: Para una mejor experiencia visual, instale colorama: pip install colorama")
     
+    # Mostrar solo advertencias y errores de la librería en la consola
+    configurar_bitacora(nivel="WARNING", formato="texto")
+    
     try:
         interfaz = InterfazConsola()
         interfaz.ejecutar()
@@ -0,0 +1,370 @@
+"""
+Métricas operativas en formato de texto de Prometheus.
+
+Cada métrica guarda sus valores en fragmentos por hilo: el hilo que
+incrementa solo escribe en su propio diccionario, sin tomar ningún lock, y
+la exposición suma los fragmentos al momento del scrape.
+"""
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from instrumentacion import tiempo_db_actual
+
+# Buckets por defecto (en segundos) para las latencias
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escapar(valor: str) -> str:
+    """Escapa un valor de etiqueta según el formato de texto de Prometheus."""
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatear_etiquetas(nombres: Sequence[str], valores: Sequence[str], extra: str = "") -> str:
+    """Construye el bloque {etiqueta="valor",...} de una serie."""
+    partes = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _formatear_numero(valor: float) -> str:
+    """Formatea un valor numérico para la exposición."""
+    if isinstance(valor, int) or float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+class _Fragmentos:
+    """
+    Diccionarios por hilo que se combinan únicamente al leerlos.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._todos: List[dict] = []
+        self._lock = threading.Lock()
+
+    def propio(self) -> dict:
+        """Obtiene el diccionario del hilo actual, creándolo la primera vez."""
+        try:
+            return self._local.datos
+        except AttributeError:
+            datos = self._local.datos = {}
+            with self._lock:
+                self._todos.append(datos)
+            return datos
+
+    def copias(self) -> List[dict]:
+        """Obtiene una copia de los fragmentos de todos los hilos."""
+        with self._lock:
+            fragmentos = list(self._todos)
+        return [dict(f) for f in fragmentos]
+
+
+class Metrica(ABC):
+    """
+    Base común de las métricas con nombre, ayuda y etiquetas.
+    """
+
+    tipo = "untyped"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._fragmentos = _Fragmentos()
+
+    @abstractmethod
+    def _series(self) -> Iterable[str]:
+        """Genera las líneas con el valor de cada serie de la métrica."""
+
+    def exponer(self) -> str:
+        """Genera las líneas de la métrica en formato de texto."""
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        lineas.extend(self._series())
+        return "\n".join(lineas)
+
+
+class Contador(Metrica):
+    """
+    Contador monótono por combinación de etiquetas.
+    """
+
+    tipo = "counter"
+
+    def inc(self, *valores: str, cantidad: float = 1) -> None:
+        """Incrementa la serie identificada por los valores de etiqueta."""
+        datos = self._fragmentos.propio()
+        datos[valores] = datos.get(valores, 0) + cantidad
+
+    def valores(self) -> Dict[Tuple[str, ...], float]:
+        """Suma los fragmentos de todos los hilos."""
+        total: Dict[Tuple[str, ...], float] = {}
+        for fragmento in self._fragmentos.copias():
+            for clave, valor in fragmento.items():
+                total[clave] = total.get(clave, 0) + valor
+        return total
+
+    def _series(self) -> Iterable[str]:
+        for clave, valor in sorted(self.valores().items()):
+            yield f"{self.nombre}{_formatear_etiquetas(self.etiquetas, clave)} {_formatear_numero(valor)}"
+
+
+class Medidor(Contador):
+    """
+    Valor que sube y baja (ej. solicitudes en curso).
+    """
+
+    tipo = "gauge"
+
+    def dec(self, *valores: str, cantidad: float = 1) -> None:
+        """Decrementa la serie identificada por los valores de etiqueta."""
+        self.inc(*valores, cantidad=-cantidad)
+
+
+class MedidorCalculado(Metrica):
+    """
+    Medidor cuyo valor se calcula al momento del scrape.
+    """
+
+    tipo = "gauge"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str],
+                 funcion: Callable[[], Dict[Tuple[str, ...], float]]):
+        super().__init__(nombre, ayuda, etiquetas)
+        self._funcion = funcion
+
+    def _series(self) -> Iterable[str]:
+        for clave, valor in sorted(self._funcion().items()):
+            yield f"{self.nombre}{_formatear_etiquetas(self.etiquetas, clave)} {_formatear_numero(valor)}"
+
+
+class Histograma(Metrica):
+    """
+    Histograma acumulativo con buckets fijos.
+    """
+
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 buckets: Sequence[float] = BUCKETS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(buckets)
+
+    def observar(self, valor: float, *valores: str) -> None:
+        """Registra una observación en la serie indicada."""
+        datos = self._fragmentos.propio()
+        serie = datos.get(valores)
+        if serie is None:
+            # [conteo por bucket..., +Inf, suma]
+            serie = datos[valores] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                serie[i] += 1
+                break
+        else:
+            serie[len(self.buckets)] += 1
+        serie[-1] += valor
+
+    def valores(self) -> Dict[Tuple[str, ...], List[float]]:
+        """Suma los fragmentos de todos los hilos."""
+        total: Dict[Tuple[str, ...], List[float]] = {}
+        for fragmento in self._fragmentos.copias():
+            for clave, serie in fragmento.items():
+                acumulada = total.setdefault(clave, [0] * len(serie))
+                for i, valor in enumerate(list(serie)):
+                    acumulada[i] += valor
+        return total
+
+    def _series(self) -> Iterable[str]:
+        limites = [_formatear_numero(l) for l in self.buckets] + ["+Inf"]
+        for clave, serie in sorted(self.valores().items()):
+            acumulado = 0
+            for limite, cantidad in zip(limites, serie):
+                acumulado += cantidad
+                etiquetas = _formatear_etiquetas(self.etiquetas, clave, f'le="{limite}"')
+                yield f"{self.nombre}_bucket{etiquetas} {acumulado}"
+            etiquetas = _formatear_etiquetas(self.etiquetas, clave)
+            yield f"{self.nombre}_sum{etiquetas} {_formatear_numero(serie[-1])}"
+            yield f"{self.nombre}_count{etiquetas} {acumulado}"
+
+
+class RegistroMetricas:
+    """
+    Conjunto de métricas expuestas por el endpoint /metrics.
+    """
+
+    def __init__(self):
+        self._metricas: List[Metrica] = []
+
+    def registrar(self, metrica: Metrica) -> Metrica:
+        """Agrega una métrica al registro y la devuelve."""
+        self._metricas.append(metrica)
+        return metrica
+
+    def exponer(self) -> str:
+        """Genera el cuerpo completo en formato de texto de Prometheus."""
+        return "\n".join(m.exponer() for m in self._metricas) + "\n"
+
+
+registro = RegistroMetricas()
+
+solicitudes_total = registro.registrar(Contador(
+    "inventario_http_solicitudes_total", "Solicitudes HTTP atendidas",
+    ("metodo", "ruta", "estado")))
+duracion_solicitudes = registro.registrar(Histograma(
+    "inventario_http_duracion_segundos", "Latencia de las solicitudes HTTP",
+    ("metodo", "ruta")))
+solicitudes_en_curso = registro.registrar(Medidor(
+    "inventario_http_en_curso", "Solicitudes HTTP en curso"))
+errores_total = registro.registrar(Contador(
+    "inventario_http_errores_total", "Respuestas HTTP con error por código de estado",
+    ("estado",)))
+duracion_db_solicitud = registro.registrar(Histograma(
+    "inventario_db_duracion_por_solicitud_segundos", "Tiempo de base de datos por solicitud",
+    ("metodo", "ruta")))
+consultas_db_solicitud = registro.registrar(Contador(
+    "inventario_db_consultas_total", "Sentencias SQL ejecutadas por ruta",
+    ("metodo", "ruta")))
+cache_aciertos = registro.registrar(Contador(
+    "inventario_cache_aciertos_total", "Aciertos de caché", ("cache",)))
+cache_fallos = registro.registrar(Contador(
+    "inventario_cache_fallos_total", "Fallos de caché", ("cache",)))
+
+db_reintentos = registro.registrar(Contador(
+    "inventario_db_reintentos_total", "Reintentos por base de datos bloqueada", ("operacion",)))
+db_espera_bloqueo = registro.registrar(Histograma(
+    "inventario_db_espera_bloqueo_segundos", "Tiempo perdido esperando bloqueos de la base de datos",
+    ("operacion",)))
+db_bloqueos_agotados = registro.registrar(Contador(
+    "inventario_db_bloqueos_agotados_total", "Sentencias que fallaron tras agotar los reintentos",
+    ("operacion",)))
+
+eventos_suscriptores = registro.registrar(Medidor(
+    "inventario_eventos_suscriptores", "Clientes suscriptos a los eventos de stock"))
+eventos_publicados = registro.registrar(Contador(
+    "inventario_eventos_publicados_total", "Eventos de stock publicados", ("tipo",)))
+eventos_descartados = registro.registrar(Contador(
+    "inventario_eventos_descartados_total", "Eventos descartados por buffers de suscriptores llenos",
+    ("politica",)))
+alertas_stock = registro.registrar(Contador(
+    "inventario_alertas_stock_total", "Productos que cruzaron su stock mínimo", ("tipo",)))
+
+trabajos_en_cola = registro.registrar(Medidor(
+    "inventario_trabajos_en_cola", "Trabajos de reportes esperando un hilo libre"))
+trabajos_total = registro.registrar(Contador(
+    "inventario_trabajos_total", "Trabajos de reportes finalizados", ("tipo", "estado")))
+
+
+def _ratio_cache() -> Dict[Tuple[str, ...], float]:
+    """Calcula la proporción de aciertos de cada caché."""
+    aciertos = cache_aciertos.valores()
+    fallos = cache_fallos.valores()
+    ratios = {}
+    for clave in set(aciertos) | set(fallos):
+        total = aciertos.get(clave, 0) + fallos.get(clave, 0)
+        ratios[clave] = aciertos.get(clave, 0) / total if total else 0.0
+    return ratios
+
+
+registro.registrar(MedidorCalculado(
+    "inventario_cache_ratio_aciertos", "Proporción de aciertos de caché", ("cache",), _ratio_cache))
+
+
+def registrar_cache(cache: str, acierto: bool) -> None:
+    """
+    Registra un acierto o un fallo de una caché con nombre.
+
+    Args:
+        cache: Nombre de la caché
+        acierto: True si el valor se encontró en la caché
+    """
+    if acierto:
+        cache_aciertos.inc(cache)
+    else:
+        cache_fallos.inc(cache)
+
+
+def registrar_bloqueo(operacion: str, espera: float, reintentos: int, agotado: bool = False) -> None:
+    """
+    Registra una sentencia que encontró la base de datos bloqueada.
+
+    Args:
+        operacion: Método de InventarioManager que originó la sentencia
+        espera: Segundos perdidos por el bloqueo
+        reintentos: Reintentos realizados
+        agotado: True si la sentencia falló tras agotar los reintentos
+    """
+    db_reintentos.inc(operacion, cantidad=reintentos)
+    db_espera_bloqueo.observar(espera, operacion)
+    if agotado:
+        db_bloqueos_agotados.inc(operacion)
+
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI que mide cada solicitud HTTP.
+
+    Registra conteos por ruta y estado, latencia, solicitudes en curso,
+    errores y el tiempo de base de datos acumulado durante la solicitud.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._rutas: Dict[object, str] = {}
+
+    def _plantilla_ruta(self, scope) -> str:
+        """Obtiene la plantilla de la ruta (ej. /productos/{producto_id})."""
+        ruta = scope.get("route")
+        if ruta is not None and hasattr(ruta, "path"):
+            return ruta.path
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "desconocida"
+        plantilla = self._rutas.get(endpoint)
+        if plantilla is None:
+            aplicacion = scope.get("app")
+            for candidata in getattr(aplicacion, "routes", []):
+                if getattr(candidata, "endpoint", None) is endpoint:
+                    plantilla = candidata.path
+                    break
+            plantilla = self._rutas[endpoint] = plantilla or "desconocida"
+        return plantilla
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        estado = [500]
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado[0] = mensaje["status"]
+            await send(mensaje)
+
+        acumulador = [0.0, 0]
+        token = tiempo_db_actual.set(acumulador)
+        solicitudes_en_curso.inc()
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracion = time.perf_counter() - inicio
+            solicitudes_en_curso.dec()
+            tiempo_db_actual.reset(token)
+            metodo = scope["method"]
+            ruta = self._plantilla_ruta(scope)
+            codigo = str(estado[0])
+            solicitudes_total.inc(metodo, ruta, codigo)
+            duracion_solicitudes.observar(duracion, metodo, ruta)
+            duracion_db_solicitud.observar(acumulador[0], metodo, ruta)
+            if acumulador[1]:
+                consultas_db_solicitud.inc(metodo, ruta, cantidad=acumulador[1])
+            if estado[0] >= 400:
+                errores_total.inc(codigo)
@@ -0,0 +1,72 @@
+"""
+Montos en centavos: conversión entre pesos y unidades mínimas enteras.
+
+Los precios se guardan como enteros (INTEGER en SQLite, int en Python).
+Una suma de floats arrastra el error de representación de cada término
+(0.1 + 0.2 != 0.3) y en un millón de productos el total se corre en
+centavos; la suma de enteros es exacta y, en SQLite, más rápida que la de
+REAL. Los pesos con decimales solo aparecen en los bordes: al recibir un
+precio (formulario, API, CSV) y al mostrarlo o serializarlo.
+"""
+
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Union
+
+# Centavos por unidad de moneda
+CENTAVOS_POR_UNIDAD = 100
+
+_CENTAVO = Decimal("0.01")
+
+
+def a_centavos(monto: Union[int, float, str, Decimal]) -> int:
+    """
+    Convierte un monto en pesos a centavos, redondeando al centavo más
+    cercano (las mitades se alejan del cero).
+
+    Los float se convierten desde su representación más corta ("1.005" y
+    no 1.00499999...), así 1.005 da 101 centavos como al escribirlo a mano.
+
+    Args:
+        monto: Monto en pesos
+
+    Returns:
+        Monto en centavos
+
+    Raises:
+        ValueError: Si el monto no es un número finito
+    """
+    if isinstance(monto, bool):
+        raise ValueError(f"Monto inválido: {monto!r}")
+    if isinstance(monto, int):
+        return monto * CENTAVOS_POR_UNIDAD
+    try:
+        decimal = Decimal(repr(monto) if isinstance(monto, float) else monto)
+        return int(decimal.quantize(_CENTAVO, rounding=ROUND_HALF_UP) * CENTAVOS_POR_UNIDAD)
+    except (InvalidOperation, TypeError, ValueError, OverflowError):
+        raise ValueError(f"Monto inválido: {monto!r}")
+
+
+def a_unidades(centavos: int) -> float:
+    """
+    Convierte centavos a pesos para mostrar o serializar el monto.
+
+    El float resultante es el más cercano al monto exacto (la división de
+    un entero por 100 redondea una sola vez), así que al formatearlo con
+    dos decimales reproduce los centavos.
+    """
+    return centavos / CENTAVOS_POR_UNIDAD
+
+
+def formatear_monto(centavos: int) -> str:
+    """
+    Formatea un monto en centavos como "$1,234.56" sin pasar por float.
+
+    Args:
+        centavos: Monto en centavos
+
+    Returns:
+        Monto con separador de miles y dos decimales
+    """
+    unidades, resto = divmod(abs(centavos), CENTAVOS_POR_UNIDAD)
+    signo = "-" if centavos < 0 else ""
+    return f"{signo}${unidades:,}.{resto:02d}"
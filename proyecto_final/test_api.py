@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Pruebas de la API en proceso (TestClient) sobre una base temporal.
+
+Uso:
+    python test_api.py
+"""
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+# La API abre la base al importarse: apuntarla a una temporal antes
+_DIRECTORIO = tempfile.mkdtemp(prefix="test_api_")
+os.environ["INVENTARIO_DB"] = os.path.join(_DIRECTORIO, "api.db")
+atexit.register(shutil.rmtree, _DIRECTORIO, ignore_errors=True)
+
+try:
+    from fastapi.testclient import TestClient
+    from api import app
+    cliente = TestClient(app)
+except ImportError as e:
+    print(f"⚠️ Pruebas de la API omitidas (dependencia faltante: {e})")
+    cliente = None
+
+
+def _crear_producto() -> dict:
+    respuesta = cliente.post("/productos", json={"nombre": "Lápiz", "descripcion": "HB", "cantidad": 5,
+                                                 "precio": 1.5, "categoria": "Librería"})
+    assert respuesta.status_code == 200, respuesta.text
+    return respuesta.json()
+
+
+def test_actualizar_sin_campos_responde_400_con_if_match():
+    if cliente is None:
+        return
+    producto = _crear_producto()
+    etiqueta = cliente.get(f"/productos/{producto['id']}").headers["etag"]
+
+    con_version = cliente.put(f"/productos/{producto['id']}", json={}, headers={"If-Match": etiqueta})
+    assert con_version.status_code == 400, con_version.text
+    sin_version = cliente.put(f"/productos/{producto['id']}", json={})
+    assert sin_version.status_code == 400, sin_version.text
+
+
+def test_actualizar_con_version_vieja_responde_412():
+    if cliente is None:
+        return
+    producto = _crear_producto()
+    etiqueta = cliente.get(f"/productos/{producto['id']}").headers["etag"]
+    assert cliente.put(f"/productos/{producto['id']}", json={"cantidad": 7}).status_code == 200
+
+    respuesta = cliente.put(f"/productos/{producto['id']}", json={"cantidad": 9}, headers={"If-Match": etiqueta})
+    assert respuesta.status_code == 412, respuesta.text
+    assert cliente.get(f"/productos/{producto['id']}").json()['cantidad'] == 7
+
+
+
+def test_una_consulta_lenta_no_bloquea_las_demas():
+    if cliente is None:
+        return
+    import asyncio
+    import time
+    import httpx
+    import api
+    producto = _crear_producto()
+    liberar = threading.Event()
+    facetas = api.inventario.obtener_facetas_categorias
+    def facetas_lentas():
+        liberar.wait(10)
+        return facetas()
+
+    async def consultar():
+        # Un solo event loop para las dos solicitudes, como en un worker
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://prueba") as asincrono:
+            inicio = time.perf_counter()
+            lenta = asyncio.create_task(asincrono.get("/productos/facetas"))
+            await asyncio.sleep(0.1)
+            rapida = await asincrono.get(f"/productos/{producto['id']}")
+            demora = time.perf_counter() - inicio
+            liberar.set()
+            return rapida, demora, await lenta
+
+    api.inventario.obtener_facetas_categorias = facetas_lentas
+    try:
+        rapida, demora, lenta = asyncio.run(consultar())
+    finally:
+        liberar.set()
+        api.inventario.obtener_facetas_categorias = facetas
+    # Mientras la consulta lenta ocupa un hilo, la otra solicitud se responde igual
+    assert demora < 5, f"la solicitud esperó {demora:.1f} s a la consulta lenta"
+    assert rapida.status_code == 200 and lenta.status_code == 200
+    assert "db;dur=" in rapida.headers.get("server-timing", ""), rapida.headers
+
+
+if __name__ == "__main__":
+    pruebas = [test_actualizar_sin_campos_responde_400_con_if_match, test_actualizar_con_version_vieja_responde_412,
+               test_una_consulta_lenta_no_bloquea_las_demas]
+    for prueba in pruebas:
+        prueba()
+        print(f"✅ {prueba.__name__}")
+    print(f"🎉 {len(pruebas)} pruebas de la API superadas")
+    sys.exit(0)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Pruebas de InventarioManager: alertas de stock mínimo en escrituras
+simultáneas y en cargas masivas, y categorías creadas junto con el
+producto que las usa.
+
+Uso:
+    python test_inventario.py
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+from inventario import InventarioManager, Producto
+from metricas import alertas_stock
+
+
+def _alertas(tipo: str = 'stock_bajo') -> float:
+    return alertas_stock.valores().get((tipo,), 0)
+
+
+def _con_inventario(prueba):
+    """Ejecuta la prueba con un InventarioManager sobre una base temporal."""
+    def envoltura():
+        directorio = tempfile.mkdtemp(prefix="test_inventario_")
+        inventario = InventarioManager(os.path.join(directorio, "inventario.db"))
+        try:
+            prueba(inventario)
+        finally:
+            inventario.cerrar()
+            shutil.rmtree(directorio, ignore_errors=True)
+    envoltura.__name__ = prueba.__name__
+    return envoltura
+
+
+@_con_inventario
+def test_actualizaciones_simultaneas_alertan_una_vez(inventario):
+    productos = [Producto(f"Producto {i}", "Prueba", 10, 1.0, "Prueba", stock_minimo=5) for i in range(30)]
+    for producto in productos:
+        assert inventario.registrar_producto(producto)
+
+    antes = _alertas()
+    # Dos actualizaciones por producto, ambas desde 10 a un valor bajo el mínimo:
+    # solo la primera en escribir cruza el mínimo
+    barrera = threading.Barrier(len(productos) * 2)
+    def bajar(id_producto, cantidad):
+        barrera.wait()
+        assert inventario.actualizar_producto(id_producto, cantidad=cantidad)
+    hilos = [threading.Thread(target=bajar, args=(p.id, cantidad)) for p in productos for cantidad in (0, 1)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert _alertas() - antes == len(productos), (_alertas() - antes, len(productos))
+
+
+@_con_inventario
+def test_carga_masiva_alerta_stock_bajo(inventario):
+    # Un id dado de baja no se reutiliza: la carga empieza después de él
+    borrado = Producto("Borrado", "Prueba", 10, 1.0, "Prueba")
+    assert inventario.registrar_producto(borrado)
+    assert inventario.eliminar_producto(borrado.id)
+
+    antes = _alertas()
+    carga = [
+        Producto("Con stock", "Prueba", 10, 1.0, "Prueba", stock_minimo=2),
+        Producto("En el mínimo", "Prueba", 2, 1.0, "Prueba", stock_minimo=2),
+        Producto("Sin stock", "Prueba", 0, 1.0, "Prueba"),
+    ]
+    assert inventario.registrar_productos(carga) == 3
+    assert _alertas() - antes == 2, _alertas() - antes
+
+
+def _categoria_existe(inventario, nombre: str) -> bool:
+    return bool(inventario.db.execute_query("SELECT 1 FROM categorias WHERE nombre = ?", (nombre,)))
+
+
+@_con_inventario
+def test_alta_fallida_no_deja_la_categoria(inventario):
+    # Sin nombre el INSERT del producto viola NOT NULL
+    assert not inventario.registrar_producto(Producto(None, "Prueba", 1, 1.0, "Huérfana"))
+    assert not _categoria_existe(inventario, "Huérfana")
+    assert inventario.registrar_producto(Producto("Producto", "Prueba", 1, 1.0, "Huérfana"))
+    assert _categoria_existe(inventario, "Huérfana")
+
+
+@_con_inventario
+def test_actualizacion_fallida_no_deja_la_categoria(inventario):
+    producto = Producto("Producto", "Prueba", 1, 1.0, "Prueba")
+    assert inventario.registrar_producto(producto)
+    version, _ = inventario.obtener_version_producto(producto.id)
+
+    assert not inventario.actualizar_producto(producto.id, categoria="Huérfana", version_esperada=version + 1)
+    assert not _categoria_existe(inventario, "Huérfana")
+    assert inventario.actualizar_producto(producto.id, categoria="Huérfana", version_esperada=version)
+    assert inventario.buscar_producto_por_id(producto.id).categoria == "Huérfana"
+
+
+if __name__ == "__main__":
+    pruebas = [test_actualizaciones_simultaneas_alertan_una_vez, test_carga_masiva_alerta_stock_bajo,
+               test_alta_fallida_no_deja_la_categoria, test_actualizacion_fallida_no_deja_la_categoria]
+    for prueba in pruebas:
+        prueba()
+        print(f"✅ {prueba.__name__}")
+    print(f"🎉 {len(pruebas)} pruebas del inventario superadas")
+    sys.exit(0)
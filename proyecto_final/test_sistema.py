@@ -7,12 +7,57 @@ Demuestra todas las funcionalidades implementadas
 """
 
 from inventario import InventarioManager, Producto
+from moneda import formatear_monto
 import os
 
 def limpiar_pantalla():
     """Limpia la pantalla"""
     os.system('cls' if os.name == 'nt' else 'clear')
 
+def probar_metricas_api(solicitudes: int = 200):
+    """
+    Ejecuta una ráfaga de solicitudes contra la API en proceso y verifica
+    que /metrics refleje la carga.
+    
+    Args:
+        solicitudes: Cantidad de solicitudes de la ráfaga
+        
+    Returns:
+        True si las métricas son consistentes, False en caso contrario
+    """
+    try:
+        from fastapi.testclient import TestClient
+        from api import app
+    except ImportError as e:
+        print(f"⚠️ Prueba de métricas omitida (dependencia faltante: {e})")
+        return True
+    
+    cliente = TestClient(app)
+    rutas = ["/productos/", "/productos/1", "/estadisticas", "/productos/999999"]
+    for i in range(solicitudes):
+        cliente.get(rutas[i % len(rutas)])
+    
+    respuesta = cliente.get("/metrics")
+    cuerpo = respuesta.text
+    
+    # Total de solicitudes registradas para /productos/{producto_id}
+    total_por_id = 0
+    for linea in cuerpo.splitlines():
+        if linea.startswith("inventario_http_solicitudes_total{") and 'ruta="/productos/{producto_id}"' in linea:
+            total_por_id += float(linea.rsplit(" ", 1)[1])
+    
+    esperado = solicitudes // len(rutas) * 2
+    ok = (
+        respuesta.status_code == 200
+        and total_por_id >= esperado
+        and 'inventario_http_errores_total{estado="404"}' in cuerpo
+        and "inventario_http_duracion_segundos_bucket" in cuerpo
+        and "inventario_db_duracion_por_solicitud_segundos_count" in cuerpo
+    )
+    print(f"{'✅' if ok else '❌'} /metrics tras {solicitudes} solicitudes: "
+          f"{int(total_por_id)} registradas para /productos/{{producto_id}} (esperadas ≥ {esperado})")
+    return ok
+
 def main():
     print("🧪 SCRIPT DE PRUEBA - SISTEMA DE GESTIÓN DE INVENTARIO")
     print("=" * 60)
@@ -103,13 +148,12 @@ def main():
         print("-" * 65)
         valor_total = 0
         for p in productos_stock_bajo:
-            valor = p.cantidad * p.precio
-            valor_total += valor
-            print(f"{p.nombre[:29]:<30} {p.cantidad:<8} ${p.precio:<9.2f} ${valor:<9.2f}")
+            valor_total += p.valor_centavos
+            print(f"{p.nombre[:29]:<30} {p.cantidad:<8} ${p.precio:<9.2f} ${p.valor_centavos / 100:<9.2f}")
         
         print(f"\n📈 Resumen del reporte:")
         print(f"   • Productos afectados: {len(productos_stock_bajo)}")
-        print(f"   • Valor total afectado: ${valor_total:.2f}")
+        print(f"   • Valor total afectado: {formatear_monto(valor_total)}")
         
         # Identificar productos sin stock
         sin_stock = [p for p in productos_stock_bajo if p.cantidad == 0]
@@ -127,7 +171,10 @@ def main():
     if todos_productos:
         total_productos = len(todos_productos)
         stock_total = sum(p.cantidad for p in todos_productos)
-        valor_inventario = sum(p.cantidad * p.precio for p in todos_productos)
+        # El valor se suma en centavos: la suma en SQL debe coincidir exactamente
+        valor_inventario = sum(p.valor_centavos for p in todos_productos)
+        if inventario.obtener_resumen_inventario()['valor_inventario_centavos'] != valor_inventario:
+            print("   ❌ El valor del inventario calculado en SQL no coincide con la suma de los productos")
         productos_sin_stock = len([p for p in todos_productos if p.cantidad == 0])
         
         # Contar por categorías
@@ -139,7 +186,7 @@ def main():
         print(f"📊 Estadísticas del Inventario:")
         print(f"   • Total de productos: {total_productos}")
         print(f"   • Stock total: {stock_total} unidades")
-        print(f"   • Valor del inventario: ${valor_inventario:,.2f}")
+        print(f"   • Valor del inventario: {formatear_monto(valor_inventario)}")
         print(f"   • Productos sin stock: {productos_sin_stock}")
         print(f"   • Categorías registradas: {len(categorias)}")
         
@@ -161,6 +208,10 @@ def main():
         productos_actualizados = inventario.obtener_todos_los_productos()
         print(f"📊 Productos restantes: {len(productos_actualizados)}")
     
+    print("\n8. 📡 VERIFICANDO MÉTRICAS DE LA API...")
+    print("-" * 40)
+    probar_metricas_api()
+    
     print("\n" + "=" * 60)
     print("🎉 PRUEBA COMPLETADA EXITOSAMENTE")
     print("=" * 60)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Pruebas de los trabajos en segundo plano: un trabajo que no llegó a
+correr (cancelado al cerrar, de un proceso que dejó de renovarlo o que no
+se pudo tomar) no debe bloquear un pedido igual ni quedar pendiente.
+
+Uso:
+    python test_trabajos.py
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import trabajos
+from inventario import InventarioManager, Producto
+from trabajos import GestorTrabajos
+
+# Reporte de prueba que ocupa el único hilo del pool hasta que se lo libera
+_liberar = threading.Event()
+
+
+def _reporte_bloqueante(inventario, archivo) -> int:
+    _liberar.wait(10)
+    archivo.write("[]")
+    return 0
+
+
+trabajos.REPORTES['bloqueo'] = (_reporte_bloqueante, {})
+
+
+def _preparar(directorio: str) -> InventarioManager:
+    inventario = InventarioManager(os.path.join(directorio, "trabajos.db"))
+    inventario.registrar_producto(Producto("Producto", "Prueba", 5, 10.5, "Prueba"))
+    return inventario
+
+
+def _ocupar_pool(gestor: GestorTrabajos, bloqueo: bool = True) -> dict:
+    """Envía el reporte bloqueante (salvo que ya esté enviado) y luego una valorización que queda en cola."""
+    if bloqueo:
+        _liberar.clear()
+        gestor.enviar('bloqueo')
+    encolado, compartido = gestor.enviar('valorizacion')
+    assert not compartido and encolado['estado'] == 'pendiente'
+    return encolado
+
+
+def test_cerrar_marca_fallidos_los_trabajos_en_cola():
+    directorio = tempfile.mkdtemp(prefix="test_trabajos_")
+    try:
+        inventario = _preparar(directorio)
+        gestor = GestorTrabajos(inventario, hilos=1)
+        _liberar.clear()
+        bloqueo = gestor.enviar('bloqueo')[0]
+        encolado = _ocupar_pool(gestor, bloqueo=False)
+
+        # cerrar espera al trabajo que está corriendo antes de volver
+        threading.Timer(0.3, _liberar.set).start()
+        gestor.cerrar()
+        assert gestor.obtener(bloqueo['id'])['estado'] == 'terminado'
+        cancelado = gestor.obtener(encolado['id'])
+        assert cancelado['estado'] == 'fallido', cancelado
+
+        # Tras el "reinicio", el mismo pedido se calcula de nuevo
+        reiniciado = GestorTrabajos(inventario, hilos=1)
+        nuevo, compartido = reiniciado.enviar('valorizacion')
+        assert not compartido and nuevo['id'] != encolado['id']
+        terminado = reiniciado.esperar(nuevo['id'], 10)
+        assert terminado['estado'] == 'terminado', terminado
+        reiniciado.cerrar()
+        inventario.cerrar()
+    finally:
+        _liberar.set()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def test_trabajo_sin_renovar_no_se_reutiliza():
+    directorio = tempfile.mkdtemp(prefix="test_trabajos_")
+    try:
+        inventario = _preparar(directorio)
+        caido = GestorTrabajos(inventario, hilos=1, arriendo=0.3)
+        encolado = _ocupar_pool(caido)
+        # Un proceso caído deja de renovar sin llegar a cerrar
+        caido._cerrado.set()
+
+        otro = GestorTrabajos(inventario, hilos=1)
+        assert otro.enviar('valorizacion')[0]['id'] == encolado['id']
+        time.sleep(0.5)
+        assert otro.obtener(encolado['id']) is None
+        nuevo, compartido = otro.enviar('valorizacion')
+        assert not compartido and nuevo['id'] != encolado['id']
+        assert otro.esperar(nuevo['id'], 10)['estado'] == 'terminado'
+        _liberar.set()
+        caido.cerrar()
+        otro.cerrar()
+        inventario.cerrar()
+    finally:
+        _liberar.set()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def test_trabajo_que_no_se_puede_tomar_queda_fallido():
+    directorio = tempfile.mkdtemp(prefix="test_trabajos_")
+    try:
+        inventario = _preparar(directorio)
+        escribir = inventario.db.ejecutar_escritura
+        def escritura_fallida(query, params=()):
+            if "'en_curso'" in query:
+                raise sqlite3.OperationalError("disk I/O error")
+            return escribir(query, params)
+        inventario.db.ejecutar_escritura = escritura_fallida
+
+        gestor = GestorTrabajos(inventario, hilos=1)
+        trabajo, _ = gestor.enviar('valorizacion')
+        fallido = gestor.esperar(trabajo['id'], 10)
+        assert fallido['estado'] == 'fallido' and 'disk I/O error' in fallido['error'], fallido
+        gestor.cerrar()
+        inventario.cerrar()
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    pruebas = [test_cerrar_marca_fallidos_los_trabajos_en_cola, test_trabajo_sin_renovar_no_se_reutiliza,
+               test_trabajo_que_no_se_puede_tomar_queda_fallido]
+    for prueba in pruebas:
+        prueba()
+        print(f"✅ {prueba.__name__}")
+    print(f"🎉 {len(pruebas)} pruebas de trabajos superadas")
+    sys.exit(0)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Prueba de exactitud de la valorización: sobre un catálogo generado grande,
+el valor total y el de cada categoría deben coincidir al centavo con una
+referencia calculada en Decimal a partir de los precios generados.
+
+Uso:
+    python test_valorizacion.py
+
+La cantidad de productos se puede cambiar con INVENTARIO_TEST_FILAS (por
+defecto 1.000.000).
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from collections import defaultdict
+from decimal import Decimal
+
+from generador import GeneradorCatalogo
+from inventario import InventarioManager
+
+FILAS = int(os.getenv("INVENTARIO_TEST_FILAS", "1000000"))
+SEMILLA = 42
+
+
+def _referencia(generador: GeneradorCatalogo, filas: int):
+    """Total y (productos, stock, valor) por categoría, en centavos exactos."""
+    total = Decimal(0)
+    categorias = defaultdict(lambda: [0, 0, Decimal(0)])
+    for _, _, cantidad, precio, categoria in generador.filas(filas):
+        valor = cantidad * Decimal(repr(precio))
+        total += valor
+        acumulado = categorias[categoria]
+        acumulado[0] += 1
+        acumulado[1] += cantidad
+        acumulado[2] += valor
+    return int(total * 100), {categoria: (productos, stock, int(valor * 100))
+                              for categoria, (productos, stock, valor) in categorias.items()}
+
+
+def test_valorizacion_exacta_en_catalogo_grande():
+    directorio = tempfile.mkdtemp(prefix="test_valorizacion_")
+    try:
+        inventario = InventarioManager(os.path.join(directorio, "valorizacion.db"))
+        generador = GeneradorCatalogo(semilla=SEMILLA)
+        assert generador.cargar_en_base(inventario, FILAS) == FILAS
+        total, por_categoria = _referencia(generador, FILAS)
+
+        resumen = inventario.obtener_resumen_inventario()
+        assert resumen['total_productos'] == FILAS, resumen
+        assert isinstance(resumen['valor_inventario_centavos'], int), resumen
+        assert resumen['valor_inventario_centavos'] == total, (resumen['valor_inventario_centavos'], total)
+
+        valorizacion = {categoria: (productos, stock, valor)
+                        for categoria, productos, stock, valor in inventario.valorizar_por_categoria()}
+        assert valorizacion == por_categoria, {
+            categoria: (valorizacion.get(categoria), esperado)
+            for categoria, esperado in por_categoria.items() if valorizacion.get(categoria) != esperado
+        }
+        assert all(isinstance(valor, int) for _, _, valor in valorizacion.values())
+        assert sum(valor for _, _, valor in valorizacion.values()) == total
+        inventario.cerrar()
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    pruebas = [test_valorizacion_exacta_en_catalogo_grande]
+    for prueba in pruebas:
+        prueba()
+        print(f"✅ {prueba.__name__} ({FILAS:,} productos)")
+    print(f"🎉 {len(pruebas)} pruebas de valorización superadas")
+    sys.exit(0)
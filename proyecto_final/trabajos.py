@@ -0,0 +1,401 @@
+"""
+Trabajos en segundo plano para los reportes pesados.
+
+Un reporte grande (valorización de todo el inventario, stock bajo sobre
+millones de filas, exportación completa) se envía como trabajo: se
+responde enseguida con su ID y el cálculo corre en un pool acotado de
+hilos. El estado se guarda en la tabla trabajos de la misma base, así
+cualquier worker de la API o la interfaz web puede consultarlo, y el
+resultado queda en un archivo JSON que se sirve tal cual, sin volver a
+codificarlo.
+
+Los resultados se reutilizan durante TTL_POR_DEFECTO segundos: un pedido
+igual (mismo reporte, mismos parámetros y misma versión del inventario)
+devuelve el trabajo existente, terminado o en curso, en lugar de calcular
+otra vez. Cualquier escritura cambia la versión del inventario, por lo que
+un resultado reutilizado nunca está desactualizado.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from inventario import COLUMNAS, filas_en_pesos, seleccionar_columnas
+from metricas import registrar_cache, trabajos_en_cola, trabajos_total
+from moneda import a_unidades
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+ESTADOS_FINALES = ("terminado", "fallido")
+HILOS_POR_DEFECTO = int(os.environ.get("INVENTARIO_TRABAJOS_HILOS", "2"))
+TTL_POR_DEFECTO = float(os.environ.get("INVENTARIO_TRABAJOS_TTL", "300"))
+# Trabajos esperando un hilo libre en este proceso; por encima se rechazan
+MAXIMO_EN_COLA = 50
+# Un trabajo sin terminar después de esto se da por perdido aunque su
+# proceso siga renovándolo
+DURACION_MAXIMA = 3600.0
+# Los trabajos sin terminar vencen si el proceso que los ejecuta deja de
+# renovarlos durante este tiempo (por ejemplo, porque se reinició o se cayó):
+# entonces un pedido igual ya no los reutiliza y se calcula de nuevo
+ARRIENDO = 30.0
+# Al cerrar, segundos que se espera a los trabajos que están corriendo
+ESPERA_CIERRE = 30.0
+
+COLUMNAS_TRABAJO = ("id", "tipo", "parametros", "estado", "creado_en", "iniciado_en",
+                    "terminado_en", "expira_en", "filas", "archivo", "error")
+
+
+def _texto_columnas(valor: Any) -> Optional[Tuple[str, ...]]:
+    """Convierte 'id,nombre' (o una lista) en una selección de columnas validada."""
+    if valor is None:
+        return None
+    nombres = valor.split(",") if isinstance(valor, str) else valor
+    return seleccionar_columnas(n.strip() for n in nombres if n.strip())
+
+
+def _limite(valor: Any) -> Optional[int]:
+    """Valida el límite de stock (None para el mínimo de cada producto)."""
+    if valor is None:
+        return None
+    limite = int(valor)
+    if limite < 0:
+        raise ValueError("El límite de stock no puede ser negativo")
+    return limite
+
+
+def _escribir_filas(archivo, columnas, lotes) -> int:
+    """
+    Escribe los lotes de filas como un arreglo JSON de objetos, con el precio
+    en pesos. Devuelve las filas escritas.
+    """
+    archivo.write("[")
+    separador = ""
+    filas = 0
+    for lote in lotes:
+        if not lote:
+            continue
+        objetos = [dict(zip(columnas, fila)) for fila in filas_en_pesos(lote, columnas)]
+        archivo.write(separador + json.dumps(objetos, ensure_ascii=False, separators=(",", ":"))[1:-1])
+        separador = ","
+        filas += len(lote)
+    archivo.write("]")
+    return filas
+
+
+def reporte_valorizacion(inventario, archivo) -> int:
+    """Resumen general y valor del stock por categoría."""
+    resumen = inventario.obtener_resumen_inventario()
+    # Los totales se suman en centavos y se pasan a pesos solo al escribirlos
+    resumen['valor_inventario'] = a_unidades(resumen.pop('valor_inventario_centavos'))
+    resumen['categorias'] = [
+        {'categoria': categoria, 'productos': productos, 'stock': stock, 'valor': a_unidades(valor)}
+        for categoria, productos, stock, valor in inventario.valorizar_por_categoria()
+    ]
+    json.dump(resumen, archivo, ensure_ascii=False, separators=(",", ":"))
+    return len(resumen['categorias'])
+
+
+def reporte_stock_bajo(inventario, archivo, limite: Optional[int] = None,
+                       columnas: Optional[Tuple[str, ...]] = None) -> int:
+    """Productos con stock bajo (con el mínimo de cada producto si no hay límite)."""
+    seleccion = columnas or COLUMNAS
+    filas = inventario.generar_reporte_stock_bajo(limite, columnas=seleccion)
+    return _escribir_filas(archivo, seleccion, [filas])
+
+
+def reporte_exportacion(inventario, archivo, columnas: Optional[Tuple[str, ...]] = None) -> int:
+    """Todo el inventario, leído por lotes."""
+    seleccion = columnas or COLUMNAS
+    return _escribir_filas(archivo, seleccion, inventario.exportar_productos(columnas=seleccion))
+
+
+# Reportes disponibles: función y conversores de sus parámetros
+REPORTES: Dict[str, Tuple[Callable[..., int], Dict[str, Callable[[Any], Any]]]] = {
+    'valorizacion': (reporte_valorizacion, {}),
+    'stock_bajo': (reporte_stock_bajo, {'limite': _limite, 'columnas': _texto_columnas}),
+    'exportacion': (reporte_exportacion, {'columnas': _texto_columnas}),
+}
+
+
+class GestorTrabajos:
+    """
+    Envía, ejecuta y consulta trabajos de reportes sobre un inventario.
+    """
+
+    def __init__(self, inventario, hilos: int = HILOS_POR_DEFECTO, ttl: float = TTL_POR_DEFECTO,
+                 directorio: Optional[str] = None, arriendo: float = ARRIENDO):
+        """
+        Args:
+            inventario: InventarioManager sobre el que corren los reportes
+            hilos: Trabajos simultáneos en este proceso
+            ttl: Segundos durante los que se reutiliza un resultado
+            directorio: Carpeta de los archivos de resultado (por defecto
+                INVENTARIO_TRABAJOS_DIR, o 'trabajos' junto a la base)
+            arriendo: Segundos que vive un trabajo sin terminar si este
+                proceso deja de renovarlo
+        """
+        self.inventario = inventario
+        self.ttl = ttl
+        self.arriendo = arriendo
+        self.directorio = directorio or os.environ.get("INVENTARIO_TRABAJOS_DIR") or os.path.join(
+            os.path.dirname(os.path.abspath(inventario.db.db_name)), "trabajos")
+        os.makedirs(self.directorio, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="trabajo")
+        self._lock = threading.Lock()
+        self._en_cola = 0
+        # Trabajos de este proceso sin terminar: id -> future del pool
+        self._activos: Dict[str, Future] = {}
+        self._crear_tabla()
+        self._cerrado = threading.Event()
+        self._renovador = threading.Thread(target=self._renovar, name="trabajos-arriendo", daemon=True)
+        self._renovador.start()
+
+    def _crear_tabla(self) -> None:
+        db = self.inventario.db
+        db.ejecutar_escritura('''
+            CREATE TABLE IF NOT EXISTS trabajos (
+                id TEXT PRIMARY KEY,
+                tipo TEXT NOT NULL,
+                parametros TEXT NOT NULL,
+                clave TEXT NOT NULL,
+                estado TEXT NOT NULL,
+                creado_en REAL NOT NULL,
+                iniciado_en REAL,
+                terminado_en REAL,
+                expira_en REAL NOT NULL,
+                filas INTEGER,
+                archivo TEXT,
+                error TEXT
+            )
+        ''')
+        db.ejecutar_escritura("CREATE INDEX IF NOT EXISTS idx_trabajos_clave ON trabajos (clave)")
+        db.ejecutar_escritura("CREATE INDEX IF NOT EXISTS idx_trabajos_expira ON trabajos (expira_en)")
+
+    @staticmethod
+    def validar(tipo: str, parametros: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Valida y normaliza los parámetros de un reporte.
+
+        Raises:
+            ValueError: Si el reporte o alguno de los parámetros no es válido
+        """
+        if tipo not in REPORTES:
+            raise ValueError(f"Reporte desconocido: {tipo} (válidos: {', '.join(REPORTES)})")
+        _, conversores = REPORTES[tipo]
+        parametros = {clave: valor for clave, valor in (parametros or {}).items() if valor is not None}
+        desconocidos = [clave for clave in parametros if clave not in conversores]
+        if desconocidos:
+            raise ValueError(f"Parámetros desconocidos para {tipo}: {', '.join(desconocidos)}")
+        try:
+            return {clave: conversores[clave](valor) for clave, valor in sorted(parametros.items())}
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Parámetro inválido para {tipo}: {e}")
+
+    def enviar(self, tipo: str, parametros: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        Envía un reporte, o devuelve el trabajo igual que ya esté en curso
+        o terminado dentro del TTL.
+
+        Args:
+            tipo: Nombre del reporte (ver REPORTES)
+            parametros: Parámetros del reporte
+
+        Returns:
+            Tupla (trabajo, True si se reutilizó uno existente)
+
+        Raises:
+            ValueError: Si el reporte o los parámetros no son válidos
+            OverflowError: Si ya hay MAXIMO_EN_COLA trabajos esperando
+        """
+        normalizados = self.validar(tipo, parametros)
+        # Los conversores devuelven tuplas; en JSON quedan como listas
+        texto = json.dumps(normalizados, sort_keys=True)
+        version = self.inventario.obtener_version_inventario()[0]
+        clave = f"{tipo}:{texto}:{version}"
+        ahora = time.time()
+        self._purgar(ahora)
+
+        id_trabajo = uuid.uuid4().hex
+        # Insertar solo si no hay uno vigente con la misma clave, en una
+        # sentencia: dos workers que reciben el mismo pedido no calculan dos veces
+        insertado = self.inventario.db.ejecutar_escritura('''
+            INSERT INTO trabajos (id, tipo, parametros, clave, estado, creado_en, expira_en)
+            SELECT ?, ?, ?, ?, 'pendiente', ?, ?
+            WHERE NOT EXISTS (
+                SELECT 1 FROM trabajos WHERE clave = ? AND estado <> 'fallido' AND expira_en > ?
+            )
+        ''', (id_trabajo, tipo, texto, clave, ahora, ahora + self.arriendo, clave, ahora)).rowcount
+        registrar_cache("trabajos", not insertado)
+        if not insertado:
+            existente = self.inventario.db.execute_query(
+                "SELECT id FROM trabajos WHERE clave = ? AND estado <> 'fallido' AND expira_en > ? "
+                "ORDER BY creado_en DESC LIMIT 1", (clave, ahora))
+            if existente:
+                return self.obtener(existente[0][0]), True
+            # El existente venció entre las dos sentencias: se envía de nuevo
+            return self.enviar(tipo, parametros)
+
+        with self._lock:
+            if self._en_cola >= MAXIMO_EN_COLA:
+                self._finalizar(id_trabajo, tipo, 'fallido', error="Cola de trabajos llena")
+                raise OverflowError(f"Hay {MAXIMO_EN_COLA} trabajos esperando; intente más tarde")
+            self._en_cola += 1
+        trabajos_en_cola.inc()
+        futuro = self._pool.submit(self._ejecutar, id_trabajo, tipo, normalizados)
+        with self._lock:
+            self._activos[id_trabajo] = futuro
+        # Al terminar (o cancelarse) deja de renovarse; si ya terminó, corre ahora
+        futuro.add_done_callback(lambda _: self._activos.pop(id_trabajo, None))
+        logger.info("Trabajo enviado", extra={'evento': 'trabajo_enviado', 'trabajo': id_trabajo, 'tipo': tipo})
+        return self.obtener(id_trabajo), False
+
+    def _ejecutar(self, id_trabajo: str, tipo: str, parametros: Dict[str, Any]) -> None:
+        """Corre el reporte en un hilo del pool y guarda el resultado."""
+        with self._lock:
+            self._en_cola -= 1
+        trabajos_en_cola.dec()
+
+        funcion, _ = REPORTES[tipo]
+        ruta = os.path.join(self.directorio, f"{id_trabajo}.json")
+        temporal = ruta + ".tmp"
+        try:
+            # Si no se puede tomar el trabajo, queda fallido como cualquier
+            # otro error y quien lo consulta lo ve en lugar de esperarlo
+            self.inventario.db.ejecutar_escritura(
+                "UPDATE trabajos SET estado = 'en_curso', iniciado_en = ? WHERE id = ?", (time.time(), id_trabajo))
+            with open(temporal, "w", encoding="utf-8") as archivo:
+                filas = funcion(self.inventario, archivo, **parametros)
+            os.replace(temporal, ruta)
+            self._finalizar(id_trabajo, tipo, 'terminado', filas=filas, archivo=ruta)
+        except Exception as e:
+            logger.exception("Error al ejecutar el trabajo %s", id_trabajo)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temporal)
+            try:
+                self._finalizar(id_trabajo, tipo, 'fallido', error=str(e))
+            except Exception:
+                logger.exception("No se pudo marcar como fallido el trabajo %s", id_trabajo)
+
+    def _finalizar(self, id_trabajo: str, tipo: str, estado: str, filas: Optional[int] = None,
+                   archivo: Optional[str] = None, error: Optional[str] = None) -> None:
+        """Marca el trabajo como terminado o fallido; el resultado vence en ttl segundos."""
+        ahora = time.time()
+        actualizado = self.inventario.db.ejecutar_escritura('''
+            UPDATE trabajos SET estado = ?, terminado_en = ?, expira_en = ?, filas = ?, archivo = ?, error = ?
+            WHERE id = ?
+        ''', (estado, ahora, ahora + self.ttl, filas, archivo, error, id_trabajo)).rowcount
+        if not actualizado and archivo:
+            # El trabajo se purgó mientras corría (superó DURACION_MAXIMA o su
+            # arriendo venció)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(archivo)
+        trabajos_total.inc(tipo, estado)
+
+    def obtener(self, id_trabajo: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene el estado de un trabajo.
+
+        Returns:
+            Diccionario con las columnas de COLUMNAS_TRABAJO (parametros ya
+            decodificado), o None si no existe o ya venció
+        """
+        resultado = self.inventario.db.execute_query(
+            f"SELECT {', '.join(COLUMNAS_TRABAJO)} FROM trabajos WHERE id = ? AND expira_en > ?",
+            (id_trabajo, time.time()))
+        if not resultado:
+            return None
+        trabajo = dict(zip(COLUMNAS_TRABAJO, resultado[0]))
+        trabajo['parametros'] = json.loads(trabajo['parametros'])
+        return trabajo
+
+    def esperar(self, id_trabajo: str, espera: float, intervalo: float = 0.1) -> Optional[Dict[str, Any]]:
+        """
+        Espera (bloqueando) a que el trabajo termine, como máximo 'espera' segundos.
+
+        Returns:
+            El trabajo en su último estado, o None si no existe
+        """
+        limite = time.monotonic() + espera
+        trabajo = self.obtener(id_trabajo)
+        while trabajo and trabajo['estado'] not in ESTADOS_FINALES and time.monotonic() < limite:
+            time.sleep(intervalo)
+            trabajo = self.obtener(id_trabajo)
+        return trabajo
+
+    def leer_resultado(self, trabajo: Dict[str, Any]) -> Any:
+        """Decodifica el archivo de resultado de un trabajo terminado."""
+        with open(trabajo['archivo'], encoding="utf-8") as archivo:
+            return json.load(archivo)
+
+    def _purgar(self, ahora: float) -> None:
+        """Borra los trabajos vencidos y sus archivos."""
+        vencidos = self.inventario.db.execute_query(
+            "SELECT id, archivo FROM trabajos WHERE expira_en <= ?", (ahora,))
+        if not vencidos:
+            return
+        for _, archivo in vencidos:
+            if archivo:
+                # Otro proceso pudo purgarlo al mismo tiempo
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(archivo)
+        self.inventario.db.ejecutar_escritura("DELETE FROM trabajos WHERE expira_en <= ?", (ahora,))
+
+    def _renovar(self) -> None:
+        """
+        Extiende el arriendo de los trabajos sin terminar de este proceso
+        cada tercio del arriendo, hasta DURACION_MAXIMA desde su creación.
+        """
+        while not self._cerrado.wait(self.arriendo / 3):
+            with self._lock:
+                ids = list(self._activos)
+            if not ids:
+                continue
+            ahora = time.time()
+            try:
+                self.inventario.db.ejecutar_escritura(f'''
+                    UPDATE trabajos SET expira_en = ?
+                    WHERE id IN ({', '.join('?' * len(ids))})
+                      AND estado IN ('pendiente', 'en_curso') AND creado_en > ?
+                ''', (ahora + self.arriendo, *ids, ahora - DURACION_MAXIMA))
+            except Exception:
+                logger.exception("Error al renovar el arriendo de los trabajos")
+
+    def cerrar(self, espera: float = ESPERA_CIERRE) -> None:
+        """
+        Cancela los trabajos que no empezaron y espera a los que están
+        corriendo, así el inventario se puede cerrar después sin que un
+        trabajo vuelva a abrir sus conexiones. Los cancelados quedan
+        fallidos, así un pedido igual (en este u otro proceso) se calcula de
+        nuevo en lugar de esperarlos.
+
+        Args:
+            espera: Segundos como máximo que se espera a los trabajos que
+                están corriendo (y a la última renovación de arriendos)
+        """
+        self._cerrado.set()
+        with self._lock:
+            activos = dict(self._activos)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        for id_trabajo, futuro in activos.items():
+            if not futuro.cancelled():
+                continue
+            with self._lock:
+                self._en_cola -= 1
+            trabajos_en_cola.dec()
+            tipo = (self.inventario.db.execute_query(
+                "SELECT tipo FROM trabajos WHERE id = ?", (id_trabajo,)) or [("",)])[0][0]
+            self._finalizar(id_trabajo, tipo, 'fallido', error="Cancelado al cerrar el proceso")
+
+        limite = time.monotonic() + espera
+        corriendo = [futuro for futuro in activos.values() if not futuro.cancelled()]
+        _, pendientes = wait(corriendo, timeout=espera)
+        if pendientes:
+            logger.warning("%d trabajos siguen corriendo tras esperar %.0f s al cerrar", len(pendientes), espera)
+        self._renovador.join(max(limite - time.monotonic(), 0))
@@ -0,0 +1,224 @@
+"""
+Trazas por solicitud para la API del Sistema de Gestión de Inventario.
+
+Cada solicitud HTTP abre una Traza (ver instrumentacion.py) que recibe los
+spans de las llamadas a InventarioManager y de las consultas SQL. Al enviar
+la respuesta se resumen las fases en la cabecera Server-Timing:
+
+    validacion     desde que la ruta recibe la solicitud hasta que entra al endpoint
+    db             tiempo total en sentencias SQL
+    app            resto del tiempo dentro del endpoint
+    serializacion  desde que el endpoint retorna hasta que la respuesta está lista
+    total          tiempo completo en la aplicación
+
+Opcionalmente, una muestra de las trazas se guarda en formato JSON lines:
+    INVENTARIO_TRAZAS_ARCHIVO=trazas.jsonl
+    INVENTARIO_TRAZAS_MUESTREO=0.05
+"""
+
+import asyncio
+import json
+import os
+import queue
+import random
+import threading
+import time
+from functools import wraps
+from typing import Any, Dict, Optional
+
+from fastapi.routing import APIRoute
+
+from instrumentacion import Traza, traza_actual
+
+
+class RutaTrazada(APIRoute):
+    """
+    Ruta de FastAPI que marca el inicio y el fin del endpoint dentro de la
+    traza, separando validación y serialización del trabajo del endpoint.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, self._envolver_endpoint(endpoint), **kwargs)
+
+    @staticmethod
+    def _envolver_endpoint(endpoint):
+        """
+        Envuelve el endpoint conservando su firma para FastAPI. Un endpoint
+        sincrónico sigue siéndolo, así FastAPI lo ejecuta en su pool de hilos
+        (con el contexto de la solicitud, y por lo tanto con su traza).
+        """
+        if asyncio.iscoroutinefunction(endpoint):
+            @wraps(endpoint)
+            async def endpoint_trazado(*args, **kwargs):
+                traza = traza_actual.get()
+                if traza is None:
+                    return await endpoint(*args, **kwargs)
+                traza.marcar('endpoint_inicio')
+                try:
+                    return await endpoint(*args, **kwargs)
+                finally:
+                    traza.marcar('endpoint_fin')
+        else:
+            @wraps(endpoint)
+            def endpoint_trazado(*args, **kwargs):
+                traza = traza_actual.get()
+                if traza is None:
+                    return endpoint(*args, **kwargs)
+                traza.marcar('endpoint_inicio')
+                try:
+                    return endpoint(*args, **kwargs)
+                finally:
+                    traza.marcar('endpoint_fin')
+
+        return endpoint_trazado
+
+    def get_route_handler(self):
+        manejador = super().get_route_handler()
+
+        async def manejador_trazado(request):
+            traza = traza_actual.get()
+            if traza is None:
+                return await manejador(request)
+            traza.marcar('ruta_inicio')
+            respuesta = await manejador(request)
+            traza.marcar('ruta_fin')
+            return respuesta
+
+        return manejador_trazado
+
+
+def resumir_fases(traza: Traza) -> Dict[str, Any]:
+    """
+    Calcula la duración de cada fase de la solicitud.
+
+    Args:
+        traza: Traza de la solicitud
+
+    Returns:
+        Diccionario fase -> milisegundos, más la cantidad de consultas
+        y el total acumulado por método de InventarioManager
+    """
+    db_ms = 0.0
+    consultas = 0
+    metodos: Dict[str, float] = {}
+    for span in traza.spans:
+        if span['nombre'] == 'db':
+            db_ms += span['duracion_ms']
+            consultas += 1
+        else:
+            metodos[span['nombre']] = metodos.get(span['nombre'], 0.0) + span['duracion_ms']
+
+    fases: Dict[str, Any] = {}
+    validacion = traza.duracion_entre('ruta_inicio', 'endpoint_inicio')
+    if validacion is not None:
+        fases['validacion'] = validacion
+    fases['db'] = db_ms
+    endpoint = traza.duracion_entre('endpoint_inicio', 'endpoint_fin')
+    if endpoint is not None:
+        fases['app'] = max(0.0, endpoint - db_ms)
+    serializacion = traza.duracion_entre('endpoint_fin', 'ruta_fin')
+    if serializacion is not None:
+        fases['serializacion'] = serializacion
+    fases['total'] = (time.perf_counter() - traza.inicio) * 1000
+    return {'fases': fases, 'consultas': consultas, 'metodos': metodos}
+
+
+def formatear_server_timing(resumen: Dict[str, Any]) -> str:
+    """Construye el valor de la cabecera Server-Timing."""
+    entradas = []
+    for fase, duracion in resumen['fases'].items():
+        entrada = f"{fase};dur={duracion:.3f}"
+        if fase == 'db':
+            entrada += f';desc="{resumen["consultas"]} consultas"'
+        entradas.append(entrada)
+    for metodo, duracion in resumen['metodos'].items():
+        entradas.append(f"{metodo};dur={duracion:.3f}")
+    return ", ".join(entradas)
+
+
+class RegistroTrazasJSONL:
+    """
+    Escritor en segundo plano de trazas muestreadas en formato JSON lines.
+
+    Las solicitudes solo encolan la traza; un hilo aparte escribe en disco.
+    """
+
+    def __init__(self, archivo: str, muestreo: float):
+        self.archivo = archivo
+        self.muestreo = muestreo
+        self._cola: "queue.SimpleQueue[Dict[str, Any]]" = queue.SimpleQueue()
+        self._hilo = threading.Thread(target=self._escribir, name="trazas-jsonl", daemon=True)
+        self._hilo.start()
+
+    def debe_muestrear(self) -> bool:
+        """Decide si la solicitud actual entra en la muestra."""
+        return random.random() < self.muestreo
+
+    def encolar(self, registro: Dict[str, Any]) -> None:
+        """Encola una traza para escribirla."""
+        self._cola.put(registro)
+
+    def _escribir(self) -> None:
+        with open(self.archivo, "a", encoding="utf-8") as salida:
+            while True:
+                registro = self._cola.get()
+                salida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+                if self._cola.empty():
+                    salida.flush()
+
+
+def _registro_desde_entorno() -> Optional[RegistroTrazasJSONL]:
+    """Crea el registro JSONL si INVENTARIO_TRAZAS_ARCHIVO está definido."""
+    archivo = os.environ.get("INVENTARIO_TRAZAS_ARCHIVO")
+    if not archivo:
+        return None
+    try:
+        muestreo = float(os.environ.get("INVENTARIO_TRAZAS_MUESTREO", "0.01"))
+    except ValueError:
+        muestreo = 0.01
+    return RegistroTrazasJSONL(archivo, min(max(muestreo, 0.0), 1.0))
+
+
+class MiddlewareTrazas:
+    """
+    Middleware ASGI que abre una traza por solicitud y agrega la cabecera
+    Server-Timing a la respuesta.
+    """
+
+    def __init__(self, app, registro_jsonl: Optional[RegistroTrazasJSONL] = None):
+        self.app = app
+        self.registro_jsonl = registro_jsonl if registro_jsonl is not None else _registro_desde_entorno()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traza = Traza()
+        token = traza_actual.set(traza)
+        resumen: Dict[str, Any] = {}
+        estado = [500]
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado[0] = mensaje["status"]
+                resumen.update(resumir_fases(traza))
+                cabeceras = list(mensaje.get("headers", []))
+                cabeceras.append((b"server-timing", formatear_server_timing(resumen).encode("latin-1")))
+                mensaje = dict(mensaje, headers=cabeceras)
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            traza_actual.reset(token)
+            if self.registro_jsonl is not None and self.registro_jsonl.debe_muestrear():
+                self.registro_jsonl.encolar({
+                    'traza': traza.id,
+                    'timestamp': time.time(),
+                    'metodo': scope["method"],
+                    'ruta': scope["path"],
+                    'estado': estado[0],
+                    'fases': {fase: round(ms, 3) for fase, ms in resumen.get('fases', {}).items()},
+                    'spans': traza.spans
+                })